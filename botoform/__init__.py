@@ -1,2 +1,3 @@
 from __main__ import build_parser
 from __main__ import get_evpc_from_args
+from __main__ import validate_profile
@@ -1,8 +1,6 @@
 import argparse
 
-from pkg_resources import iter_entry_points
-
-from botoform.enriched import EnrichedVPC
+from botoform.stats import api_stats
 
 from os import environ
 
@@ -14,31 +12,78 @@ def get_profile_names():
     return botocore.session.get_session().full_config.get("profiles", {}).keys()
 
 
-def load_entry_points(group_name):
-    """Return a dictionary of entry_points related to given group_name"""
-    entry_points = {}
-    for entry_point in iter_entry_points(group=group_name, name=None):
-        entry_points[entry_point.name] = entry_point.load()
-    return entry_points
-
-
-def load_parsers_from_plugins(subparser, plugins):
-    """iterate over all plugins and load their parser."""
-    for plugin_name, plugin_class in plugins.items():
-        # create a parser object for the plugin.
-        plugin_parser = subparser.add_parser(
-            plugin_name, description=plugin_class.__doc__
+def validate_profile(parser, args):
+    """Exit with a usage error if args.profile is not in ~/.aws/config"""
+    if args.profile is not None and args.profile not in get_profile_names():
+        parser.error(
+            "argument -p/--profile: invalid choice: '{}' (choose from {})".format(
+                args.profile, ", ".join(sorted(get_profile_names()))
+            )
         )
 
-        plugin_parser.add_argument("vpc_name", help="The VPC's Name tag.")
 
+def iter_entry_points(group_name):
+    """
+    Return entry_points of given group_name without importing them.
+
+    Prefers importlib.metadata, importing pkg_resources is slow.
+    """
+    try:
+        from importlib import metadata
+    except ImportError:
         try:
-            # Assume class plugin with 'setup_parser' and 'main' staticmethods.
-            plugin_class.setup_parser(plugin_parser)
-            plugin_parser.set_defaults(func=plugin_class.main)
-        except AttributeError:
-            # Assume function plugin w/o 'setup_parser' or 'main' staticmethods.
-            plugin_parser.set_defaults(func=plugin_class)
+            import importlib_metadata as metadata
+        except ImportError:
+            metadata = None
+
+    if metadata is None:
+        from pkg_resources import iter_entry_points
+
+        return list(iter_entry_points(group=group_name, name=None))
+
+    entry_points = metadata.entry_points()
+    if hasattr(entry_points, "select"):
+        return list(entry_points.select(group=group_name))
+    return list(entry_points.get(group_name, []))
+
+
+def load_parser_from_plugin(plugin_parser, plugin_class):
+    """attach a loaded plugin's arguments and main function to its parser."""
+    plugin_parser.description = plugin_class.__doc__
+    try:
+        # Assume class plugin with 'setup_parser' and 'main' staticmethods.
+        plugin_class.setup_parser(plugin_parser)
+        plugin_parser.set_defaults(func=plugin_class.main)
+    except AttributeError:
+        # Assume function plugin w/o 'setup_parser' or 'main' staticmethods.
+        plugin_parser.set_defaults(func=plugin_class)
+
+
+class LazySubParsersAction(argparse._SubParsersAction):
+    """
+    A subparsers action which imports only the chosen subcommand's plugin.
+
+    Register entry points with add_entry_point, the plugin is loaded and
+    its parser set up right before argparse parses the subcommand's args.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(LazySubParsersAction, self).__init__(*args, **kwargs)
+        self._entry_points = {}
+
+    def add_entry_point(self, entry_point):
+        plugin_parser = self.add_parser(entry_point.name)
+        plugin_parser.add_argument("vpc_name", help="The VPC's Name tag.")
+        self._entry_points[entry_point.name] = entry_point
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        entry_point = self._entry_points.pop(values[0], None)
+        if entry_point is not None:
+            plugin_parser = self._name_parser_map[values[0]]
+            load_parser_from_plugin(plugin_parser, entry_point.load())
+        super(LazySubParsersAction, self).__call__(
+            parser, namespace, values, option_string
+        )
 
 
 def build_parser(description, load_subparser_plugins=False):
@@ -48,7 +93,6 @@ def build_parser(description, load_subparser_plugins=False):
     parser.add_argument(
         "-p",
         "--profile",
-        choices=get_profile_names(),
         default=environ.get("AWS_DEFAULT_PROFILE", None),
         help="botocore profile name for AWS creds and other vars.",
     )
@@ -58,6 +102,14 @@ def build_parser(description, load_subparser_plugins=False):
         default=environ.get("AWS_DEFAULT_REGION", None),
         help="AWS region to use",
     )
+    parser.add_argument(
+        "--stats",
+        nargs="?",
+        const="-",
+        default=None,
+        metavar="PATH",
+        help="report AWS API calls as JSON when done, to PATH or STDOUT.",
+    )
     # parser.add_argument('--search-regions', action='store_true', default=False,
     #  help='search regions for VPC with given vpc_name')
     # parser.add_argument('--quiet', action='store_true', default=False,
@@ -65,13 +117,15 @@ def build_parser(description, load_subparser_plugins=False):
 
     if load_subparser_plugins:
         # create a subparser for our plugins to attach to.
+        parser.register("action", "parsers", LazySubParsersAction)
         subparser = parser.add_subparsers(
             title="subcommands",
             description="valid subcommands",
             help="--help for additional subcommand help",
         )
-        plugins = load_entry_points("botoform.plugins")
-        load_parsers_from_plugins(subparser, plugins)
+        # plugins are imported on use, only the chosen one is ever loaded.
+        for entry_point in iter_entry_points("botoform.plugins"):
+            subparser.add_entry_point(entry_point)
     else:
         parser.add_argument("vpc_name", help="The VPC's Name tag.")
 
@@ -80,6 +134,8 @@ def build_parser(description, load_subparser_plugins=False):
 
 def get_evpc_from_args(args):
     if "skip_evpc" not in args.__dict__:
+        from botoform.enriched import EnrichedVPC
+
         return EnrichedVPC(
             vpc_name=args.vpc_name, region_name=args.region, profile_name=args.profile
         )
@@ -88,9 +144,14 @@ def get_evpc_from_args(args):
 def main():
     parser = build_parser("Manage infrastructure on AWS using YAML", True)
     args = parser.parse_args()
-    evpc = get_evpc_from_args(args)
-    # call the plugin main method.
-    args.func(args, evpc)
+    validate_profile(parser, args)
+    try:
+        evpc = get_evpc_from_args(args)
+        # call the plugin main method.
+        args.func(args, evpc)
+    finally:
+        if args.stats is not None:
+            api_stats.write(args.stats)
 
 
 if __name__ == "__main__":
@@ -2,21 +2,32 @@ import traceback
 
 from botoform.enriched import EnrichedVPC
 
+from botoform.enriched.vpc import DEFAULT_EGRESS_RULE
+
 from botoform.util import (
     BotoConnections,
     Log,
+    TagWriter,
     update_tags,
     make_tag_dict,
     get_port_range,
     get_ids,
-    collection_len,
     generate_password,
     get_block_device_map_from_role_config,
     map_filter_false,
+    normalize_sg_rules,
+    coalesce_sg_rules,
+    run_concurrently,
+    run_dag,
+    DEFAULT_MAX_WORKERS,
 )
 
 from botoform.subnetallocator import allocate
 
+from botoform.waiters import Waiter
+
+from botocore.exceptions import ClientError
+
 from uuid import uuid4
 
 from random import choice
@@ -44,6 +55,157 @@ def get_default_ec2_trust_policy(region_name):
     return DEFAULT_EC2_TRUST_POLICY % "ec2.amazonaws.com"
 
 
+def plan_security_group_rules(security_group_cfg, current, prune=False):
+    """
+    Return the rules to add and remove per security group and direction.
+
+    Groups missing from current are planned as new groups, which AWS
+    creates with only the default outbound rule. Custom outbound rules
+    always replace the default outbound rule. Config rules are coalesced,
+    with prune current rules covered by a merged rule are replaced by it.
+
+    :param security_group_cfg: The security_groups section of a config.
+    :param current:
+      dict of group name to inbound and outbound rules, for example
+      from :meth:`botoform.enriched.vpc.EnrichedVPC.get_security_group_rules`.
+    :param prune: Optional, also remove rules which are not in config.
+
+    :returns:
+      dict of group name to direction to dict with sorted add and remove
+      lists of normalized rules. Unchanged groups and directions are left out.
+    """
+    default_egress = normalize_sg_rules([DEFAULT_EGRESS_RULE])[0]
+    new_group = {"inbound": [], "outbound": [DEFAULT_EGRESS_RULE]}
+    plan = {}
+    for sg_name, rules in security_group_cfg.items():
+        rules = rules or {}
+        existing_rules = current.get(sg_name, new_group)
+        for direction in ("inbound", "outbound"):
+            desired = set(coalesce_sg_rules(rules.get(direction, [])))
+            existing = set(normalize_sg_rules(existing_rules.get(direction, [])))
+            if prune and direction == "outbound" and not desired:
+                desired = set([default_egress])
+            to_add = desired - existing
+            if prune:
+                to_remove = existing - desired
+            elif direction == "outbound" and desired:
+                to_remove = existing & (set([default_egress]) - desired)
+            else:
+                to_remove = set()
+            if to_add or to_remove:
+                plan.setdefault(sg_name, {})[direction] = {
+                    "add": sorted(to_add),
+                    "remove": sorted(to_remove),
+                }
+    return plan
+
+
+def plan_instance_role_launch(desired_count, subnets, existing):
+    """
+    Return a list of (subnet_id, count) tuples of instances to launch.
+
+    Existing instances count towards desired_count wherever they run. New
+    instances go one at a time to the availability zone, then the subnet,
+    with the fewest instances of the role, ties go to the earlier subnet.
+
+    .. code-block:: python
+
+      >>> plan_instance_role_launch(
+      ...     4, [("subnet-a", "az-1"), ("subnet-b", "az-2")], [("subnet-a", "az-1")]
+      ... )
+      [('subnet-a', 1), ('subnet-b', 2)]
+
+    :param desired_count: The desired number of instances of the role.
+    :param subnets:
+      A list of (subnet_id, availability_zone) tuples to launch into,
+      in order of preference.
+    :param existing:
+      A list of (subnet_id, availability_zone) tuples, one per existing
+      instance of the role, in any subnet.
+
+    :returns: A possibly empty list of (subnet_id, count), count is never 0.
+    """
+    needed = desired_count - len(existing)
+    if needed <= 0 or not subnets:
+        return []
+    zone_counts, subnet_counts = {}, {}
+    for subnet_id, zone in existing:
+        zone_counts[zone] = zone_counts.get(zone, 0) + 1
+        subnet_counts[subnet_id] = subnet_counts.get(subnet_id, 0) + 1
+    zones = dict(subnets)
+    order = {}
+    for subnet_id, zone in subnets:
+        order.setdefault(subnet_id, len(order))
+
+    def load(subnet_id):
+        zone_count = zone_counts.get(zones[subnet_id], 0)
+        return (zone_count, subnet_counts.get(subnet_id, 0), order[subnet_id])
+
+    launch = {}
+    for _ in range(needed):
+        subnet_id = min(order, key=load)
+        launch[subnet_id] = launch.get(subnet_id, 0) + 1
+        zone_counts[zones[subnet_id]] = zone_counts.get(zones[subnet_id], 0) + 1
+        subnet_counts[subnet_id] = subnet_counts.get(subnet_id, 0) + 1
+    return sorted(launch.items(), key=lambda item: order[item[0]])
+
+
+# seconds to wait for a new instance_profile to become visible.
+INSTANCE_PROFILE_TIMEOUT = 300
+
+# build stage: list of stages which must finish before it starts.
+BUILD_STAGE_DEPENDENCIES = {
+    "internet_gateway": [],
+    "vpn_gateway": [],
+    "dhcp_options": [],
+    "instance_profiles": [],
+    "route_tables": [],
+    "subnets": [],
+    "security_groups": [],
+    "key_pairs": [],
+    "associate_route_tables": ["route_tables", "subnets"],
+    "db_instances": ["subnets", "security_groups"],
+    "instance_roles": [
+        "instance_profiles",
+        "subnets",
+        "security_groups",
+        "key_pairs",
+    ],
+    "autoscaling_instance_roles": [
+        "instance_profiles",
+        "subnets",
+        "security_groups",
+        "key_pairs",
+    ],
+    "endpoints": ["route_tables"],
+    "security_group_rules": ["security_groups"],
+    # load balancers register the instances and autoscaling groups of roles.
+    "load_balancers": [
+        "subnets",
+        "security_groups",
+        "instance_roles",
+        "autoscaling_instance_roles",
+        "wait_for_instance_roles",
+    ],
+    "wait_for_instance_roles": ["instance_roles", "autoscaling_instance_roles"],
+    "finish_instance_roles": ["wait_for_instance_roles"],
+    # run after tagging instances in case we have a NAT instance_role.
+    "route_table_rules": [
+        "finish_instance_roles",
+        "associate_route_tables",
+        "internet_gateway",
+        "vpn_gateway",
+        "endpoints",
+    ],
+    "private_zone": ["finish_instance_roles"],
+}
+
+# tags are applied last, once every other stage created its resources.
+BUILD_STAGE_DEPENDENCIES["tags"] = [
+    stage for stage in BUILD_STAGE_DEPENDENCIES if stage != "tags"
+]
+
+
 class EnvironmentBuilder(object):
 
     def __init__(
@@ -61,6 +223,9 @@ class EnvironmentBuilder(object):
         self.log = log if log is not None else Log()
         self.boto = BotoConnections(region_name, profile_name)
         self.reflect = False
+        self.max_workers = DEFAULT_MAX_WORKERS
+        # instance_profile name: InstanceProfile, resolved during this run.
+        self.instance_profile_cache = {}
 
     def apply_all(self):
         """Build the environment specified in the config."""
@@ -92,54 +257,75 @@ class EnvironmentBuilder(object):
             self.vpc_name, self.boto.region_name, self.boto.profile_name, self.log
         )
 
-        # create and attach internet gateway to vpc.
-        self.build_internet_gateway()
-
-        # attach VPN gateway to the VPC
-        self.attach_vpn_gateway(config.get("vpn_gateway", no_cfg))
-
-        # create and associate DHCP Options Set
-        self.dhcp_options(config.get("dhcp_options", no_cfg))
-
-        # iam instance profiles / iam roles need to be created early because
-        # there isn't a way to make launch config idempotent and safe to retry...
-        self.instance_profiles(config.get("instance_roles", no_cfg))
-
-        # the order of these method calls matters for new VPCs.
-        self.route_tables(config.get("route_tables", no_cfg))
-        self.subnets(config.get("subnets", no_cfg))
-        self.security_groups(config.get("security_groups", no_cfg))
-        self.key_pairs(config.get("key_pairs", []))
-        self.associate_route_tables_with_subnets(config.get("subnets", no_cfg))
-        self.db_instances(config.get("db_instances", no_cfg))
-
-        self.instance_roles(config.get("instance_roles", no_cfg))
-
-        self.autoscaling_instance_roles(config.get("instance_roles", no_cfg))
+        instance_role_cfg = config.get("instance_roles", no_cfg)
 
-        # lets do more work while new_instances move from pending to running.
-        self.endpoints(config.get("endpoints", []))
-        self.security_group_rules(config.get("security_groups", no_cfg))
-        self.load_balancers(config.get("load_balancers", no_cfg))
-
-        # block until instance_role counts are sane.
-        self.wait_for_instance_roles_to_exist(config.get("instance_roles", no_cfg))
+        # independent stages run concurrently, see BUILD_STAGE_DEPENDENCIES.
+        stages = {
+            "internet_gateway": self.build_internet_gateway,
+            "vpn_gateway": lambda: self.attach_vpn_gateway(
+                config.get("vpn_gateway", no_cfg)
+            ),
+            "dhcp_options": lambda: self.dhcp_options(
+                config.get("dhcp_options", no_cfg)
+            ),
+            # iam instance profiles / iam roles need to be created early because
+            # there isn't a way to make launch config idempotent and safe to retry...
+            "instance_profiles": lambda: self.instance_profiles(instance_role_cfg),
+            "route_tables": lambda: self.route_tables(
+                config.get("route_tables", no_cfg)
+            ),
+            "subnets": lambda: self.subnets(config.get("subnets", no_cfg)),
+            "security_groups": lambda: self.security_groups(
+                config.get("security_groups", no_cfg)
+            ),
+            "key_pairs": lambda: self.key_pairs(config.get("key_pairs", [])),
+            "associate_route_tables": lambda: self.associate_route_tables_with_subnets(
+                config.get("subnets", no_cfg)
+            ),
+            "db_instances": lambda: self.db_instances(
+                config.get("db_instances", no_cfg)
+            ),
+            "instance_roles": lambda: self.instance_roles(instance_role_cfg),
+            "autoscaling_instance_roles": lambda: self.autoscaling_instance_roles(
+                instance_role_cfg
+            ),
+            "endpoints": lambda: self.endpoints(config.get("endpoints", [])),
+            "security_group_rules": lambda: self.security_group_rules(
+                config.get("security_groups", no_cfg)
+            ),
+            "load_balancers": lambda: self.load_balancers(
+                config.get("load_balancers", no_cfg)
+            ),
+            # block until instance_role counts are sane.
+            "wait_for_instance_roles": lambda: self.wait_for_instance_roles_to_exist(
+                instance_role_cfg
+            ),
+            "finish_instance_roles": lambda: self.finish_instance_roles(
+                instance_role_cfg
+            ),
+            "route_table_rules": lambda: self.route_table_rules(
+                config.get("route_tables", no_cfg)
+            ),
+            "private_zone": lambda: self.private_zone(
+                config.get("private_zone", False)
+            ),
+            "tags": lambda: self.tags(config.get("tags", no_cfg)),
+        }
 
-        # lets finish building the new instances.
-        self.finish_instance_roles(config.get("instance_roles", no_cfg))
+        # serve inventory reads from one snapshot while we build.
+        with self.evpc.snapshot():
+            # stop launching resources after the first failed stage.
+            run_dag(stages, BUILD_STAGE_DEPENDENCIES, self.max_workers, fail_fast=True)
 
-        # run after tagging instances in case we have a NAT instance_role.
-        self.route_table_rules(config.get("route_tables", no_cfg))
+        self.log.emit("done! don't you look awesome. : )")
 
-        if config.get("private_zone", False):
+    def private_zone(self, private_zone):
+        """Create and refresh the route53 private zone if desired."""
+        if private_zone:
             self.log.emit("managing route53 private zone.")
             self.evpc.route53.create_private_zone()
             self.evpc.route53.refresh_private_zone()
 
-        self.tags(config.get("tags", no_cfg))
-
-        self.log.emit("done! don't you look awesome. : )")
-
     def build_vpc(self, cidrblock="172.31.0.0/16", tenancy="default"):
         """Build VPC"""
         msg_vpc = "creating vpc ({}, {}) with {} tenancy"
@@ -162,6 +348,7 @@ class EnvironmentBuilder(object):
         gw = self.boto.ec2.create_internet_gateway()
         self.log.emit("tagging gateway (Name:{})".format(igw_name), "debug")
         update_tags(gw, Name=igw_name)
+        self.evpc.add_to_snapshot("internet_gateways", [gw])
 
         self.log.emit("attaching igw to vpc ({})".format(igw_name))
         self.evpc.attach_internet_gateway(
@@ -243,10 +430,15 @@ class EnvironmentBuilder(object):
                     route_table = self.evpc.create_route_table()
                 self.log.emit("tagging route_table (Name:{})".format(longname), "debug")
                 update_tags(route_table, Name=longname)
+                self.evpc.add_to_snapshot("route_tables", [route_table])
 
     def route_table_rules(self, route_cfg):
         """Build route table rules defined in config"""
         # currently supports: igw, vgw, and instance_roles
+        # map subnet ids to availability_zones from hydrated subnets.
+        subnet_azones = {
+            sn.id: sn.availability_zone for sn in self.evpc.get_inventory("subnets")
+        }
         for rt_name, data in route_cfg.items():
             # this method assumes the route_table was already created.
             route_table = self.evpc.get_route_table(rt_name)
@@ -261,7 +453,7 @@ class EnvironmentBuilder(object):
                     # TODO: ugly but we assume only one internet gateway.
                     route_table.create_route(
                         DestinationCidrBlock=destination,
-                        GatewayId=list(self.evpc.internet_gateways.all())[0].id,
+                        GatewayId=self.evpc.get_inventory("internet_gateways")[0].id,
                     )
                 elif target.lower() == "vpn_gateway":
                     # TODO: ugly but we assume only one VPN gateway.
@@ -277,9 +469,9 @@ class EnvironmentBuilder(object):
                 else:
                     # availability_zones of subnets associated to route_table.
                     azones = [
-                        a.subnet.availability_zone
+                        subnet_azones.get(a.subnet_id, None)
                         for a in route_table.associations
-                        if a.subnet is not None
+                        if a.subnet_id is not None
                     ]
 
                     # assume the target is an instance_role.
@@ -291,7 +483,7 @@ class EnvironmentBuilder(object):
                     # try to correlate the route_table's associated subnet's availability_zone
                     # and the nat instance's subnet's availability_zone. Not always possible.
                     for instance in instances:
-                        if instance.subnet.availability_zone in azones:
+                        if instance.placement["AvailabilityZone"] in azones:
                             nat_instance = instance
 
                     self.log.emit(
@@ -303,6 +495,9 @@ class EnvironmentBuilder(object):
                         DestinationCidrBlock=destination, InstanceId=nat_instance.id
                     )
 
+        # routes were added, forget the route tables we knew.
+        self.evpc.invalidate_snapshot("route_tables")
+
     def subnets(self, subnet_cfg):
         """Build subnets defined in config."""
         sizes = sorted([x["size"] for x in subnet_cfg.values()])
@@ -331,6 +526,7 @@ class EnvironmentBuilder(object):
             )
             self.log.emit("tagging subnet (Name:{})".format(longname), "debug")
             update_tags(subnet, Name=longname, description=sn.get("description", ""))
+            self.evpc.add_to_snapshot("subnets", [subnet])
 
             if sn.get("public", False) == True:
                 # Modify the subnet's public IP addressing behavior.
@@ -354,6 +550,7 @@ class EnvironmentBuilder(object):
             return None
         self.log.emit("creating vpc endpoints in {}".format(", ".join(route_tables)))
         self.evpc.vpc_endpoint.create_all(route_tables)
+        self.evpc.invalidate_snapshot("route_tables")
 
     def security_groups(self, security_group_cfg):
         """Build Security Groups defined in config."""
@@ -369,11 +566,14 @@ class EnvironmentBuilder(object):
             )
             self.log.emit("tagging security_group (Name:{})".format(longname), "debug")
             update_tags(security_group, Name=longname)
+            self.evpc.add_to_snapshot("security_groups", [security_group])
 
     def security_group_rules(self, security_group_cfg):
         """Build Security Group Rules defined in config."""
         self.security_group_inbound_rules(security_group_cfg)
         self.security_group_outbound_rules(security_group_cfg)
+        # rules were added, forget the security groups we knew.
+        self.evpc.invalidate_snapshot("security_groups")
 
     def security_group_rule_to_permission(self, rule):
         """Return a permission dictionary from a rule tuple."""
@@ -383,25 +583,58 @@ class EnvironmentBuilder(object):
 
         permission = {"IpProtocol": protocol, "FromPort": from_port, "ToPort": to_port}
 
-        if sg is None:
-            permission["IpRanges"] = [{"CidrIp": rule[0]}]
-        else:
+        if sg is not None:
             permission["UserIdGroupPairs"] = [{"GroupId": sg.id}]
+        elif rule[0].startswith("sg-"):
+            # a group we could not name, for example in a peer VPC.
+            permission["UserIdGroupPairs"] = [{"GroupId": rule[0]}]
+        else:
+            permission["IpRanges"] = [{"CidrIp": rule[0]}]
 
         return permission
 
     def security_group_rules_to_permissions(self, sg_name, rules, direction="inbound"):
-        msg = "{} rule: '{}' {} '{}' over ports {} ({})"
+        msg = "{} rule: '{}' {} '{}' over ports {}-{} ({})"
         symbol = {"inbound": "->", "outbound": "<-"}.get(direction, "->")
-        permissions = []
-        for rule in rules.get(direction, {}):
-            permissions.append(self.security_group_rule_to_permission(rule))
+        rules = coalesce_sg_rules(rules.get(direction, {}))
+        for rule in rules:
             self.log.emit(
                 msg.format(
-                    direction, rule[0], symbol, sg_name, rule[2], rule[1].upper()
+                    direction,
+                    rule[0],
+                    symbol,
+                    sg_name,
+                    rule[2][0],
+                    rule[2][1],
+                    rule[1].upper(),
                 )
             )
-        return permissions
+        return self.group_rules_into_permissions(rules)
+
+    def group_rules_into_permissions(self, rules):
+        """
+        Return one permission per (protocol, port range) with all its sources.
+
+        :param rules: A list of normalized security group rule tuples.
+
+        :returns: A list of IpPermissions dictionaries.
+        """
+        permissions = {}
+        for rule in rules:
+            permission = self.security_group_rule_to_permission(rule)
+            key = (
+                permission["IpProtocol"],
+                permission["FromPort"],
+                permission["ToPort"],
+            )
+            if key not in permissions:
+                permissions[key] = permission
+                continue
+            for sources in ("IpRanges", "UserIdGroupPairs"):
+                if sources in permission:
+                    permissions[key].setdefault(sources, [])
+                    permissions[key][sources] += permission[sources]
+        return [permissions[key] for key in sorted(permissions)]
 
     def security_group_inbound_rules(self, security_group_cfg):
         """Build inbound rule for Security Group defined in config."""
@@ -437,6 +670,72 @@ class EnvironmentBuilder(object):
             ]
         )
 
+    def reconcile_security_groups(self, security_group_cfg, prune=False, dry_run=False):
+        """
+        Make security group rules match config, return the plan of changes.
+
+        Every group is compared against one snapshot of all groups and
+        gets at most one authorize and one revoke call per direction.
+
+        :param security_group_cfg: The security_groups section of a config.
+        :param prune: Optional, also revoke rules which are not in config.
+        :param dry_run: Optional, only return the plan, change nothing.
+
+        :returns: The plan, see :func:`plan_security_group_rules`.
+        """
+        if not dry_run:
+            # build the missing security groups.
+            self.security_groups(security_group_cfg)
+        with self.evpc.snapshot():
+            current = self.evpc.get_security_group_rules()
+            plan = plan_security_group_rules(security_group_cfg, current, prune)
+            if not dry_run:
+                run_concurrently(
+                    lambda item: self.apply_security_group_changes(*item),
+                    list(plan.items()),
+                    self.max_workers,
+                )
+                # rules changed, forget the security groups we knew.
+                self.evpc.invalidate_snapshot("security_groups")
+        return plan
+
+    def apply_security_group_changes(self, sg_name, changes):
+        """
+        Apply one group's planned changes.
+
+        Rules are authorized before they are revoked, so replacing the
+        default outbound rule never leaves the group without egress.
+        """
+        sg = self.evpc.get_security_group(sg_name)
+        calls = {
+            "inbound": (sg.authorize_ingress, sg.revoke_ingress),
+            "outbound": (sg.authorize_egress, sg.revoke_egress),
+        }
+        msg = "{} {} rule: '{}' {} '{}' over ports {}-{} ({})"
+        symbol = {"inbound": "->", "outbound": "<-"}
+        for direction in ("inbound", "outbound"):
+            if direction not in changes:
+                continue
+            authorize, revoke = calls[direction]
+            for action, call in (("add", authorize), ("remove", revoke)):
+                rules = changes[direction][action]
+                if not rules:
+                    continue
+                for rule in rules:
+                    self.log.emit(
+                        msg.format(
+                            action,
+                            direction,
+                            rule[0],
+                            symbol[direction],
+                            sg_name,
+                            rule[2][0],
+                            rule[2][1],
+                            rule[1].upper(),
+                        )
+                    )
+                call(IpPermissions=self.group_rules_into_permissions(rules))
+
     def key_pairs(self, key_pair_cfg):
         key_pair_cfg.append("default")
         for short_key_pair_name in key_pair_cfg:
@@ -445,10 +744,24 @@ class EnvironmentBuilder(object):
                 self.evpc.key_pair.create_key_pair(short_key_pair_name)
 
     def get_instance_profile(self, instance_profile_name):
-        """Return instance_profile or None."""
-        for profile in list(self.boto.iam.instance_profiles.all()):
-            if profile.name == instance_profile_name:
-                return profile
+        """
+        Return instance_profile or None.
+
+        One GetInstanceProfile call by name, found instance_profiles are
+        cached for the rest of the run.
+        """
+        if instance_profile_name in self.instance_profile_cache:
+            return self.instance_profile_cache[instance_profile_name]
+        profile = self.boto.iam.InstanceProfile(instance_profile_name)
+        try:
+            # external API call to AWS.
+            profile.load()
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "NoSuchEntity":
+                raise
+            return None
+        self.instance_profile_cache[instance_profile_name] = profile
+        return profile
 
     def create_instance_profile(self, instance_profile_name):
         """Create instance_profile and role, return instance_profile."""
@@ -464,27 +777,46 @@ class EnvironmentBuilder(object):
         instance_profile.add_role(RoleName=instance_profile_name)
         return instance_profile
 
-    # retry because instance_profile / iam role not ready right away...
-    @retry(wait_exponential_multiplier=1000, wait_exponential_max=10000)
+    def get_instance_profile_states(self, instance_profile_names):
+        """Return dict of instance_profile name to exists for existing ones."""
+        states = {}
+        for name in instance_profile_names:
+            if self.get_instance_profile(name) is not None:
+                states[name] = "exists"
+        return states
+
+    # instance_profile / iam role not ready right away...
     def wait_for_instance_profile(self, instance_profile_name):
         msg = "waiting for {} instance_profile / iam_role to exist ..."
-        if self.get_instance_profile(instance_profile_name) is None:
-            self.log.emit(msg.format(instance_profile_name))
-            raise Exception(msg.format(instance_profile_name))
+        self.log.emit(msg.format(instance_profile_name))
+        waiter = Waiter(
+            self.get_instance_profile_states,
+            "exists",
+            "instance_profile",
+            self.log,
+            delays=(1, 2, 3, 5),
+            timeout=INSTANCE_PROFILE_TIMEOUT,
+        )
+        waiter.wait([instance_profile_name])
 
     def _get_or_create_iam_instance_profile(self, instance_profile_name):
         instance_profile = self.get_instance_profile(instance_profile_name)
         if instance_profile is None:
-            instance_profile = self.create_instance_profile(instance_profile_name)
+            self.create_instance_profile(instance_profile_name)
+            # IAM is eventually consistent, wait until we can read it back.
+            self.wait_for_instance_profile(instance_profile_name)
+            instance_profile = self.get_instance_profile(instance_profile_name)
         return instance_profile
 
     def instance_profiles(self, instance_role_cfg):
         msg = "make sure {} instance_profile and iam_role exist"
-        for role_name, role_data in instance_role_cfg.items():
-            profile_name = role_data.get("instance_profile_name", None)
-            if profile_name:
-                self.log.emit(msg.format(profile_name))
-                self._get_or_create_iam_instance_profile(profile_name)
+        profile_names = set(
+            role_data.get("instance_profile_name", None)
+            for role_data in instance_role_cfg.values()
+        )
+        for profile_name in sorted(filter(None, profile_names)):
+            self.log.emit(msg.format(profile_name))
+            self._get_or_create_iam_instance_profile(profile_name)
 
     def instance_roles(self, instance_role_cfg):
         """Create instance roles defined in config."""
@@ -514,24 +846,30 @@ class EnvironmentBuilder(object):
             # exit early.
             return None
 
-        # sort by subnets by amount of instances, smallest first.
-        subnets = sorted(subnets, key=lambda sn: collection_len(sn.instances))
-
-        # determine the count of this role's existing instances.
+        # one inventory pass: instances per subnet and this role's placements.
         # Note: we look for role in all subnets, not just the listed subnets.
-        existing_count = len(self.evpc.get_role(role_name))
+        with self.evpc.snapshot():
+            subnet_load = {}
+            for instance in self.evpc.get_inventory("instances"):
+                load = subnet_load.get(instance.subnet_id, 0)
+                subnet_load[instance.subnet_id] = load + 1
+            existing = [
+                (instance.subnet_id, instance.placement["AvailabilityZone"])
+                for instance in self.evpc.get_role(role_name)
+            ]
+
+        # prefer subnets with the fewest instances, smallest first.
+        subnets = sorted(subnets, key=lambda sn: subnet_load.get(sn.id, 0))
+        launch_plan = plan_instance_role_launch(
+            desired_count, [(sn.id, sn.availability_zone) for sn in subnets], existing
+        )
 
-        if existing_count >= desired_count:
+        if not launch_plan:
             # for now we exit early, maybe terminate extras...
             msg = "skipping role: {} (existing_count {} is greater than or equal to {})"
-            self.log.emit(msg.format(role_name, existing_count, desired_count), "debug")
+            self.log.emit(msg.format(role_name, len(existing), desired_count), "debug")
             return None
 
-        # determine count of additional instances needed to reach desired_count.
-        needed_count = desired_count - existing_count
-        needed_per_subnet = desired_count / len(subnets)
-        needed_remainder = desired_count % len(subnets)
-
         block_device_map = get_block_device_map_from_role_config(role_data)
 
         role_instances = []
@@ -554,24 +892,13 @@ class EnvironmentBuilder(object):
         if private_ip_address:
             kwargs["PrivateIpAddress"] = private_ip_address
 
-        for subnet in subnets:
+        subnets_by_id = dict((sn.id, sn) for sn in subnets)
+
+        for subnet_id, count in launch_plan:
+            subnet = subnets_by_id[subnet_id]
             # ensure Run_Instance_Idempotency.html#client-tokens
             kwargs["ClientToken"] = str(uuid4())
 
-            # figure out how many instances this subnet needs to create ...
-            existing_in_subnet = len(
-                self.evpc.get_role(role_name, subnet.instances.all())
-            )
-            count = needed_per_subnet - existing_in_subnet
-
-            if needed_remainder != 0:
-                needed_remainder -= 1
-                count += 1
-
-            if count == 0:
-                # skip this subnet, it doesn't need to launch any instances.
-                continue
-
             subnet_name = make_tag_dict(subnet)["Name"]
             msg = "{} instances of role {} launching into {} subnet"
             self.log.emit(msg.format(count, role_name, subnet_name))
@@ -587,6 +914,8 @@ class EnvironmentBuilder(object):
         for instance in role_instances:
             update_tags(instance, role=role_name)
 
+        self.evpc.add_to_snapshot("instances", role_instances)
+
     # retry because iam role not ready right away...
     @retry(wait_exponential_multiplier=1000, wait_exponential_max=10000)
     def _create_instances(self, subnet, **kwargs):
@@ -675,12 +1004,19 @@ class EnvironmentBuilder(object):
         self.log.emit(msg.format(instance.identity, hostname))
         update_tags(instance, Name=hostname)
 
-    def tag_instance_volumes(self, instance):
-        """Accept an EnrichedInstance, tag all attached volumes."""
+    def tag_instance_volumes(self, instance, tag_writer=None):
+        """
+        Accept an EnrichedInstance, tag all attached volumes.
+
+        Pass a TagWriter to coalesce the writes with other tag writes.
+        """
+        if tag_writer is None:
+            with TagWriter(self.boto.ec2_client) as tag_writer:
+                return self.tag_instance_volumes(instance, tag_writer)
         msg = "tagging volumes for instance {} (Name:{})"
-        for volume in instance.volumes.all():
+        for volume in self.evpc.get_instance_volumes(instance):
             self.log.emit(msg.format(instance.identity, instance.identity))
-            update_tags(volume, Name=instance.identity)
+            tag_writer.update(volume, Name=instance.identity)
 
     def add_eip_to_instance(self, instance):
         eip1_msg = "allocating and associating eip for {}"
@@ -689,31 +1025,47 @@ class EnvironmentBuilder(object):
         eip = instance.allocate_and_associate_eip()
         self.log.emit(eip2_msg.format(eip.public_ip, instance.identity))
 
-    @retry(wait_exponential_multiplier=1000, wait_exponential_max=10000)
-    def wait_for_instance_roles_to_exist(self, instance_role_cfg):
-        raw_msg = "waiting: we desire {} instances but only {} exist in role {}"
+    def get_instance_role_states(self, instance_role_cfg, role_names):
+        """Return dict of role name to ready or actual/desired counts."""
+        # autoscaling launches instances behind our back, always re-read them.
+        self.evpc.invalidate_snapshot("instances")
         roles = self.evpc.roles
-        for role_name, role_cfg in instance_role_cfg.items():
-            desired_count = role_cfg.get("count", 0)
+        states = {}
+        for role_name in role_names:
+            desired_count = instance_role_cfg[role_name].get("count", 0)
             actual_count = len(roles.get(role_name, []))
             if desired_count > actual_count:
-                msg = raw_msg.format(desired_count, actual_count, role_name)
-                self.log.emit(msg, "debug")
-                raise Exception(msg)
+                states[role_name] = "{}/{}".format(actual_count, desired_count)
+            else:
+                states[role_name] = "ready"
+        return states
+
+    def wait_for_instance_roles_to_exist(self, instance_role_cfg):
+        """Block until every instance role has its desired count of instances."""
+        waiter = Waiter(
+            lambda role_names: self.get_instance_role_states(
+                instance_role_cfg, role_names
+            ),
+            "ready",
+            "instance_role",
+            self.log,
+        )
+        waiter.wait(list(instance_role_cfg.keys()))
 
     def finish_instance_roles(self, instance_role_cfg, instances=None):
         instances = self.evpc.get_instances(instances)
 
-        for instance in instances:
+        # wait for every instance at once with batched describe calls.
+        self.evpc.wait_until_instances(instances, "running")
+
+        # modify_attribute has no multi id form, call it concurrently later.
+        source_dest_check_disable = []
 
-            self.log.emit("waiting for {} to start".format(instance))
-            instance.wait_until_running()
+        for instance in instances:
 
             # this method call will block (retry) until instance is named.
             self.tag_instance_name(instance)
 
-            self.tag_instance_volumes(instance)
-
             requires_eip = instance_role_cfg.get(instance.role, {}).get("eip", False)
             if requires_eip and len(instance.eips) == 0:
                 # if instance role should have an eip but doesn't have one, add one.
@@ -726,7 +1078,19 @@ class EnvironmentBuilder(object):
                 self.log.emit(
                     "disable source dest check for {}".format(instance.identity)
                 )
-                instance.source_dest_check_disable()
+                source_dest_check_disable.append(instance)
+
+        self.evpc.source_dest_check_disable_instances(source_dest_check_disable)
+
+        # every instance is running, discover all their volumes at once
+        # and flush the volume tags in batches.
+        self.evpc.invalidate_snapshot("volumes")
+        with TagWriter(self.boto.ec2_client) as tag_writer:
+            for instance in instances:
+                self.tag_instance_volumes(instance, tag_writer)
+
+        # names and states changed, forget the instances we knew.
+        self.evpc.invalidate_snapshot("instances", "volumes")
 
         try:
             self.log.emit(
@@ -886,8 +1250,11 @@ class EnvironmentBuilder(object):
             if key not in reserved_tags:
                 safe_tags[key] = str(value)
 
-        taggable_resources = self.evpc.taggable_resources
-        for resource in taggable_resources:
-            if safe_tags:
+        if not safe_tags:
+            return None
+
+        # resources with identical tag deltas are tagged in batched calls.
+        with TagWriter(self.boto.ec2_client) as tag_writer:
+            for resource in self.evpc.taggable_resources:
                 self.log.emit("tagging {} with {} ...".format(resource, safe_tags))
-                update_tags(resource, **safe_tags)
+                tag_writer.update(resource, **safe_tags)
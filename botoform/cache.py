@@ -0,0 +1,159 @@
+import fcntl
+import json
+import os
+import re
+import time
+
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile
+from threading import Thread
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "botoform")
+
+# seconds a cached value is fresh.
+DEFAULT_TTL = 300
+
+
+def add_cache_arguments(parser):
+    """
+    Attach --cache-ttl, --refresh and --revalidate to a plugin's parser.
+
+    :param parser: An ArgumentParser sub parser.
+
+    :returns: None
+    """
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=DEFAULT_TTL,
+        help="seconds cached results stay fresh, 0 disables the cache",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        default=False,
+        help="ignore cached results and query AWS",
+    )
+    parser.add_argument(
+        "--revalidate",
+        action="store_true",
+        default=False,
+        help="output stale cached results now, refresh them in the background",
+    )
+
+
+class DiskCache(object):
+    """
+    A JSON file per key with a TTL, safe to share between processes.
+
+    Computing a missing or stale value holds a per key file lock, so
+    parallel invocations wait for one another instead of all querying AWS.
+    """
+
+    def __init__(self, namespace, ttl=DEFAULT_TTL, cache_dir=None):
+        """
+        :param namespace: A directory name to separate kinds of values.
+        :param ttl: Optional, seconds a cached value is fresh.
+        :param cache_dir: Optional, defaults to ~/.cache/botoform.
+        """
+        cache_dir = cache_dir if cache_dir is not None else DEFAULT_CACHE_DIR
+        self.directory = os.path.join(cache_dir, namespace)
+        self.ttl = ttl
+
+    def path(self, key, extension=".json"):
+        """Return the file path of a key, a tuple of strings."""
+        name = "-".join(str(part) for part in key)
+        return os.path.join(self.directory, re.sub(r"[^\w.-]", "_", name) + extension)
+
+    def read(self, key):
+        """
+        Return a (value, age in seconds) tuple, or (None, None) if missing.
+        """
+        try:
+            with open(self.path(key)) as f:
+                document = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None, None
+        return document["value"], time.time() - document["written"]
+
+    def write(self, key, value):
+        """Atomically replace the cached value of key."""
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                # another process created it.
+                pass
+        document = {"written": time.time(), "value": value}
+        with NamedTemporaryFile(
+            "w", dir=self.directory, suffix=".tmp", delete=False
+        ) as f:
+            json.dump(document, f)
+        os.rename(f.name, self.path(key))
+
+    @contextmanager
+    def lock(self, key, blocking=True):
+        """
+        Hold an exclusive per key file lock while in context.
+
+        :param blocking: Optional, if False yield False when already locked.
+
+        :returns: A context manager which yields True if the lock is held.
+        """
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory)
+            except OSError:
+                pass
+        with open(self.path(key, ".lock"), "a") as f:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            try:
+                fcntl.flock(f, flags)
+            except IOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _compute(self, key, compute, started):
+        with self.lock(key):
+            # another process may have written while we waited for the lock.
+            value, age = self.read(key)
+            if age is not None and age <= time.time() - started:
+                return value
+            value = compute()
+            self.write(key, value)
+            return value
+
+    def _revalidate(self, key, compute):
+        with self.lock(key, blocking=False) as locked:
+            if locked:
+                self.write(key, compute())
+
+    def get(self, key, compute, refresh=False, revalidate=False):
+        """
+        Return the cached value of key, computing it when needed.
+
+        :param key: A tuple of strings, for example (profile, region).
+        :param compute: A callable which returns a JSON serializable value.
+        :param refresh: Optional, ignore the cached value.
+        :param revalidate:
+          Optional, return a stale value now and compute a fresh value
+          in a background thread.
+
+        :returns: The cached or computed value.
+        """
+        if self.ttl <= 0:
+            return compute()
+        started = time.time()
+        value, age = self.read(key)
+        if age is not None and not refresh:
+            if age < self.ttl:
+                return value
+            if revalidate:
+                # not a daemon, the process finishes the refresh before exit.
+                Thread(target=self._revalidate, args=(key, compute)).start()
+                return value
+        return self._compute(key, compute, started)
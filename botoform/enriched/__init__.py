@@ -14,4 +14,10 @@ from elasticache import EnrichedElastiCache
 
 from rds import EnrichedRds
 
-from enriched import Enriched, EnrichedRouteTable, EnrichedSubnet, EnrichedSecurityGroup
+from enriched import (
+    Enriched,
+    EnrichedClient,
+    EnrichedRouteTable,
+    EnrichedSubnet,
+    EnrichedSecurityGroup,
+)
@@ -1,19 +1,13 @@
-from ..util import reflect_attrs, merge_pages, get_ids
-
-from nested_lookup import nested_lookup
+from ..util import merge_pages, get_ids
 
+from .enriched import EnrichedClient
 
-class EnrichedAutoscaling(object):
+from nested_lookup import nested_lookup
 
-    def __init__(self, evpc):
-        # save the EnrichedVpc object.
-        self.evpc = evpc
 
-        # capture a list of this classes attributes before reflecting.
-        self.self_attrs = dir(self)
+class EnrichedAutoscaling(EnrichedClient):
 
-        # reflect all connection attributes into EnrichedElb.
-        reflect_attrs(self, self.evpc.boto.autoscaling, self.self_attrs)
+    client_name = "autoscaling"
 
     def get_all_autoscaling_group_descriptions(self):
         """Return a list of all autoscaling groups descriptions."""
@@ -24,7 +18,7 @@ class EnrichedAutoscaling(object):
         """Return a list of related autoscaling groups descriptions."""
         descriptions = []
         # get this vpc's subnet_ids.
-        vpc_subnet_ids = get_ids(self.evpc.subnets.all())
+        vpc_subnet_ids = get_ids(self.evpc.get_inventory("subnets"))
         for asg in self.get_all_autoscaling_group_descriptions():
             # autoscaling descriptions hold subnets as CSV string, so we create a set.
             asg_subnet_ids = set(asg["VPCZoneIdentifier"].split(","))
@@ -47,7 +41,7 @@ class EnrichedAutoscaling(object):
         """Return a list of related launch configuration descriptions."""
         descriptions = []
         # get this vpc's security_group_ids.
-        vpc_security_group_ids = get_ids(self.evpc.security_groups.all())
+        vpc_security_group_ids = get_ids(self.evpc.get_inventory("security_groups"))
         for lc in self.get_all_launch_config_descriptions():
             lc_security_group_ids = set(lc["SecurityGroups"])
             # we compare the security_group ids from lc and vpc and assume relations on intersections.
@@ -1,19 +1,13 @@
 from nested_lookup import nested_lookup
 
-from ..util import reflect_attrs, merge_pages
+from ..util import merge_pages
 
+from .enriched import EnrichedClient
 
-class EnrichedEcs(object):
 
-    def __init__(self, evpc):
-        # save the EnrichedVpc object.
-        self.evpc = evpc
+class EnrichedEcs(EnrichedClient):
 
-        # capture a list of this classes attributes before reflecting.
-        self.self_attrs = dir(self)
-
-        # reflect all attributes of Client into EnrichedEcs.
-        reflect_attrs(self, self.evpc.boto.ecs_client, self.self_attrs)
+    client_name = "ecs_client"
 
     def list_all_service_arns(self, cluster):
         """
@@ -1,19 +1,38 @@
 from nested_lookup import nested_lookup
 
-from ..util import reflect_attrs, merge_pages
+from ..util import merge_pages
 
+from .enriched import EnrichedClient
 
-class EnrichedElastiCache(object):
+from ..waiters import Waiter, GONE
 
-    def __init__(self, evpc):
-        # save the EnrichedVpc object.
-        self.evpc = evpc
+# waiter name: desired cache cluster states.
+CLUSTER_WAITER_STATES = {
+    "cache_cluster_available": ["available"],
+    "cache_cluster_deleted": ["deleted", GONE],
+}
 
-        # capture a list of this classes attributes before reflecting.
-        self.self_attrs = dir(self)
+# waiter name: cache cluster states which never reach the desired states.
+CLUSTER_WAITER_FAILURE_STATES = {
+    "cache_cluster_available": [
+        "deleted",
+        "deleting",
+        "incompatible-network",
+        "restore-failed",
+    ],
+    "cache_cluster_deleted": [
+        "creating",
+        "incompatible-network",
+        "modifying",
+        "restore-failed",
+        "snapshotting",
+    ],
+}
 
-        # reflect all attributes of Client into EnrichedElastiCache.
-        reflect_attrs(self, self.evpc.boto.elasticache, self.self_attrs)
+
+class EnrichedElastiCache(EnrichedClient):
+
+    client_name = "elasticache"
 
     def get_all_subnet_group_descriptions(self):
         pages = self.get_paginator("describe_cache_subnet_groups").paginate()
@@ -51,12 +70,31 @@ class EnrichedElastiCache(object):
         descriptions = self.get_related_cluster_descriptions()
         return nested_lookup("CacheClusterId", descriptions)
 
+    def get_cluster_states(self, cluster_ids=None):
+        """return a dict of cache cluster id to status."""
+        return dict(
+            (d["CacheClusterId"], d["CacheClusterStatus"])
+            for d in self.get_all_cluster_descriptions()
+        )
+
     def wait_for_related_clusters(self, waiter_name, cluster_ids=None):
-        """wait for related dbs to transition to desired state."""
+        """wait for related clusters to transition to desired state."""
         if cluster_ids is None:
             cluster_ids = self.get_related_cluster_ids()
-        for cluster_id in cluster_ids:
-            self.get_waiter(waiter_name).wait(CacheClusterId=cluster_id)
+        if waiter_name not in CLUSTER_WAITER_STATES:
+            for cluster_id in cluster_ids:
+                self.get_waiter(waiter_name).wait(CacheClusterId=cluster_id)
+            return None
+        desired = CLUSTER_WAITER_STATES[waiter_name]
+        failure = CLUSTER_WAITER_FAILURE_STATES[waiter_name]
+        waiter = Waiter(
+            self.get_cluster_states,
+            desired,
+            "elasticache",
+            self.evpc.log,
+            failure=failure,
+        )
+        waiter.wait(cluster_ids)
 
     def delete_related_cache_clusters(self, cluster_ids=None):
         """
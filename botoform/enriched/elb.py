@@ -1,19 +1,13 @@
-from ..util import reflect_attrs, merge_pages, get_ids
-
-from nested_lookup import nested_lookup
+from ..util import merge_pages, get_ids
 
+from .enriched import EnrichedClient
 
-class EnrichedElb(object):
+from nested_lookup import nested_lookup
 
-    def __init__(self, evpc):
-        # save the EnrichedVpc object.
-        self.evpc = evpc
 
-        # capture a list of this classes attributes before reflecting.
-        self.self_attrs = dir(self)
+class EnrichedElb(EnrichedClient):
 
-        # reflect all connection attributes into EnrichedElb.
-        reflect_attrs(self, self.evpc.boto.elb, self.self_attrs)
+    client_name = "elb"
 
     def get_all_elb_descriptions(self):
         """Return a list of all ELB (Load Balancer) descriptions."""
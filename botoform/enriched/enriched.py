@@ -1,4 +1,4 @@
-from botoform.util import reflect_attrs, make_tag_dict, id_to_human
+from botoform.util import class_attrs, make_tag_dict, id_to_human
 
 
 class Enriched(object):
@@ -6,23 +6,28 @@ class Enriched(object):
     This class uses composition to enrich Boto3's "ec2_object" classes.
 
     This class provides additional "helper" methods and attributes.
+
+    Attributes missing from this class are lazily looked up on ec2_object.
     """
 
+    __slots__ = ("ec2_object", "evpc")
+
     def __init__(self, ec2_object, evpc=None):
         """
         :param ec2_object: an object with tags 
         :param evpc: An instance of :meth:`botoform.enriched.vpc.EnrichedVPC`
         """
-        if evpc is not None:
-            self.evpc = evpc
-
+        self.evpc = evpc
         self.ec2_object = ec2_object
 
-        # capture a list of this classes attributes before reflecting.
-        self.self_attrs = dir(self)
+    def __getattr__(self, name):
+        """Composition Magic: delegate missing attributes to ec2_object."""
+        if name.startswith("__") or name in Enriched.__slots__:
+            raise AttributeError(name)
+        return getattr(self.ec2_object, name)
 
-        # reflect all attributes of ec2_object into self.
-        self.reflect_attrs()
+    def __dir__(self):
+        return sorted(class_attrs(type(self)).union(dir(self.ec2_object)))
 
     def __eq__(self, other):
         """Determine if equal by id"""
@@ -38,14 +43,9 @@ class Enriched(object):
     def __str__(self):
         return self.identity
 
-    def reflect_attrs(self):
-        """reflect all attributes of ec2_object into self."""
-        reflect_attrs(self, self.ec2_object, skip_attrs=self.self_attrs)
-
     def reload(self):
-        """run the reload method on the attached ec2_object and reflect_attrs."""
+        """run the reload method on the attached ec2_object."""
         self.ec2_object.reload()
-        self.reflect_attrs()
 
     @property
     def tag_dict(self):
@@ -69,12 +69,43 @@ class Enriched(object):
 
 
 class EnrichedRouteTable(Enriched):
-    pass
+    __slots__ = ()
 
 
 class EnrichedSubnet(Enriched):
-    pass
+    __slots__ = ()
 
 
 class EnrichedSecurityGroup(Enriched):
-    pass
+    __slots__ = ()
+
+
+class EnrichedClient(object):
+    """
+    This class uses composition to enrich a Boto3 client of an EnrichedVPC.
+
+    Attributes missing from this class are lazily looked up on the client
+    named client_name, so the client is only created when first used.
+    """
+
+    # the BotoConnections attribute name of the client to enrich.
+    client_name = None
+
+    def __init__(self, evpc):
+        """
+        :param evpc: An instance of :meth:`botoform.enriched.vpc.EnrichedVPC`
+        """
+        self.evpc = evpc
+
+    @property
+    def client(self):
+        return getattr(self.evpc.boto, self.client_name)
+
+    def __getattr__(self, name):
+        """Composition Magic: delegate missing attributes to the client."""
+        if name.startswith("__") or name in ("evpc", "client", "client_name"):
+            raise AttributeError(name)
+        return getattr(self.client, name)
+
+    def __dir__(self):
+        return sorted(class_attrs(type(self)).union(self.__dict__, dir(self.client)))
@@ -0,0 +1,90 @@
+from botoform.util import make_tag_dict
+
+
+class InstanceIndex(object):
+    """
+    Hash index of EnrichedInstance objects by identifier and by role.
+
+    Each instance's role is computed once when the index is built and its
+    identifiers once on the first identifier lookup, so every lookup
+    afterwards is a dictionary hit.
+    """
+
+    def __init__(self, instances):
+        """
+        :param instances: A list of EnrichedInstance objects to index.
+        """
+        self.instances = list(instances)
+        self.roles = {}
+        for instance in self.instances:
+            self.roles.setdefault(instance.role, []).append(instance)
+        self._identifiers = None
+
+    @property
+    def identifiers(self):
+        """Return a dict where identifier is the key and instances the value."""
+        if self._identifiers is None:
+            self._identifiers = {}
+            for instance in self.instances:
+                # an identifier may repeat, for example hostname and shortname.
+                for identifier in set(instance.identifiers):
+                    self._identifiers.setdefault(identifier, []).append(instance)
+        return self._identifiers
+
+    def find(self, identifier):
+        """Return a possibly empty list of instances which have identifier."""
+        return list(self.identifiers.get(identifier, []))
+
+    def role(self, role_name):
+        """Return a possibly empty list of instances in role_name."""
+        return list(self.roles.get(role_name, []))
+
+    def select(self, identifiers=None, roles=None, exclude=False):
+        """
+        Return a list of instances which match either qualifier list.
+
+        Instances are returned in the order they were indexed.
+
+        :param identifiers: Optional, a list of identifiers to qualify by.
+        :param roles: Optional, a list of roles to qualify by.
+        :param exclude: If True, qualifiers exclude instead of include!
+
+        :returns: A list of EnrichedInstance objects or an empty list.
+        """
+        qualified = set()
+        for identifier in identifiers or []:
+            qualified.update(id(i) for i in self.identifiers.get(identifier, []))
+        for role_name in roles or []:
+            qualified.update(id(i) for i in self.roles.get(role_name, []))
+        return [i for i in self.instances if (id(i) in qualified) != exclude]
+
+
+class NameIndex(object):
+    """
+    Hash index of Boto3 resources by Name tag.
+
+    A resource is found by its short name or by its long name, which is
+    prefixed with the VPC name, for example web or webapp01-web.
+    """
+
+    def __init__(self, resources, vpc_name):
+        """
+        :param resources: A list of tagable Boto3 resources to index.
+        :param vpc_name: The VPC name which prefixes long names.
+        """
+        self.vpc_name = vpc_name
+        self.names = {}
+        self.add(resources)
+
+    def add(self, resources):
+        """Index newly created resources."""
+        for resource in resources:
+            name = make_tag_dict(resource).get("Name", None)
+            if name is not None:
+                self.names.setdefault(name, []).append(resource)
+
+    def get(self, name):
+        """Return the only resource named name or {vpc_name}-{name}, else None."""
+        longname = "{}-{}".format(self.vpc_name, name)
+        resources = self.names.get(name, []) + self.names.get(longname, [])
+        return resources[0] if len(resources) == 1 else None
@@ -1,6 +1,6 @@
 import re
 
-from botoform.util import reflect_attrs, make_tag_dict, id_to_human
+from botoform.util import class_attrs, make_tag_dict, id_to_human
 
 from retrying import retry
 
@@ -14,8 +14,12 @@ class EnrichedInstance(object):
     Reference:
 
     https://boto3.readthedocs.org/en/latest/reference/services/ec2.html#instance
+
+    Attributes missing from this class are lazily looked up on instance.
     """
 
+    __slots__ = ("instance", "evpc")
+
     def __init__(self, instance, evpc=None):
         """
         EnrichedInstance Resource.
@@ -24,16 +28,17 @@ class EnrichedInstance(object):
         :param evpc: An instance of :meth:`botoform.enriched.vpc.EnrichedVPC`
         
         """
-        if evpc is not None:
-            self.evpc = evpc
-
+        self.evpc = evpc
         self.instance = instance
 
-        # capture a list of this classes attributes before reflecting.
-        self.self_attrs = dir(self)
+    def __getattr__(self, name):
+        """Composition Magic: delegate missing attributes to ec2.Instance."""
+        if name.startswith("__") or name in EnrichedInstance.__slots__:
+            raise AttributeError(name)
+        return getattr(self.instance, name)
 
-        # reflect all attributes of ec2.Instance into self.
-        self.reflect_attrs()
+    def __dir__(self):
+        return sorted(class_attrs(type(self)).union(dir(self.instance)))
 
     def __eq__(self, other):
         """Determine if equal by instance id"""
@@ -49,14 +54,9 @@ class EnrichedInstance(object):
     def __str__(self):
         return self.identity
 
-    def reflect_attrs(self):
-        """reflect all attributes of ec2.Instance into self."""
-        reflect_attrs(self, self.instance, skip_attrs=self.self_attrs)
-
     def reload(self):
-        """run the reload method on the attached instance and reflect_attrs."""
+        """run the reload method on the attached instance."""
         self.instance.reload()
-        self.reflect_attrs()
 
     @property
     def tag_dict(self):
@@ -165,18 +165,13 @@ class EnrichedInstance(object):
     def eips(self):
         """
         Return a list of VpcAddress objects associated to this instance.
+
+        Read from the VPC's address map, see
+        :meth:`botoform.enriched.vpc.EnrichedVPC.get_eip_map`.
+
         :rtype: list
         """
-        instance_id_filter = [{"Name": "instance-id", "Values": [self.id]}]
-        address_descriptions = self.evpc.boto.ec2_client.describe_addresses(
-            Filters=instance_id_filter
-        )["Addresses"]
-        addresses = []
-        for address_description in address_descriptions:
-            addresses.append(
-                self.evpc.boto.ec2.VpcAddress(address_description["AllocationId"])
-            )
-        return addresses
+        return list(self.evpc.get_eip_map([self.id]).get(self.id, []))
 
     def wait_until_status_ok(self):
         """Wait (block) until this instance state is 'OK'."""
@@ -214,6 +209,7 @@ class EnrichedInstance(object):
         self.wait_until_running()
         eip = self._get_eip_by_allocation_id(allocation_id)
         eip.associate(InstanceId=self.id)
+        self.evpc.add_eip_to_snapshot(self.id, eip)
         self.reload()
         return eip
 
@@ -233,8 +229,5 @@ class EnrichedInstance(object):
 
         :rtype: None
         """
-        for eip in self.eips:
-            eip.association.delete()
-            if release is True:
-                eip.release()
+        self.evpc.disassociate_eips([self], release)
         self.reload()
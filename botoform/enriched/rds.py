@@ -2,20 +2,39 @@ from datetime import datetime
 
 from nested_lookup import nested_lookup
 
-from ..util import reflect_attrs, generate_password
+from ..util import generate_password, make_filter, merge_pages
 
+from .enriched import EnrichedClient
 
-class EnrichedRds(object):
+from ..waiters import Waiter, GONE
 
-    def __init__(self, evpc):
-        # save the EnrichedVpc object.
-        self.evpc = evpc
+# waiter name: desired db instance states.
+DB_WAITER_STATES = {
+    "db_instance_available": ["available"],
+    "db_instance_deleted": ["deleted", GONE],
+}
 
-        # capture a list of this classes attributes before reflecting.
-        self.self_attrs = dir(self)
+# waiter name: db instance states which never reach the desired states.
+DB_WAITER_FAILURE_STATES = {
+    "db_instance_available": [
+        "deleted",
+        "deleting",
+        "failed",
+        "incompatible-restore",
+        "incompatible-parameters",
+    ],
+    "db_instance_deleted": [
+        "creating",
+        "modifying",
+        "rebooting",
+        "resetting-master-credentials",
+    ],
+}
 
-        # reflect all connection attributes into EnrichedRds.
-        reflect_attrs(self, self.evpc.boto.rds, self.self_attrs)
+
+class EnrichedRds(EnrichedClient):
+
+    client_name = "rds"
 
     def get_all_db_descriptions(self):
         """return a list of all db description dictionaries."""
@@ -51,12 +70,30 @@ class EnrichedRds(object):
             }
         return db_connection_data
 
+    def get_db_states(self, db_ids):
+        """return a dict of db instance identifier to status."""
+        pages = self.get_paginator("describe_db_instances").paginate(
+            Filters=make_filter("db-instance-id", list(db_ids))
+        )
+        return dict(
+            (d["DBInstanceIdentifier"], d["DBInstanceStatus"])
+            for d in merge_pages("DBInstances", pages)
+        )
+
     def wait_for_related_dbs(self, waiter_name, db_ids=None):
         """wait for related dbs to transition to desired state."""
         if db_ids is None:
             db_ids = self.get_related_db_ids()
-        for db_id in db_ids:
-            self.get_waiter(waiter_name).wait(DBInstanceIdentifier=db_id)
+        if waiter_name not in DB_WAITER_STATES:
+            for db_id in db_ids:
+                self.get_waiter(waiter_name).wait(DBInstanceIdentifier=db_id)
+            return None
+        desired = DB_WAITER_STATES[waiter_name]
+        failure = DB_WAITER_FAILURE_STATES[waiter_name]
+        waiter = Waiter(
+            self.get_db_states, desired, "rds", self.evpc.log, failure=failure
+        )
+        waiter.wait(db_ids)
 
     def delete_related_db_instances(self, db_ids=None, skip_snapshot=False):
         """
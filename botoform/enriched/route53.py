@@ -1,17 +1,11 @@
-from ..util import reflect_attrs, update_tags, generate_password
+from ..util import update_tags, generate_password
 
+from .enriched import EnrichedClient
 
-class EnrichedRoute53(object):
 
-    def __init__(self, evpc):
-        # save the EnrichedVpc object.
-        self.evpc = evpc
+class EnrichedRoute53(EnrichedClient):
 
-        # capture a list of this classes attributes before reflecting.
-        self.self_attrs = dir(self)
-
-        # reflect all connection attributes into EnrichedElb.
-        reflect_attrs(self, self.evpc.boto.route53, self.self_attrs)
+    client_name = "route53"
 
     @property
     def private_zone_name(self):
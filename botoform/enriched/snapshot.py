@@ -0,0 +1,115 @@
+from threading import RLock
+
+
+class Snapshot(object):
+    """
+    A point-in-time inventory of AWS resources related to an EnrichedVPC.
+
+    Each kind of resource (instances, subnets, ...) is read from AWS once,
+    on first access. Every following read is served from memory until the
+    kind is invalidated or the snapshot is released.
+
+    A snapshot may be shared by threads, for example concurrent build stages.
+    """
+
+    def __init__(self, fetchers):
+        """
+        :param fetchers:
+          A dict where kind is the key and the value is a callable which
+          returns an iterable of Boto3 resources of that kind.
+        """
+        self.fetchers = fetchers
+        self.inventory = {}
+        self.indexes = {}
+        self.lock = RLock()
+
+    @property
+    def kinds(self):
+        """Return a list of resource kinds this snapshot knows how to read."""
+        return list(self.fetchers.keys())
+
+    def loaded(self, kind):
+        """Return True if kind was already read from AWS."""
+        with self.lock:
+            return kind in self.inventory
+
+    def get(self, kind):
+        """
+        Return a list of resources of kind, read from AWS at most once.
+
+        :param kind: A resource kind, for example 'instances' or 'subnets'.
+
+        :returns: list of Boto3 resources
+        """
+        with self.lock:
+            if kind not in self.inventory:
+                # external API call to AWS.
+                self.inventory[kind] = list(self.fetchers[kind]())
+            return self.inventory[kind]
+
+    def index(self, kind, name, build):
+        """
+        Return an index of kind, built at most once per inventory load.
+
+        :param kind: A resource kind, for example 'instances' or 'subnets'.
+        :param name: The name of this index, a kind may have many indexes.
+        :param build: A callable which accepts the list of resources of kind.
+
+        :returns: The object returned by build.
+        """
+        key = (kind, name)
+        with self.lock:
+            if key not in self.indexes:
+                self.indexes[key] = build(self.get(kind))
+            return self.indexes[key]
+
+    def _drop_indexes(self, kind):
+        for key in list(self.indexes.keys()):
+            if key[0] == kind:
+                del self.indexes[key]
+
+    def add(self, kind, resources):
+        """
+        Patch newly created resources into an already loaded kind.
+
+        If the kind was not loaded yet we do nothing, the next read from AWS
+        will include the new resources anyway. Indexes of kind with an add
+        method are updated in place, other indexes are rebuilt on next use.
+
+        :param kind: A resource kind, for example 'instances' or 'subnets'.
+        :param resources: A list of Boto3 resources to add.
+
+        :returns: None
+        """
+        with self.lock:
+            if kind not in self.inventory:
+                return None
+            known_ids = set(resource.id for resource in self.inventory[kind])
+            added = []
+            for resource in resources:
+                if resource.id not in known_ids:
+                    known_ids.add(resource.id)
+                    added.append(resource)
+            self.inventory[kind] += added
+            # update indexes which know how to add, drop the others.
+            for key in list(self.indexes.keys()):
+                if key[0] == kind:
+                    if hasattr(self.indexes[key], "add"):
+                        self.indexes[key].add(added)
+                    else:
+                        del self.indexes[key]
+
+    def invalidate(self, *kinds):
+        """
+        Forget the given kinds (all kinds if none given).
+
+        The next read of an invalidated kind is read from AWS again.
+
+        :param kinds: Optional, resource kinds to forget.
+
+        :returns: None
+        """
+        with self.lock:
+            for kind in kinds or list(self.inventory.keys()):
+                self.inventory.pop(kind, None)
+                self._drop_indexes(kind)
@@ -1,14 +1,31 @@
 from botoform.util import (
     BotoConnections,
     Log,
-    reflect_attrs,
+    class_attrs,
+    chunks,
+    run_concurrently,
+    iter_concurrently,
+    run_dag,
+    DEFAULT_MAX_WORKERS,
+    get_ids,
     make_tag_dict,
+    make_filter,
     tag_filter,
+    describe_all,
+    hydrate,
     write_private_key,
     update_tags,
-    collection_to_list,
+    format_sg_port,
 )
 
+from contextlib import contextmanager
+
+import re
+
+from botocore.exceptions import ClientError
+
+from botoform.waiters import Waiter, GONE
+
 from instance import EnrichedInstance
 from vpc_endpoint import EnrichedVpcEndpoint
 from autoscaling import EnrichedAutoscaling
@@ -21,26 +38,97 @@ from route53 import EnrichedRoute53
 
 from enriched import Enriched, EnrichedRouteTable, EnrichedSubnet, EnrichedSecurityGroup
 
+from snapshot import Snapshot
+
+from index import InstanceIndex, NameIndex
+
 from nested_lookup import nested_lookup
 
 from retrying import retry
 
+# AWS accepts at most 200 values per describe filter.
+FILTER_BATCH_SIZE = 200
+
+# AWS accepts at most 1000 instance ids per stop/start/terminate call.
+INSTANCE_BATCH_SIZE = 1000
+
+# the outbound rule AWS adds to every new security group.
+DEFAULT_EGRESS_RULE = ("0.0.0.0/0", "-1", -1)
+
+# instance operation: response key which lists the accepted instances.
+INSTANCE_OPERATIONS = {
+    "stop_instances": "StoppingInstances",
+    "start_instances": "StartingInstances",
+    "terminate_instances": "TerminatingInstances",
+}
+
+# desired instance state: instance states which never reach it.
+INSTANCE_FAILURE_STATES = {
+    "running": ["shutting-down", "terminated", "stopping"],
+    "stopped": ["pending", "terminated"],
+    "terminated": ["pending", "stopping"],
+}
+
+# instance ids named in an error message, like InvalidInstanceID.NotFound.
+INSTANCE_ID_PATTERN = re.compile(r"\bi-\w+")
+
+# resource kind: (describe operation, response key, id key, resource, filter)
+DESCRIBE_SPECS = {
+    "instances": (
+        "describe_instances",
+        "Reservations",
+        "InstanceId",
+        "Instance",
+        "vpc-id",
+    ),
+    "subnets": (
+        "describe_subnets",
+        "Subnets",
+        "SubnetId",
+        "Subnet",
+        "vpc-id",
+    ),
+    "security_groups": (
+        "describe_security_groups",
+        "SecurityGroups",
+        "GroupId",
+        "SecurityGroup",
+        "vpc-id",
+    ),
+    "route_tables": (
+        "describe_route_tables",
+        "RouteTables",
+        "RouteTableId",
+        "RouteTable",
+        "vpc-id",
+    ),
+    "internet_gateways": (
+        "describe_internet_gateways",
+        "InternetGateways",
+        "InternetGatewayId",
+        "InternetGateway",
+        "attachment.vpc-id",
+    ),
+}
+
 
 class EnrichedVPC(object):
     """
     This class uses composition to enrich Boto3's VPC resource class.
     Here we relate AWS resources using various techniques like the vpc_name tag.
     We also provide methods for managing the lifecycle of related AWS resources.
+
+    Attributes missing from this class are lazily looked up on the vpc.
     """
 
     def __init__(self, vpc_name=None, region_name=None, profile_name=None, log=None):
         self.boto = BotoConnections(region_name, profile_name)
 
-        # capture a list of this classes attributes before reflecting.
-        self.self_attrs = dir(self)
-
         self.log = log if log is not None else Log()
 
+        # point-in-time inventory, only set while in snapshot context.
+        self._snapshot = None
+
         if vpc_name is not None:
             self.vpc_name = vpc_name
             self.connect(vpc_name)
@@ -48,6 +136,18 @@ class EnrichedVPC(object):
     def __str__(self):
         return self.identity
 
+    def __getattr__(self, name):
+        """Composition Magic: delegate missing attributes to boto3's vpc."""
+        if name.startswith("__") or name == "vpc":
+            raise AttributeError(name)
+        return getattr(self.vpc, name)
+
+    def __dir__(self):
+        attrs = class_attrs(type(self)).union(self.__dict__)
+        if "vpc" in self.__dict__:
+            attrs = attrs.union(dir(self.vpc))
+        return sorted(attrs)
+
     def _get_vpcs_by_filter(self, vpc_filter):
         # external API call to AWS.
         return list(self.boto.ec2.vpcs.filter(Filters=vpc_filter))
@@ -61,21 +161,14 @@ class EnrichedVPC(object):
             raise Exception("VPC not found with tag Name:{}".format(vpc_name))
         return vpcs[0]
 
-    def reflect_attrs(self):
-        """reflect all attributes of boto3's vpc resource object into self."""
-        reflect_attrs(self, self.vpc, skip_attrs=self.self_attrs)
-
     def reload(self):
-        """run the reload method on the attached instance and reflect_attrs."""
+        """run the reload method on the attached vpc."""
         self.vpc.reload()
-        self.reflect_attrs()
 
     def connect(self, vpc_name):
-        """connect to VPC and reflect all attributes into self."""
+        """connect to VPC, missing attributes are looked up on it lazily."""
         self.vpc = self.get_vpc_by_name_tag(vpc_name)
 
-        self.reflect_attrs()
-
         # attach Enriched Connections to self.
         self.vpc_endpoint = EnrichedVpcEndpoint(self)
         self.autoscaling = EnrichedAutoscaling(self)
@@ -106,13 +199,145 @@ class EnrichedVPC(object):
     def identity(self):
         return self.name or self.id
 
+    def _describe_hydrated(self, kind):
+        """
+        Return a list of related resources of kind, hydrated from one
+        paginated describe_* call filtered to this VPC.
+        """
+        operation, key, id_key, resource_name, filter_name = DESCRIBE_SPECS[kind]
+        # external API call to AWS.
+        descriptions = describe_all(
+            self.boto.ec2_client,
+            operation,
+            key,
+            Filters=make_filter(filter_name, self.id),
+        )
+        if kind == "instances":
+            # instances are nested inside reservations.
+            descriptions = [i for r in descriptions for i in r["Instances"]]
+        factory = getattr(self.boto.ec2, resource_name)
+        return hydrate(factory, descriptions, id_key)
+
     def _ec2_instances(self):
         # external API call to AWS.
-        return self.vpc.instances.all()
+        return self._describe_hydrated("instances")
+
+    def _describe_addresses(self, instance_ids=None):
+        """
+        Return a list of VpcAddress objects hydrated from one describe call.
+
+        Pass instance_ids to only describe the addresses associated to them,
+        in batches of FILTER_BATCH_SIZE filter values.
+        """
+        if instance_ids is None:
+            batches = [None]
+        else:
+            batches = chunks(sorted(set(instance_ids)), FILTER_BATCH_SIZE)
+        addresses = []
+        for batch in batches:
+            filters = make_filter("domain", "vpc")
+            if batch is not None:
+                filters += make_filter("instance-id", batch)
+            # external API call to AWS.
+            descriptions = describe_all(
+                self.boto.ec2_client, "describe_addresses", "Addresses", Filters=filters
+            )
+            addresses += hydrate(self.boto.ec2.VpcAddress, descriptions, "AllocationId")
+        return addresses
+
+    def _describe_volumes(self, instance_ids):
+        """
+        Return a list of Volume objects attached to the given instance ids.
+
+        Instance ids are sent in batches of FILTER_BATCH_SIZE filter
+        values, each batch is one paginated describe_volumes call.
+        """
+        volumes, seen = [], set()
+        for batch in chunks(sorted(set(instance_ids)), FILTER_BATCH_SIZE):
+            # external API call to AWS.
+            descriptions = describe_all(
+                self.boto.ec2_client,
+                "describe_volumes",
+                "Volumes",
+                Filters=make_filter("attachment.instance-id", batch),
+            )
+            # multi-attach volumes may show up in more than one batch.
+            descriptions = [d for d in descriptions if d["VolumeId"] not in seen]
+            seen.update(d["VolumeId"] for d in descriptions)
+            volumes += hydrate(self.boto.ec2.Volume, descriptions, "VolumeId")
+        return volumes
+
+    def _inventory_fetchers(self):
+        """Return a dict of resource kind to callable which reads it from AWS."""
+        fetchers = {
+            "instances": lambda: self._ec2_instances(),
+            "addresses": lambda: self._describe_addresses(),
+            "volumes": lambda: self._describe_volumes(
+                get_ids(self.get_inventory("instances"))
+            ),
+        }
+        for kind in DESCRIBE_SPECS:
+            if kind not in fetchers:
+                fetchers[kind] = lambda kind=kind: self._describe_hydrated(kind)
+        return fetchers
+
+    @contextmanager
+    def snapshot(self):
+        """
+        Serve inventory reads from a point-in-time :class:`Snapshot`.
+
+        While in context, instances, subnets, security groups, route tables,
+        internet gateways and addresses are each read from AWS once. Nested calls reuse
+        the outer snapshot. For example::
+
+          with evpc.snapshot():
+              evpc.roles      # reads instances from AWS.
+              evpc.instances  # served from memory.
+
+        :returns: A context manager which yields the Snapshot.
+        """
+        if self._snapshot is not None:
+            yield self._snapshot
+            return
+        self._snapshot = Snapshot(self._inventory_fetchers())
+        try:
+            yield self._snapshot
+        finally:
+            self._snapshot = None
+
+    def invalidate_snapshot(self, *kinds):
+        """Forget given resource kinds (default all) if snapshot is active."""
+        if self._snapshot is not None:
+            self._snapshot.invalidate(*kinds)
+
+    def add_to_snapshot(self, kind, resources):
+        """Patch new resources of kind into the snapshot if active."""
+        if self._snapshot is not None:
+            self._snapshot.add(kind, resources)
+
+    def get_inventory(self, kind):
+        """
+        Return a list of related resources of the given kind.
+
+        Served from memory if a snapshot is active, else read from AWS.
+
+        :param kind:
+          One of instances, subnets, security_groups, route_tables,
+          internet_gateways, addresses or volumes.
+
+        :returns: list of Boto3 resources
+        """
+        if self._snapshot is not None:
+            return self._snapshot.get(kind)
+        return list(self._inventory_fetchers()[kind]())
 
     def _ec2_to_enriched_instances(self, ec2_instances):
         """Convert list of boto.ec2.instance.Instance to EnrichedInstance"""
-        return [EnrichedInstance(e, self) for e in ec2_instances]
+        # already enriched instances (like self from an instance method) pass.
+        return [
+            e if isinstance(e, EnrichedInstance) else EnrichedInstance(e, self)
+            for e in ec2_instances
+        ]
 
     def get_instances(self, instances=None):
         """
@@ -123,9 +348,108 @@ class EnrichedVPC(object):
 
         :returns: list of EnrichedInstance objects
         """
-        instances = self._ec2_instances() if instances is None else instances
+        if instances is None:
+            instances = self.get_inventory("instances")
         return self._ec2_to_enriched_instances(instances)
 
+    def get_eip_map(self, instance_ids=None):
+        """
+        Return a dict where instance id is the key and a list of
+        VpcAddress (EIP) objects associated to that instance is the value.
+
+        Built from a single describe_addresses call (once per snapshot).
+
+        :param instance_ids:
+          Optional, outside a snapshot only describe the addresses
+          associated to these instances instead of every address.
+        """
+
+        def build(addresses):
+            eip_map = {}
+            for address in addresses:
+                if address.instance_id is not None:
+                    eip_map.setdefault(address.instance_id, []).append(address)
+            return eip_map
+
+        if self._snapshot is not None:
+            return self._snapshot.index("addresses", "instance_id", build)
+        if instance_ids is not None:
+            return build(self._describe_addresses(instance_ids))
+        return build(self.get_inventory("addresses"))
+
+    def add_eip_to_snapshot(self, instance_id, eip):
+        """
+        Patch an EIP just associated to instance_id into the snapshot's
+        address map in place, instead of reading every address again.
+        """
+        snapshot = self._snapshot
+        if snapshot is None or not snapshot.loaded("addresses"):
+            return None
+        with snapshot.lock:
+            eip_map = self.get_eip_map()
+            for eips in eip_map.values():
+                # the EIP may be known from before it was associated.
+                eips[:] = [e for e in eips if e.allocation_id != eip.allocation_id]
+            eip_map.setdefault(instance_id, []).append(eip)
+
+    def get_volume_map(self):
+        """
+        Return a dict where instance id is the key and a list of
+        Volume objects attached to that instance is the value.
+
+        Built from batched describe_volumes calls (once per snapshot).
+        """
+
+        def build(volumes):
+            volume_map = {}
+            for volume in volumes:
+                for attachment in volume.attachments:
+                    instance_id = attachment["InstanceId"]
+                    volume_map.setdefault(instance_id, []).append(volume)
+            return volume_map
+
+        if self._snapshot is not None:
+            return self._snapshot.index("volumes", "instance_id", build)
+        return build(self.get_inventory("volumes"))
+
+    def get_instance_volumes(self, instance):
+        """
+        Return a list of Volume objects attached to the given instance.
+
+        Served from the volume index if a snapshot is active, else read
+        from AWS with a single describe_volumes call for this instance.
+        """
+        if self._snapshot is not None:
+            return list(self.get_volume_map().get(instance.id, []))
+        return self._describe_volumes([instance.id])
+
+    def disassociate_eips(self, instances=None, release=True):
+        """
+        Disassociate all EIPs associated with all or a list of instances.
+
+        EIPs are looked up once for every instance. All EIPs are disassociated
+        first, then all of them are released.
+
+        :param instances: Optional, list of instances (default all).
+        :param release: Also release allocations for EIPs. Default True.
+
+        :rtype: None
+        """
+        instance_ids = None if instances is None else get_ids(instances)
+        instances = self.get_instances(instances)
+        eip_map = self.get_eip_map(instance_ids)
+        eips = [eip for i in instances for eip in eip_map.get(i.id, [])]
+        for eip in eips:
+            self.log.emit(
+                "disassociating eip {} from {}".format(eip.public_ip, eip.instance_id)
+            )
+            eip.association.delete()
+        if release is True:
+            for eip in eips:
+                self.log.emit("releasing eip {}".format(eip.public_ip))
+                eip.release()
+        self.invalidate_snapshot("addresses")
+
     def get_autoscaled_instances(self, instances=None):
         """return a list of instances which were created via autoscaling."""
         instances = self.get_instances(instances)
@@ -141,18 +465,26 @@ class EnrichedVPC(object):
         instances = self.get_instances(instances)
         return [instance for instance in instances if instance.state["Code"] == 16]
 
+    def _instance_index(self):
+        """Return an InstanceIndex, built once per snapshot inventory load."""
+        if self._snapshot is not None:
+            return self._snapshot.index(
+                "instances",
+                "identifiers",
+                lambda instances: InstanceIndex(self.get_instances(instances)),
+            )
+        return InstanceIndex(self.get_instances())
+
     def get_roles(self, instances=None):
         """
         Return a dict of lists where role is the key and
         a list of EnrichedInstance objects is the value.
         """
-        roles = {}
-        instances = self.get_instances(instances)
-        for instance in instances:
-            if instance.role not in roles:
-                roles[instance.role] = []
-            roles[instance.role].append(instance)
-        return roles
+        if instances is None:
+            index = self._instance_index()
+        else:
+            index = InstanceIndex(self.get_instances(instances))
+        return {role: list(members) for role, members in index.roles.items()}
 
     def get_role(self, role_name, instances=None):
         """
@@ -165,6 +497,8 @@ class EnrichedVPC(object):
 
         :returns: A list of EnrichedInstance objects.
         """
+        if instances is None:
+            return self._instance_index().role(role_name)
         return self.get_roles(instances).get(role_name, [])
 
     def find_instance(self, identifier):
@@ -182,11 +516,7 @@ class EnrichedVPC(object):
 
         :returns: EnrichedInstance or None
         """
-        instances = self.get_instances()
-        hits = []
-        for instance in instances:
-            if identifier in instance.identifiers:
-                hits.append(instance)
+        hits = self._instance_index().find(identifier)
 
         if len(hits) == 0:
             return None
@@ -198,17 +528,6 @@ class EnrichedVPC(object):
 
         return hits[0]
 
-    @staticmethod
-    def _set(x):
-        """Return a set of the given iterable, return emtpy set if None."""
-        return set() if x is None else set(x)
-
-    def _identify_instance(self, i, identifiers, roles):
-        """Return True if instance is identified / qualified, else False"""
-        identifiers = self._set(identifiers)
-        roles = self._set(roles)
-        return bool(identifiers.intersection(i.identifiers) or i.role in roles)
-
     def find_instances(self, identifiers=None, roles=None, exclude=False):
         """
         Accept a list of identifiers and/or roles.
@@ -237,15 +556,7 @@ class EnrichedVPC(object):
 
         :returns: A list of EnrichedInstance objets or an empty list.
         """
-        instances = self.get_instances()
-        hits = []
-        for i in instances:
-            qualified = self._identify_instance(i, identifiers, roles)
-            if qualified and exclude == False:
-                hits.append(i)
-            elif not qualified and exclude == True:
-                hits.append(i)
-        return hits
+        return self._instance_index().select(identifiers, roles, exclude)
 
     def include_instances(self, identifiers=None, roles=None):
         """
@@ -278,7 +589,7 @@ class EnrichedVPC(object):
     def get_main_route_table(self):
         """Return the main (default) route table for VPC."""
         main_route_table = []
-        for route_table in self.route_tables.all():
+        for route_table in self.get_inventory("route_tables"):
             for association in route_table.associations:
                 if association.main == True:
                     main_route_table.append(route_table)
@@ -286,26 +597,33 @@ class EnrichedVPC(object):
             raise Exception("cannot get main route table! {}".format(main_route_table))
         return main_route_table[0]
 
-    def _filter_collection_by_name(self, name, collection):
+    def _filter_collection_by_name(self, name, kind):
+        if self._snapshot is not None:
+            # one describe per kind, every lookup after is a dictionary hit.
+            index = self._snapshot.index(
+                kind, "name", lambda resources: NameIndex(resources, self.name)
+            )
+            return index.get(name)
         names = [name, "{}-{}".format(self.name, name)]
+        collection = getattr(self, kind)
         objs = list(collection.filter(Filters=tag_filter("Name", names)))
         return objs[0] if len(objs) == 1 else None
 
     def get_route_table(self, name):
         """Accept route table name, return route_table object or None."""
-        ec2_object = self._filter_collection_by_name(name, self.route_tables)
+        ec2_object = self._filter_collection_by_name(name, "route_tables")
         if ec2_object is not None:
             return EnrichedRouteTable(ec2_object, evpc=self)
 
     def get_subnet(self, name):
         """Accept subnet name, return subnet object or None."""
-        ec2_object = self._filter_collection_by_name(name, self.subnets)
+        ec2_object = self._filter_collection_by_name(name, "subnets")
         if ec2_object is not None:
             return EnrichedSubnet(ec2_object, evpc=self)
 
     def get_security_group(self, name):
         """Accept security group name, return security group object or None."""
-        ec2_object = self._filter_collection_by_name(name, self.security_groups)
+        ec2_object = self._filter_collection_by_name(name, "security_groups")
         if ec2_object is not None:
             return EnrichedSecurityGroup(ec2_object, evpc=self)
 
@@ -315,6 +633,7 @@ class EnrichedVPC(object):
             RouteTableId=self.get_route_table(rt_name).id,
             SubnetId=self.get_subnet(sn_name).id,
         )
+        self.invalidate_snapshot("route_tables")
 
     def get_vpn_gateways(self):
         """Gets all the VGWs attached to the VPC"""
@@ -323,35 +642,51 @@ class EnrichedVPC(object):
         )
         return vgws.get("VpnGateways", {})
 
-    def lock_instances(self, instances=None):
-        """Lock all or a list of instances."""
+    def lock_instances(self, instances=None, max_workers=DEFAULT_MAX_WORKERS):
+        """Lock all or a list of instances, max_workers at a time."""
         instances = self.get_instances(instances)
-        for instance in instances:
-            instance.lock()
+        run_concurrently(lambda i: i.lock(), instances, max_workers)
 
-    def unlock_instances(self, instances=None):
-        """Unlock all or a list of instances."""
+    def unlock_instances(self, instances=None, max_workers=DEFAULT_MAX_WORKERS):
+        """Unlock all or a list of instances, max_workers at a time."""
         instances = self.get_instances(instances)
-        for instance in instances:
-            instance.unlock()
+        run_concurrently(lambda i: i.unlock(), instances, max_workers)
+
+    def source_dest_check_disable_instances(
+        self, instances=None, max_workers=DEFAULT_MAX_WORKERS
+    ):
+        """Disable source destination checking of all or a list of instances."""
+        instances = self.get_instances(instances)
+        run_concurrently(
+            lambda i: i.source_dest_check_disable(), instances, max_workers
+        )
 
     def get_vgw(self, vgw_id):
         """Accept vgw_id and return vgw description."""
         return self.boto.ec2_client.describe_vpn_gateways(VpnGatewayIds=[vgw_id])
 
-    @retry(wait_exponential_multiplier=1000, wait_exponential_max=10000)
-    def ensure_vgw_state(vgw_id, desired_state="attached"):
-        """if vgw is not in expected state, throw exception."""
-        vgw = self.get_vgw(vgw_id)
-        self.log.emit(
-            "waiting for {} to become {}".format(vgw_id, desired_state), "debug"
-        )
-        # Janky: this if statement is terrible... but I don't know the structure.
-        if (
-            vgw.get("VpnGateways")[0].get("VpcAttachments")[0].get("State")
-            != desired_state
-        ):
-            raise Exception("{} not in {} desired_State".format(vgw_id, desired_state))
+    def get_vgw_states(self, vgw_ids):
+        """
+        Accept list of vgw_ids, return dict of vgw_id to the state of its
+        attachment to this VPC (detached if it has no attachment).
+        """
+        states = {}
+        # external API call to AWS.
+        response = self.boto.ec2_client.describe_vpn_gateways(VpnGatewayIds=vgw_ids)
+        for vgw in response.get("VpnGateways", []):
+            attachments = [
+                a for a in vgw.get("VpcAttachments", []) if a.get("VpcId") == self.id
+            ]
+            state = attachments[0]["State"] if attachments else "detached"
+            states[vgw["VpnGatewayId"]] = state
+        return states
+
+    def ensure_vgw_state(self, vgw_ids, desired_state="attached"):
+        """Block until a vgw_id or a list of vgw_ids reach desired_state."""
+        if not isinstance(vgw_ids, list):
+            vgw_ids = [vgw_ids]
+        waiter = Waiter(self.get_vgw_states, desired_state, "vgw", self.log)
+        waiter.wait(vgw_ids)
 
     def attach_vpn_gateway(self, vgw_id):
         """Attach VPN gateway to the VPC"""
@@ -363,6 +698,7 @@ class EnrichedVPC(object):
 
     def detach_vpn_gateway(self):
         """Detach VPN gateway from VPC"""
+        vgw_ids = []
         for vgw in self.get_vpn_gateways():
             vgw_id = vgw.get("VpnGatewayId")
             self.log.emit(
@@ -371,26 +707,130 @@ class EnrichedVPC(object):
             self.boto.ec2_client.detach_vpn_gateway(
                 DryRun=False, VpnGatewayId=vgw_id, VpcId=self.id
             )
-            self.ensure_vgw_state(vgw_id, "detached")
+            vgw_ids.append(vgw_id)
+        if vgw_ids:
+            self.ensure_vgw_state(vgw_ids, "detached")
+
+    def describe_instance_ids(self, instance_ids):
+        """
+        Accept list of instance_ids, return list of instance descriptions.
+
+        One paginated describe_instances call per 200 ids.
+        """
+        descriptions = []
+        for batch in chunks(instance_ids, FILTER_BATCH_SIZE):
+            # external API call to AWS.
+            reservations = describe_all(
+                self.boto.ec2_client,
+                "describe_instances",
+                "Reservations",
+                Filters=make_filter("instance-id", batch),
+            )
+            descriptions += [i for r in reservations for i in r["Instances"]]
+        return descriptions
 
     def wait_until_instances(self, instances=None, state=None):
+        """
+        Block until all or a list of instances transition to state.
+
+        All pending instances are polled together with batched describe
+        calls and their descriptions are refreshed in place. Terminated
+        instances may also disappear.
+        """
         instances = self.get_instances(instances)
+        if state is None or not instances:
+            return None
         msg = "waiting for {} to transition to {}"
         for instance in instances:
             self.log.emit(msg.format(instance.identity, state))
-            if state == "running":
-                instance.wait_until_running()
-            if state == "stopped":
-                instance.wait_until_stopped()
-            if state == "terminated":
-                instance.wait_until_terminated()
+
+        by_id = dict((instance.id, instance) for instance in instances)
+
+        def describe(instance_ids):
+            states = {}
+            for description in self.describe_instance_ids(instance_ids):
+                instance_id = description["InstanceId"]
+                if instance_id in by_id:
+                    by_id[instance_id].meta.data = description
+                states[instance_id] = description["State"]["Name"]
+            return states
+
+        desired = [state, GONE] if state == "terminated" else state
+        failure = INSTANCE_FAILURE_STATES.get(state)
+        waiter = Waiter(describe, desired, "instances", self.log, failure=failure)
+        waiter.wait(list(by_id))
+
+    def _call_instance_operation(self, operation, instance_ids):
+        """Call operation on instance_ids, return set of accepted ids."""
+        # external API call to AWS.
+        response = getattr(self.boto.ec2_client, operation)(InstanceIds=instance_ids)
+        accepted = response.get(INSTANCE_OPERATIONS[operation], [])
+        return set(i["InstanceId"] for i in accepted)
+
+    def _instance_operation_failures(self, operation, instance_ids):
+        """
+        Call operation on instance_ids, return dict of failed id to reason.
+
+        A failed call is retried without the ids named in the error, which
+        are each retried alone. When the error names no ids (or only these
+        ids) the batch is split in half and each half is retried.
+        """
+        try:
+            accepted = self._call_instance_operation(operation, instance_ids)
+        except ClientError as e:
+            if len(instance_ids) == 1:
+                return {instance_ids[0]: str(e)}
+            self.log.emit("{} batch failed: {}".format(operation, e), "debug")
+            named = set(INSTANCE_ID_PATTERN.findall(str(e))) & set(instance_ids)
+            if named and len(named) < len(instance_ids):
+                batches = [[i] for i in instance_ids if i in named]
+                batches.append([i for i in instance_ids if i not in named])
+            else:
+                middle = len(instance_ids) // 2
+                batches = [instance_ids[:middle], instance_ids[middle:]]
+            failures = {}
+            for batch in batches:
+                failures.update(self._instance_operation_failures(operation, batch))
+            return failures
+        reason = "not in {} response".format(operation)
+        return dict((i, reason) for i in instance_ids if i not in accepted)
+
+    def batch_instance_operation(self, operation, instances):
+        """
+        Call a multi id operation on instances, one call per 1000 instances.
+
+        A single bad id fails a whole batch, so a failed batch is retried
+        without the ids named in the error (each retried alone) or split in
+        half when no ids are named. Ids which fail are reported together.
+
+        :param operation:
+          One of stop_instances, start_instances or terminate_instances.
+        :param instances: A list of instances.
+
+        :raises Exception: listing every instance id which failed and why.
+
+        :returns: None
+        """
+        failures = {}
+        for batch in chunks(get_ids(instances), INSTANCE_BATCH_SIZE):
+            failures.update(self._instance_operation_failures(operation, batch))
+        if failures:
+            raise Exception(
+                "{} failed for {} instances: {}".format(
+                    operation,
+                    len(failures),
+                    ", ".join(
+                        "{} ({})".format(k, v) for k, v in sorted(failures.items())
+                    ),
+                )
+            )
 
     def stop_instances(self, instances=None, wait=True):
         """Stop all or a list of instances."""
         instances = self.get_instances(instances)
         for instance in instances:
             self.log.emit("stopping {} instance ...".format(instance.identity))
-            instance.stop()
+        self.batch_instance_operation("stop_instances", instances)
         if wait == True:
             self.wait_until_instances(instances, "stopped")
 
@@ -399,23 +839,23 @@ class EnrichedVPC(object):
         instances = self.get_instances(instances)
         for instance in instances:
             self.log.emit("starting {} instance ...".format(instance.identity))
-            instance.start()
+        self.batch_instance_operation("start_instances", instances)
         if wait == True:
             self.wait_until_instances(instances, "running")
 
     def delete_instances(self, instances=None, wait=True):
         """Terminate all or a list of instances."""
         instances = self.get_instances(instances)
+        self.disassociate_eips(instances)
         for instance in instances:
             self.log.emit("terminating {} instance ...".format(instance.identity))
-            instance.disassociate_eips()
-            instance.terminate()
+        self.batch_instance_operation("terminate_instances", instances)
         if wait == True:
             self.wait_until_instances(instances, "terminated")
 
     def delete_internet_gateways(self):
         """Delete related internet gatways."""
-        for igw in self.internet_gateways.all():
+        for igw in self.get_inventory("internet_gateways"):
             self.log.emit(
                 "detaching internet gateway - {} from vpc - {}".format(
                     igw.id, self.vpc_name
@@ -424,6 +864,7 @@ class EnrichedVPC(object):
             igw.detach_from_vpc(VpcId=self.id)
             self.log.emit("deleting internet gateway - {}".format(igw.id))
             igw.delete()
+        self.invalidate_snapshot("internet_gateways")
 
     def revoke_inbound_rules_from_sg(self, sg):
         if len(sg.ip_permissions) >= 1:
@@ -449,35 +890,81 @@ class EnrichedVPC(object):
             self.log.emit("deleting security group - {}".format(sg.id))
             sg.delete()
 
-    def delete_security_groups(self):
-        """Delete related security groups."""
-        sgs = self.security_groups.all()
-        for sg in sgs:
-            self.revoke_security_group_rules(sg)
+    def delete_security_groups(self, max_workers=DEFAULT_MAX_WORKERS):
+        """Delete related security groups, max_workers at a time."""
+        sgs = self.get_inventory("security_groups")
+        # every rule is revoked first, groups may reference each other.
+        run_concurrently(self.revoke_security_group_rules, sgs, max_workers)
+        run_concurrently(self.delete_security_group, sgs, max_workers)
+        self.invalidate_snapshot("security_groups")
+
+    def delete_subnet(self, sn):
+        self.log.emit("deleting subnet - {}".format(sn.id))
+        sn.delete()
+
+    def delete_subnets(self, max_workers=DEFAULT_MAX_WORKERS):
+        """Delete related subnets, max_workers at a time."""
+        subnets = self.get_inventory("subnets")
+        run_concurrently(self.delete_subnet, subnets, max_workers)
+        self.invalidate_snapshot("subnets")
+
+    def delete_route_table(self, rt):
+        for a in rt.associations:
+            self.log.emit(
+                "dissociating subnet {} from route table {}".format(
+                    a.subnet_id, a.route_table_id
+                )
+            )
+            a.delete()
+        self.log.emit("deleting route table {}".format(rt.id))
+        rt.delete()
 
-        for sg in sgs:
-            self.delete_security_group(sg)
+    def delete_route_tables(self, max_workers=DEFAULT_MAX_WORKERS):
+        """Delete related route tables, max_workers at a time."""
+        main_rt = self.get_main_route_table()
+        route_tables = [
+            rt for rt in self.get_inventory("route_tables") if rt.id != main_rt.id
+        ]
+        run_concurrently(self.delete_route_table, route_tables, max_workers)
+        self.invalidate_snapshot("route_tables")
 
-    def delete_subnets(self):
-        """Delete related subnets."""
-        for sn in self.subnets.all():
-            self.log.emit("deleting subnet - {}".format(sn.id))
-            sn.delete()
+    def get_available_network_interface_ids(self):
+        """
+        Return a list of ids of detached network interfaces in this VPC.
 
-    def delete_route_tables(self):
-        """Delete related route tables."""
-        main_rt = self.get_main_route_table()
-        for rt in self.route_tables.all():
-            if rt.id != main_rt.id:
-                for a in rt.associations:
-                    self.log.emit(
-                        "dissociating subnet {} from route table {}".format(
-                            a.subnet_id, a.route_table_id
-                        )
-                    )
-                    a.delete()
-                self.log.emit("deleting route table {}".format(rt.id))
-                rt.delete()
+        Interfaces managed by AWS services (ELB, RDS, Lambda, endpoints)
+        are left out, only their service may delete them.
+        """
+        # external API call to AWS.
+        descriptions = describe_all(
+            self.boto.ec2_client,
+            "describe_network_interfaces",
+            "NetworkInterfaces",
+            Filters=make_filter("vpc-id", self.id)
+            + make_filter("status", "available")
+            + make_filter("requester-managed", "false"),
+        )
+        return [d["NetworkInterfaceId"] for d in descriptions]
+
+    def delete_network_interface(self, eni_id):
+        self.log.emit("deleting network interface - {}".format(eni_id))
+        self.boto.ec2_client.delete_network_interface(NetworkInterfaceId=eni_id)
+
+    def delete_network_interfaces(self, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Delete detached network interfaces left behind in this VPC,
+        for example by load balancers, they block subnet deletion.
+
+        An interface which fails to delete is logged and skipped, so the
+        rest of the teardown still runs.
+        """
+        eni_ids = self.get_available_network_interface_ids()
+        for eni_id, _, error in iter_concurrently(
+            self.delete_network_interface, eni_ids, max_workers
+        ):
+            if error is not None:
+                msg = "could not delete network interface {}: {}"
+                self.log.emit(msg.format(eni_id, error), "warning")
 
     def delete_dhcp_options(self):
         """Delete DHCP Options Set"""
@@ -485,26 +972,60 @@ class EnrichedVPC(object):
         self.log.emit(msg.format(self.dhcp_options.id))
         self.dhcp_options.delete()
 
-    def terminate(self):
-        """Terminate all resources related to this VPC!"""
+    def delete_autoscaling_groups(self):
+        """Delete related autoscaling groups, wait for their instances."""
         autoscaled_instances = self.get_autoscaled_instances()
-        self.delete_instances(self.get_normal_instances())
-        self.elb.delete_related_elbs()
         self.autoscaling.delete_related_autoscaling_groups()
-        self.autoscaling.delete_related_launch_configs()
-        self.rds.delete_related_db_instances()
-        self.key_pair.delete_key_pairs()
-        self.vpc_endpoint.delete_related()
         self.wait_until_instances(instances=autoscaled_instances, state="terminated")
-        self.delete_security_groups()
-        self.delete_subnets()
-        self.delete_route_tables()
-        self.delete_internet_gateways()
-        self.detach_vpn_gateway()
-        self.route53.delete_private_zone()
+
+    def delete_vpc(self):
         self.log.emit("deleting the VPC - {}".format(self.id))
         self.vpc.delete()
-        self.delete_dhcp_options()
+
+    def terminate(self, max_workers=DEFAULT_MAX_WORKERS):
+        """
+        Terminate all resources related to this VPC!
+
+        Teardown is a dependency graph, each step starts as soon as the
+        steps it depends on finished. Independent steps run concurrently.
+        """
+        tasks = {
+            "instances": lambda: self.delete_instances(self.get_normal_instances()),
+            "autoscaling_groups": self.delete_autoscaling_groups,
+            "launch_configs": self.autoscaling.delete_related_launch_configs,
+            "elbs": self.elb.delete_related_elbs,
+            "rds": self.rds.delete_related_db_instances,
+            "key_pairs": self.key_pair.delete_key_pairs,
+            "vpc_endpoints": self.vpc_endpoint.delete_related,
+            "network_interfaces": self.delete_network_interfaces,
+            "security_groups": self.delete_security_groups,
+            "subnets": self.delete_subnets,
+            "route_tables": self.delete_route_tables,
+            "internet_gateways": self.delete_internet_gateways,
+            "vpn_gateways": self.detach_vpn_gateway,
+            "private_zone": self.route53.delete_private_zone,
+            "vpc": self.delete_vpc,
+            "dhcp_options": self.delete_dhcp_options,
+        }
+        consumers = ["instances", "autoscaling_groups", "elbs", "rds"]
+        dependencies = {
+            "launch_configs": ["autoscaling_groups"],
+            "network_interfaces": consumers,
+            "security_groups": ["network_interfaces", "launch_configs"],
+            "subnets": ["network_interfaces"],
+            "route_tables": ["security_groups", "subnets", "vpc_endpoints"],
+            "internet_gateways": ["security_groups", "subnets"],
+            "vpn_gateways": ["security_groups", "subnets"],
+            "vpc": [
+                "route_tables",
+                "internet_gateways",
+                "vpn_gateways",
+                "private_zone",
+                "key_pairs",
+            ],
+            "dhcp_options": ["vpc"],
+        }
+        run_dag(tasks, dependencies, max_workers)
 
     def _strip_vpc_name(self, string):
         return (
@@ -513,14 +1034,72 @@ class EnrichedVPC(object):
             else string
         )
 
-    def _permission_to_rules(self, perm):
+    def _describe_security_group_names(self, group_ids):
+        """
+        Return a dict of security group id to group name for given ids.
+
+        Ids are sent in batches of FILTER_BATCH_SIZE filter values, ids
+        we may not describe (for example another account's) are left out.
+        """
+        names = {}
+        for batch in chunks(sorted(set(group_ids)), FILTER_BATCH_SIZE):
+            # external API call to AWS.
+            descriptions = describe_all(
+                self.boto.ec2_client,
+                "describe_security_groups",
+                "SecurityGroups",
+                Filters=make_filter("group-id", batch),
+            )
+            for description in descriptions:
+                names[description["GroupId"]] = description["GroupName"]
+        return names
+
+    def get_security_group_names(self, group_ids=None):
+        """
+        Return a dict of security group id to group name.
+
+        Groups of this VPC come from the security_groups inventory (once per
+        snapshot), other given ids such as peer or cross VPC groups from
+        one batched describe call.
+
+        :param group_ids: Optional, ids which must be looked up if missing.
+
+        :returns: dict of group id to group name
+        """
+
+        def build(security_groups):
+            return dict((sg.id, sg.group_name) for sg in security_groups)
+
+        if self._snapshot is not None:
+            names = self._snapshot.index("security_groups", "group_name", build)
+        else:
+            names = build(self.get_inventory("security_groups"))
+        missing = [i for i in group_ids or [] if i not in names]
+        if missing:
+            names = dict(names)
+            names.update(self._describe_security_group_names(missing))
+        return names
+
+    def _permission_to_rules(self, perm, group_names=None, exact=False):
+        """
+        Return rule tuples for one IpPermissions dictionary.
+
+        With exact, ports stay (from_port, to_port) as AWS stores them and
+        groups missing from group_names keep their id, so the rule can be
+        revoked as it was read.
+        """
+        if group_names is None:
+            group_names = self.get_security_group_names(
+                [pair["GroupId"] for pair in perm["UserIdGroupPairs"]]
+            )
         rules = []
         ip_protocol = perm["IpProtocol"]
         from_port = perm.get("FromPort", -1)
         to_port = perm.get("ToPort", -1)
-        port_range = from_port
-        if from_port != to_port:
-            port_range = "{}-{}".format(from_port, to_port)
+        port_range = format_sg_port((from_port, to_port))
+        if exact:
+            # exactly as AWS stores them, for example ICMP type 8 is (8, -1).
+            port_range = (from_port, to_port)
         if len(perm["IpRanges"]) >= 1:
             for iprange in perm["IpRanges"]:
                 rule = []
@@ -531,14 +1110,48 @@ class EnrichedVPC(object):
         if len(perm["UserIdGroupPairs"]) >= 1:
             for pair in perm["UserIdGroupPairs"]:
                 rule = []
-                related_sg = self.boto.ec2.SecurityGroup(id=pair["GroupId"])
-                related_sg_name = self._strip_vpc_name(related_sg.group_name)
-                rule.append(related_sg_name)
+                # groups we may not describe keep their id.
+                related_sg_name = pair["GroupId"]
+                if not exact:
+                    related_sg_name = pair.get("GroupName", related_sg_name)
+                related_sg_name = group_names.get(pair["GroupId"], related_sg_name)
+                rule.append(self._strip_vpc_name(related_sg_name))
                 rule.append(ip_protocol)
                 rule.append(port_range)
                 rules.append(tuple(rule))
         return rules
 
+    def get_security_group_rules(self):
+        """
+        Return every security group's rules, read from one snapshot.
+
+        Unlike :meth:`enriched_security_groups` the default outbound rule
+        is kept and ports are (from_port, to_port) tuples as AWS stores
+        them, so the result is the exact state to reconcile against.
+        Groups of this VPC are named from the inventory, peer or cross VPC
+        groups keep their id so a pruned rule revokes the right group.
+
+        :returns: dict of short group name to inbound and outbound rules.
+        """
+        sgs = {}
+        with self.snapshot():
+            security_groups = self.get_inventory("security_groups")
+            group_names = self.get_security_group_names()
+        for sg in security_groups:
+            sgs[self._strip_vpc_name(sg.group_name)] = {
+                "inbound": [
+                    rule
+                    for perm in sg.ip_permissions
+                    for rule in self._permission_to_rules(perm, group_names, True)
+                ],
+                "outbound": [
+                    rule
+                    for perm in sg.ip_permissions_egress
+                    for rule in self._permission_to_rules(perm, group_names, True)
+                ],
+            }
+        return sgs
+
     @property
     def enriched_security_groups(self):
         """
@@ -546,35 +1159,57 @@ class EnrichedVPC(object):
 
         :returns: security_groups in :ref:`Botoform Schema <schema reference>`.
         """
-        sgs = {}
-        for sg in self.security_groups.all():
-            sg_name = self._strip_vpc_name(sg.group_name)
-            sgs[sg_name] = {"inbound": []}
-            for perm in sg.ip_permissions:
-                rules = self._permission_to_rules(perm)
-                sgs[sg_name]["inbound"] += rules
-
-            for perm in sg.ip_permissions_egress:
-                # only add outbound rules if not the default rule.
-                rules = self._permission_to_rules(perm)
-                if len(rules) == 1 and rules[0] == ("0.0.0.0/0", "-1", -1):
-                    continue
-                if "outbound" not in sgs[sg_name]:
-                    sgs[sg_name]["outbound"] = []
-                sgs[sg_name]["outbound"] += rules
-
+        with self.snapshot():
+            sgs = self.get_security_group_rules()
+            # name the peer or cross VPC groups with one batched lookup.
+            group_names = self.get_security_group_names(
+                [
+                    rule[0]
+                    for sg_rules in sgs.values()
+                    for rules in sg_rules.values()
+                    for rule in rules
+                    if rule[0].startswith("sg-")
+                ]
+            )
+        for sg_name in sgs:
+            for direction in ("inbound", "outbound"):
+                sgs[sg_name][direction] = [
+                    (
+                        self._strip_vpc_name(group_names.get(rule[0], rule[0])),
+                        rule[1],
+                        format_sg_port(rule[2]),
+                    )
+                    for rule in sgs[sg_name][direction]
+                ]
+            # only add outbound rules if not the default rule.
+            outbound = [r for r in sgs[sg_name]["outbound"] if r != DEFAULT_EGRESS_RULE]
+            if outbound:
+                sgs[sg_name]["outbound"] = outbound
+            else:
+                del sgs[sg_name]["outbound"]
         return sgs
 
     @property
     def taggable_resources(self):
-        """Return a list of taggable objects related to this VPC."""
-        instances = self.instances
-        resources = [self, self.dhcp_options]
-        resources += instances
-        for instance in instances:
-            resources += collection_to_list(instance.volumes)
-        resources += collection_to_list(self.internet_gateways)
-        resources += collection_to_list(self.subnets)
-        resources += collection_to_list(self.security_groups)
-        resources += collection_to_list(self.route_tables)
-        return resources
+        """
+        Yield taggable objects related to this VPC.
+
+        Volumes of all instances are discovered with batched describe_volumes
+        calls instead of one call per instance.
+        """
+        yield self
+        yield self.dhcp_options
+        # read everything before yielding, the snapshot must not outlive a
+        # consumer that stops early or runs other evpc calls between items.
+        with self.snapshot():
+            resources = list(self.instances)
+            resources.extend(self.get_inventory("volumes"))
+            for kind in (
+                "internet_gateways",
+                "subnets",
+                "security_groups",
+                "route_tables",
+            ):
+                resources.extend(self.get_inventory(kind))
+        for resource in resources:
+            yield resource
@@ -1,15 +1,33 @@
 from botoform.plugins import ClassPlugin
 
-from botoform.util import make_tag_dict, output_formatter
+from botoform.cache import DiskCache, add_cache_arguments
 
-import botocore.session
+from botoform.stats import api_stats
 
-import boto3
+from botoform.util import (
+    BotoConnections,
+    describe_all,
+    iter_concurrently,
+    output_formatter,
+    DEFAULT_MAX_WORKERS,
+)
+
+import json
+import sys
+
+from functools import partial
+from threading import Lock
 
 from nested_lookup import nested_lookup
 
+# botocore sessions are not thread safe, create one client at a time.
+session_lock = Lock()
+
 
 def get_all_sessions():
+    # imported on use, importing botocore is slow.
+    import botocore.session
+
     sessions = []
     aws_config = botocore.session.get_session().full_config
     for profile_name in aws_config["profiles"]:
@@ -23,6 +41,69 @@ def get_region_names(session):
     return nested_lookup("RegionName", ec2.describe_regions())
 
 
+def get_ec2_client(session, region_name):
+    """
+    Return a regional ec2 client created from a shared profile session.
+
+    The session loads the profile config and ec2 model once, every other
+    region's client is cheap to create.
+    """
+    with session_lock:
+        ec2_client = session.create_client("ec2", region_name=region_name)
+    api_stats.register(ec2_client)
+    BotoConnections.rate_limiter.register(ec2_client, session.profile)
+    return ec2_client
+
+
+def get_vpc_names(profile_region, session=None):
+    """
+    Accept a (profile_name, region_name) tuple.
+    Return dict of VPC name (or id if untagged) to VPC id.
+
+    Pass the profile's session to share it between regions.
+    """
+    profile_name, region_name = profile_region
+    if session is not None:
+        ec2_client = get_ec2_client(session, region_name)
+    else:
+        ec2_client = BotoConnections(region_name, profile_name).ec2_client
+    vpc_names = {}
+    for vpc in describe_all(ec2_client, "describe_vpcs", "Vpcs"):
+        vpc_tags = dict((t["Key"], t["Value"]) for t in vpc.get("Tags", []))
+        vpc_names[vpc_tags.get("Name", vpc["VpcId"])] = vpc["VpcId"]
+    return vpc_names
+
+
+def get_cached_region_names(cache, args, session):
+    """Return a profile's region names, from cache when fresh."""
+    return cache.get(
+        (session.profile, "regions"),
+        lambda: get_region_names(session),
+        refresh=args.refresh,
+        revalidate=args.revalidate,
+    )
+
+
+def get_cached_vpc_names(cache, args, profile_region, key=None, session=None):
+    """
+    Return get_vpc_names(profile_region, session), from cache when fresh.
+
+    The cache key defaults to profile_region, pass key when the profile
+    name is None (boto picks the credentials) to label it for the cache.
+    """
+    return cache.get(
+        key if key is not None else profile_region,
+        lambda: get_vpc_names(profile_region, session),
+        refresh=args.refresh,
+        revalidate=args.revalidate,
+    )
+
+
+def warn(message):
+    """Write message to STDERR, STDOUT is reserved for the output."""
+    sys.stderr.write("{}\n".format(message))
+
+
 class Atmosphere(ClassPlugin):
     """
     For every AWS profile + region, dump every VPC to STDOUT.
@@ -47,6 +128,19 @@ class Atmosphere(ClassPlugin):
             default="yaml",
             help="the desired format of any possible output",
         )
+        parser.add_argument(
+            "--max-workers",
+            type=int,
+            default=DEFAULT_MAX_WORKERS,
+            help="the number of profile + region pairs to scan at once",
+        )
+        parser.add_argument(
+            "--stream",
+            action="store_true",
+            default=False,
+            help="output each profile + region as soon as it is scanned",
+        )
+        add_cache_arguments(parser)
 
     @staticmethod
     def main(args, evpc=None):
@@ -56,23 +150,54 @@ class Atmosphere(ClassPlugin):
         :returns: None
         """
         sessions = get_all_sessions()
+        cache = DiskCache("vpc_names", ttl=args.cache_ttl)
+
+        # discover each profile's regions concurrently.
+        regions = {}
+        for session, region_names, error in iter_concurrently(
+            partial(get_cached_region_names, cache, args), sessions, args.max_workers
+        ):
+            if error is not None:
+                warn("skipping profile {}: {}".format(session.profile, error))
+                continue
+            regions[session.profile] = region_names
+
+        profile_regions = [
+            (profile_name, region_name)
+            for profile_name in sorted(regions)
+            for region_name in regions[profile_name]
+        ]
+
+        vpcs = dict((profile_name, {}) for profile_name in regions)
+
+        # one session per profile, each region only creates a client.
+        sessions = dict((session.profile, session) for session in sessions)
+
+        def scan(profile_region):
+            session = sessions[profile_region[0]]
+            return get_cached_vpc_names(cache, args, profile_region, session=session)
+
+        for (profile_name, region_name), vpc_names, error in iter_concurrently(
+            scan,
+            profile_regions,
+            args.max_workers,
+        ):
+            if error is not None:
+                warn("skipping {} {}: {}".format(profile_name, region_name, error))
+                continue
+            if args.stream:
+                Atmosphere.stream({profile_name: {region_name: vpc_names}}, args)
+            else:
+                vpcs[profile_name][region_name] = vpc_names
+
+        if not args.stream:
+            print(output_formatter(vpcs, args.output_format))
 
-        # We assume all sessions have the same list of regions.
-        # This might not always be true. This is an optimization.
-        regions = get_region_names(sessions[0])
-
-        vpcs = {}
-
-        for session in sessions:
-            boto3.setup_default_session(profile_name=session.profile)
-            vpcs[session.profile] = {}
-            for region_name in regions:
-                if region_name not in vpcs[session.profile]:
-                    vpcs[session.profile][region_name] = {}
-                ec2 = boto3.resource("ec2", region_name=region_name)
-                for vpc in ec2.vpcs.all():
-                    vpc_tags = make_tag_dict(vpc)
-                    vpc_name = vpc_tags.get("Name", vpc.id)
-                    vpcs[session.profile][region_name][vpc_name] = vpc.id
-
-        print(output_formatter(vpcs, args.output_format))
+    @staticmethod
+    def stream(document, args):
+        """Print one partial document, json lines or yaml documents."""
+        if args.output_format == "json":
+            print(json.dumps(document))
+        else:
+            print("---\n" + output_formatter(document, args.output_format).rstrip())
+        sys.stdout.flush()
@@ -105,4 +105,6 @@ class Dump(object):
 
     @staticmethod
     def main(args, evpc):
-        dump_subcommands[args.dump_subcommand](args, evpc)
+        # serve inventory reads from one snapshot for the whole subcommand.
+        with evpc.snapshot():
+            dump_subcommands[args.dump_subcommand](args, evpc)
@@ -1,6 +1,12 @@
 from botoform.plugins import ClassPlugin
 
-from botoform.util import BotoConnections, make_tag_dict, output_formatter
+from botoform.cache import DiskCache, add_cache_arguments
+
+from botoform.plugins.atmosphere import get_cached_vpc_names
+
+from botoform.util import BotoConnections, output_formatter
+
+from os import environ
 
 
 class ListVpcs(ClassPlugin):
@@ -27,6 +33,7 @@ class ListVpcs(ClassPlugin):
             default="yaml",
             help="the desired format of any possible output",
         )
+        add_cache_arguments(parser)
 
     @staticmethod
     def main(args, evpc=None):
@@ -36,10 +43,15 @@ class ListVpcs(ClassPlugin):
         :param args: The parsed arguments and flags from the CLI.
         :returns: None
         """
-        vpc_names = []
-        bconn = BotoConnections(args.region, args.profile)
-        for vpc in bconn.ec2.vpcs.all():
-            vpc_tags = make_tag_dict(vpc)
-            vpc_name = vpc_tags.get("Name", vpc.id)
-            vpc_names.append(vpc_name)
-        print(output_formatter(vpc_names, args.output_format))
+        region_name = args.region
+        if region_name is None:
+            # the profile's region is in ~/.aws/config, ask boto3.
+            region_name = BotoConnections(None, args.profile).session.region_name
+        # boto gets the real profile (maybe None), the cache only a label.
+        profile_label = args.profile or environ.get("AWS_PROFILE") or "default"
+        # shares cached results with the atmosphere plugin.
+        cache = DiskCache("vpc_names", ttl=args.cache_ttl)
+        vpc_names = get_cached_vpc_names(
+            cache, args, (args.profile, region_name), (profile_label, region_name)
+        )
+        print(output_formatter(sorted(vpc_names), args.output_format))
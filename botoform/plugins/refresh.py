@@ -1,11 +1,9 @@
-from botoform.util import output_formatter, key_value_to_dict, normalize_sg_rules
+from botoform.util import output_formatter, key_value_to_dict, format_sg_port
 
 from botoform.builders import EnvironmentBuilder
 
 from botoform.config import ConfigLoader
 
-from collections import defaultdict
-
 no_cfg = {}
 
 
@@ -106,46 +104,37 @@ def security_groups(args, evpc):
     """
     Refresh security_groups: add missing groups and rules.
 
+    With --prune also revoke rules which are not in config, with --dry-run
+    only print the plan. The plan of changes is printed to STDOUT.
+
     :param args: The parsed arguments and flags from the CLI.
     :param evpc: An instance of :meth:`botoform.enriched.vpc.EnrichedVPC`.
 
     :returns: None
     """
     builder = get_builder_for_existing_vpc(evpc, args)
+    plan = builder.reconcile_security_groups(
+        builder.config.get("security_groups", no_cfg),
+        prune=args.prune,
+        dry_run=args.dry_run,
+    )
+    print(output_formatter(plan_to_document(plan), args.output_format))
 
-    security_groups_config = builder.config.get("security_groups", no_cfg)
-
-    # build the missing security groups.
-    builder.security_groups(security_groups_config)
-
-    security_groups_current = evpc.enriched_security_groups
-
-    rules_to_add = defaultdict(dict)
-    rules_to_del = defaultdict(dict)
-
-    for sg_name in security_groups_config:
-        config = security_groups_config[sg_name]
-        current = security_groups_current[sg_name]
-
-        config_inbound = set(normalize_sg_rules(config.get("inbound", [])))
-        current_inbound = set(normalize_sg_rules(current.get("inbound", [])))
-
-        config_outbound = set(normalize_sg_rules(config.get("outbound", [])))
-        current_outbound = set(normalize_sg_rules(current.get("outbound", [])))
-
-        to_add_inbound = list(config_inbound - current_inbound)
-        to_add_outbound = list(config_outbound - current_outbound)
-
-        # to_remove_inbound  = set(current.get('inbound', [])) - set(config.get('inbound',[]))
-        # to_remove_outbound = set(current.get('outbound', [])) - set(config.get('outbound',[]))
-
-        if len(to_add_inbound) != 0:
-            rules_to_add[sg_name]["inbound"] = to_add_inbound
-
-        if len(to_add_outbound) != 0:
-            rules_to_add[sg_name]["outbound"] = to_add_outbound
 
-    builder.security_group_rules(rules_to_add)
+def plan_to_document(plan):
+    """Return a security group plan with rules in config form, for output."""
+    document = {}
+    for sg_name, directions in plan.items():
+        document[sg_name] = {}
+        for direction, changes in directions.items():
+            document[sg_name][direction] = dict(
+                (
+                    action,
+                    [[rule[0], rule[1], format_sg_port(rule[2])] for rule in rules],
+                )
+                for action, rules in changes.items()
+            )
+    return document
 
 
 refresh_subcommands = {
@@ -177,7 +166,27 @@ class Refresh(object):
             metavar="key=val",
             help="Extra Jinja2 context: --extra-vars key=val,key2=val2,key3=val3",
         )
+        parser.add_argument(
+            "--output-format",
+            choices=["yaml", "json"],
+            default="yaml",
+            help="security_groups: the format of the printed plan",
+        )
+        parser.add_argument(
+            "--prune",
+            action="store_true",
+            default=False,
+            help="security_groups: also revoke rules which are not in config",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            default=False,
+            help="security_groups: print the plan of changes, change nothing",
+        )
 
     @staticmethod
     def main(args, evpc):
-        refresh_subcommands[args.refresh_subcommand](args, evpc)
+        # serve inventory reads from one snapshot for the whole subcommand.
+        with evpc.snapshot():
+            refresh_subcommands[args.refresh_subcommand](args, evpc)
@@ -0,0 +1,171 @@
+import time
+
+from threading import Lock
+
+from botoform.stats import THROTTLE_CODES
+
+# operations with these prefixes only read, every other operation writes.
+READ_PREFIXES = ("Describe", "List", "Get")
+
+# operation class: (requests per second, burst capacity) to start with.
+DEFAULT_RATES = {"read": (20.0, 100.0), "write": (5.0, 50.0)}
+
+
+def operation_class(operation_name):
+    """
+    Return read or write for an operation name.
+
+    .. code-block:: python
+
+      >>> operation_class('DescribeInstances')
+      'read'
+      >>> operation_class('CreateTags')
+      'write'
+
+    :param operation_name: A CamelCase operation name.
+
+    :returns: read or write
+    """
+    return "read" if operation_name.startswith(READ_PREFIXES) else "write"
+
+
+class TokenBucket(object):
+    """
+    A thread safe token bucket with AIMD rate adjustment.
+
+    Every request takes a token, tokens refill at rate per second up to
+    capacity. A throttle response halves the rate (multiplicative decrease),
+    every successful request adds a little back (additive increase).
+    """
+
+    def __init__(
+        self, rate, capacity, min_rate=0.5, increase=0.05, decrease=0.5, clock=None
+    ):
+        """
+        :param rate: Requests per second to start with, also the maximum rate.
+        :param capacity: The number of requests allowed in a burst.
+        :param min_rate: Optional, the rate never drops below this.
+        :param increase: Optional, rate added after every success.
+        :param decrease: Optional, rate is multiplied by this on throttle.
+        :param clock: Optional, a callable returning seconds (default time).
+        """
+        self.max_rate = self.rate = float(rate)
+        self.capacity = self.tokens = float(capacity)
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.clock = clock if clock is not None else time.time
+        self.updated = self.clock()
+        self.lock = Lock()
+
+    def _refill(self):
+        now = self.clock()
+        elapsed = max(0, now - self.updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated = now
+
+    def try_acquire(self):
+        """
+        Take a token if one is available.
+
+        :returns: 0 if a token was taken, else seconds until one is available.
+        """
+        with self.lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """Block until a token is taken."""
+        wait = self.try_acquire()
+        while wait:
+            time.sleep(wait)
+            wait = self.try_acquire()
+
+    def throttled(self):
+        """AWS throttled us, slow down and drain the burst."""
+        with self.lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self.tokens = min(self.tokens, 0)
+
+    def succeeded(self):
+        """A request succeeded, speed up towards the maximum rate."""
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+class RateLimiter(object):
+    """
+    Token buckets keyed by (profile, region, service, operation class),
+    shared by every thread and every client registered with this RateLimiter.
+
+    Each profile (AWS account) has its own API limits, so profiles in the
+    same region never share a bucket.
+    """
+
+    def __init__(self, rates=None):
+        """
+        :param rates:
+          Optional, a dict of operation class to (rate, capacity) tuple.
+        """
+        self.rates = rates if rates is not None else DEFAULT_RATES
+        self.buckets = {}
+        self.lock = Lock()
+
+    def bucket(self, profile_name, region_name, service_name, operation_name):
+        """Return the TokenBucket for this profile, region, service and operation."""
+        key = (profile_name, region_name, service_name, operation_class(operation_name))
+        with self.lock:
+            if key not in self.buckets:
+                rate, capacity = self.rates[key[3]]
+                self.buckets[key] = TokenBucket(rate, capacity)
+            return self.buckets[key]
+
+    def register(self, connection, profile_name=None):
+        """
+        Register event hooks on a Boto3 client or resource.
+
+        Each attempt (including retries) takes a token before it is sent.
+
+        :param connection: A Boto3 client or resource object.
+        :param profile_name: Optional, the AWS profile the connection uses.
+
+        :returns: None
+        """
+        client = getattr(connection.meta, "client", connection)
+        region_name = client.meta.region_name
+        service_name = client.meta.service_model.service_name
+
+        def bucket(operation_name):
+            return self.bucket(profile_name, region_name, service_name, operation_name)
+
+        def request_created(operation_name=None, **kwargs):
+            if operation_name is not None:
+                bucket(operation_name).acquire()
+
+        def needs_retry(operation=None, response=None, **kwargs):
+            if operation is not None and response is not None:
+                if response[1].get("Error", {}).get("Code") in THROTTLE_CODES:
+                    bucket(operation.name).throttled()
+            # never decide whether to retry, botocore does.
+            return None
+
+        def after_call(model=None, parsed=None, **kwargs):
+            if model is not None and "Error" not in (parsed or {}):
+                bucket(model.name).succeeded()
+
+        events = client.meta.events
+        events.register_first(
+            "request-created",
+            request_created,
+            unique_id="botoform-ratelimit-request-created",
+        )
+        events.register_first(
+            "needs-retry", needs_retry, unique_id="botoform-ratelimit-needs-retry"
+        )
+        events.register_first(
+            "after-call", after_call, unique_id="botoform-ratelimit-after-call"
+        )
@@ -0,0 +1,153 @@
+import json
+
+from math import ceil
+from threading import Lock
+from time import time
+
+# error codes AWS uses when it rate limits a caller.
+THROTTLE_CODES = (
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottled",
+    "RequestLimitExceeded",
+    "TooManyRequestsException",
+    "SlowDown",
+)
+
+
+def percentile(values, percent):
+    """
+    Return the nearest rank percentile of a sorted list of numbers.
+
+    .. code-block:: python
+
+      >>> percentile([1, 2, 3, 4], 50)
+      2
+
+    :param values: A sorted, non empty list of numbers.
+    :param percent: The percentile to return, between 0 and 100.
+
+    :returns: A number from values.
+    """
+    rank = int(ceil(percent / 100.0 * len(values))) - 1
+    return values[max(0, min(rank, len(values) - 1))]
+
+
+class ApiStats(object):
+    """
+    Count AWS API calls, retries, throttles and errors and record their
+    latency per service and operation using botocore event hooks.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.operations = {}
+
+    def register(self, connection):
+        """
+        Register event hooks on a Boto3 client or resource.
+
+        :param connection: A Boto3 client or resource object.
+
+        :returns: None
+        """
+        client = getattr(connection.meta, "client", connection)
+        events = client.meta.events
+        # register first, needs-retry stops at the first handler returning.
+        events.register_first(
+            "before-call", self.before_call, unique_id="botoform-stats-before-call"
+        )
+        events.register_first(
+            "after-call", self.after_call, unique_id="botoform-stats-after-call"
+        )
+        events.register_first(
+            "needs-retry", self.needs_retry, unique_id="botoform-stats-needs-retry"
+        )
+
+    def _operation(self, model):
+        key = (model.service_model.service_name, model.name)
+        if key not in self.operations:
+            self.operations[key] = {
+                "calls": 0,
+                "retries": 0,
+                "throttles": 0,
+                "errors": 0,
+                "latencies": [],
+            }
+        return self.operations[key]
+
+    def before_call(self, model=None, context=None, **kwargs):
+        if context is not None:
+            context["botoform_stats_started"] = time()
+
+    def after_call(self, model=None, parsed=None, context=None, **kwargs):
+        started = (context or {}).get("botoform_stats_started", None)
+        parsed = parsed or {}
+        with self.lock:
+            operation = self._operation(model)
+            operation["calls"] += 1
+            metadata = parsed.get("ResponseMetadata", {})
+            operation["retries"] += metadata.get("RetryAttempts", 0)
+            if "Error" in parsed:
+                operation["errors"] += 1
+            if started is not None:
+                operation["latencies"].append(time() - started)
+
+    def needs_retry(self, operation=None, response=None, **kwargs):
+        # response is a (http_response, parsed) tuple, or None on exceptions.
+        if response is None or operation is None:
+            return None
+        code = response[1].get("Error", {}).get("Code", None)
+        if code in THROTTLE_CODES:
+            with self.lock:
+                self._operation(operation)["throttles"] += 1
+        # never decide whether to retry, botocore does.
+        return None
+
+    def report(self):
+        """
+        Return a dict report, operations are sorted by total time spent.
+
+        :returns: dict with total_calls and a list of operations.
+        """
+        rows = []
+        with self.lock:
+            for (service, name), operation in self.operations.items():
+                latencies = sorted(operation["latencies"])
+                row = {
+                    "service": service,
+                    "operation": name,
+                    "calls": operation["calls"],
+                    "retries": operation["retries"],
+                    "throttles": operation["throttles"],
+                    "errors": operation["errors"],
+                    "total_ms": int(sum(latencies) * 1000),
+                }
+                if latencies:
+                    for percent in (50, 90, 99):
+                        key = "p{}_ms".format(percent)
+                        row[key] = int(percentile(latencies, percent) * 1000)
+                    row["max_ms"] = int(latencies[-1] * 1000)
+                rows.append(row)
+        rows.sort(key=lambda row: (-row["total_ms"], row["service"], row["operation"]))
+        return {"total_calls": sum(row["calls"] for row in rows), "operations": rows}
+
+    def write(self, path="-"):
+        """
+        Write the report as JSON to path, or print it if path is '-'.
+
+        :param path: Optional, a file path (default '-' for stdout).
+
+        :returns: None
+        """
+        document = json.dumps(self.report(), indent=2, sort_keys=True)
+        if path == "-":
+            print(document)
+        else:
+            with open(path, "w") as f:
+                f.write(document + "\n")
+
+
+# the ApiStats which every BotoConnections registers its connections with.
+api_stats = ApiStats()
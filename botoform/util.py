@@ -1,9 +1,5 @@
 import yaml
 import json
-import boto3
-
-# this lets us view the ~/.aws/config file.
-from botocore.session import Session
 
 # dynamic nonsequential hostnames.
 import hashlib
@@ -15,20 +11,109 @@ from random import choice
 
 from retrying import retry
 
+# count and time every AWS API call.
+from botoform.stats import api_stats, THROTTLE_CODES
+
+# pace AWS API calls of every thread.
+from botoform.ratelimit import RateLimiter
+
+# used to find the resource ids named in an AWS error message.
+import re
+
+# used for run_concurrently and run_dag functions.
+from multiprocessing.pool import ThreadPool
+from Queue import Queue
+
+# used to share BotoConnections between threads.
+from threading import RLock, local
+
+# default number of threads for per resource API calls.
+DEFAULT_MAX_WORKERS = 10
+
+# resource ids named in an error message, like sg-1234abcd or i-1234abcd.
+RESOURCE_ID_PATTERN = re.compile(r'\b[a-z]+-\w+')
+
+def error_code(exception):
+    """Return the AWS error code of a botocore ClientError, else None."""
+    return getattr(exception, 'response', {}).get('Error', {}).get('Code')
+
+def is_throttle_error(exception):
+    """Return True if exception is AWS asking us to slow down."""
+    return error_code(exception) in THROTTLE_CODES
+
+def is_bad_id_error(exception):
+    """Return True if exception is AWS rejecting some of the given ids."""
+    code = error_code(exception) or ''
+    return code == 'InvalidID' or code.endswith(('.NotFound', '.Malformed'))
+
 class BotoConnections(object):
     """Central Management of boto3 client and resource connection objects."""
+
+    # shared by every BotoConnections so all threads draw from the same buckets.
+    rate_limiter = RateLimiter()
+
+    # attribute name: (boto3 factory, service name), created on first use.
+    connection_specs = {
+        'iam': ('resource', 'iam'),
+        'ec2': ('resource', 'ec2'),
+        'ec2_client': ('client', 'ec2'),
+        'ecs_client': ('client', 'ecs'),
+        'rds': ('client', 'rds'),
+        'elasticache': ('client', 'elasticache'),
+        'elb': ('client', 'elb'),
+        'autoscaling': ('client', 'autoscaling'),
+        'route53': ('client', 'route53'),
+        'cloudformation': ('resource', 'cloudformation'),
+        'cloudformation_client': ('client', 'cloudformation'),
+    }
+
     def __init__(self, region_name=None, profile_name=None):
         """
         Optionally pass region_name and profile_name. Setup boto3 session.
-        Attach boto3 client and resource connection objects.
+        Boto3 client and resource connection objects are created on first use.
+
+        Each BotoConnections has its own boto3 Session, so objects for
+        different profiles and regions may coexist and be used by threads.
+        Clients are shared by threads, resources are created per thread.
         """
         # defaults.
         self.config = {}
-        self._region_name = self._profile_name = None
-        # trigger region_name.setter
-        self.region_name = region_name
-        # trigger profile_name.setter
-        self.profile_name = profile_name
+        self.lock = RLock()
+        self._local = local()
+        self._region_name = region_name
+        self._profile_name = profile_name
+        self._load_profile_config()
+        # setup the session once, not once per setter.
+        self.setup_session_and_refresh_connections()
+
+    def __getattr__(self, name):
+        """Create a Boto3 client or resource on first use and cache it."""
+        if name not in BotoConnections.connection_specs:
+            raise AttributeError(name)
+        factory, service_name = self.connection_specs[name]
+        if factory == 'resource' and name in self._local.__dict__:
+            return self._local.__dict__[name]
+        # boto3 sessions are not thread safe, create one connection at a time.
+        with self.lock:
+            if name in self.__dict__:
+                return self.__dict__[name]
+            connection = getattr(self.session, factory)(service_name)
+        api_stats.register(connection)
+        self.rate_limiter.register(connection, self.session.profile_name)
+        if factory == 'resource':
+            # resources are not thread safe, cache one per thread.
+            self._local.__dict__[name] = connection
+        else:
+            # clients are thread safe, __getattr__ is not called again for name.
+            self.__dict__[name] = connection
+        return connection
+
+    def _load_profile_config(self):
+        if self._profile_name is not None:
+            # this lets us view the ~/.aws/config file.
+            import botocore.session
+            session = botocore.session.Session(profile=self._profile_name)
+            self.config = session.get_scoped_config()
 
     @property
     def profile_name(self):
@@ -38,8 +123,7 @@ class BotoConnections(object):
     def profile_name(self, new_name):
         """set profile_name and refresh_boto_connections"""
         self._profile_name = new_name
-        if new_name is not None:
-            self.config = Session(profile=new_name).get_scoped_config()
+        self._load_profile_config()
         self.setup_session_and_refresh_connections()
 
     @property
@@ -55,33 +139,26 @@ class BotoConnections(object):
         self.setup_session_and_refresh_connections()
 
     def setup_session_and_refresh_connections(self):
-        if self.profile_name and self.region_name:
-            boto3.setup_default_session(
+        """Create this object's own boto3 Session, forget old connections."""
+        # imported on first use, importing boto3 is slow.
+        import boto3.session
+        with self.lock:
+            self.session = boto3.session.Session(
               profile_name = self.profile_name,
               region_name  = self.region_name,
             )
-        elif self.profile_name:
-            boto3.setup_default_session(profile_name = self.profile_name)
-        elif self.region_name:
-            boto3.setup_default_session(region_name = self.region_name)
-        else:
-            return None
         self.refresh_boto_connections()
 
     def refresh_boto_connections(self):
-        """Attach related Boto3 clients and resources."""
-        self.iam = boto3.resource('iam')
-        self.ec2 = boto3.resource('ec2')
-        self.ec2_client = boto3.client('ec2')
-        self.ecs_client = boto3.client('ecs')
-        self.rds = boto3.client('rds')
-        self.elasticache = boto3.client('elasticache')
-        self.elb = boto3.client('elb')
-        self.autoscaling = boto3.client('autoscaling')
-        self.route53 = boto3.client('route53')
-        self.cloudformation = boto3.resource('cloudformation')
-        self.cloudformation_client = boto3.client('cloudformation')
-        
+        """
+        Forget cached Boto3 clients and resources.
+        Each is created again, from the current session, on first use.
+        """
+        with self.lock:
+            for name in self.connection_specs:
+                self.__dict__.pop(name, None)
+            self._local = local()
+
     @property
     def azones(self):
         """Return a list of available AZ names for active AWS profile/region."""
@@ -168,20 +245,22 @@ def output_formatter(data, output_format='newline'):
         output = json.dumps(data, indent=2)
     return output
 
-def reflect_attrs(child, parent, skip_attrs=None):
+_class_attrs_cache = {}
+
+def class_attrs(cls):
     """
-    Composition Magic: reflect all missing parents attributes into child.
+    Return a cached frozenset of attribute names defined by cls and its bases.
 
-    :param child: Object to receive attributes.
-    :param parent: Object to source attributes from.
-    :param skip_attrs: Optional list of attrs strings to not reflect.
+    Enriched wrappers use this to answer dir() without walking dir(self)
+    for every object they wrap.
 
-    :returns: None
+    :param cls: The class to inspect.
+
+    :returns: frozenset of attribute name strings.
     """
-    skip_attrs = skip_attrs if skip_attrs is not None else []
-    for attr in dir(parent):
-        if attr not in skip_attrs:
-            child.__dict__[attr] = getattr(parent, attr)
+    if cls not in _class_attrs_cache:
+        _class_attrs_cache[cls] = frozenset(dir(cls))
+    return _class_attrs_cache[cls]
 
 def merge_pages(key, pages):
     """
@@ -194,6 +273,45 @@ def merge_pages(key, pages):
     """
     return [item for page in pages for item in page[key]]
 
+def describe_all(client, operation, key, **kwargs):
+    """
+    Return a single flat list of descriptions from a describe_* operation.
+
+    Paginates when botocore knows how, else makes a single call.
+
+    :param client: A Boto3 client object.
+    :param operation: The snake_case operation name, like 'describe_subnets'.
+    :param key: The document key to merge from all pages, like 'Subnets'.
+    :param \*\*kwargs: Passed to the operation, for example Filters.
+
+    :returns: A single flat list containing results of all pages.
+    """
+    if client.can_paginate(operation):
+        pages = client.get_paginator(operation).paginate(**kwargs)
+    else:
+        pages = [getattr(client, operation)(**kwargs)]
+    return merge_pages(key, pages)
+
+def hydrate(factory, descriptions, id_key):
+    """
+    Return a list of Boto3 resources built from describe_* descriptions.
+
+    Each description is injected into the resource's meta.data,
+    so reading attributes never triggers a per-object load.
+
+    :param factory: A resource factory, for example ec2.Subnet.
+    :param descriptions: A list of descriptions from a describe_* call.
+    :param id_key: The description key which holds the id, like 'SubnetId'.
+
+    :returns: A list of loaded Boto3 resources.
+    """
+    resources = []
+    for description in descriptions:
+        resource = factory(description[id_key])
+        resource.meta.data = description
+        resources.append(resource)
+    return resources
+
 def get_ids(objects):
     """
     Return a list of ids from a list of objects.
@@ -204,6 +322,189 @@ def get_ids(objects):
     """
     return [o.id for o in objects if o is not None]
 
+def chunks(items, size):
+    """
+    Yield successive lists of at most size items.
+
+    .. code-block:: python
+
+      >>> list(chunks([1, 2, 3, 4, 5], 2))
+      [[1, 2], [3, 4], [5]]
+
+    :param items: A list of items to split.
+    :param size: The maximum length of each chunk.
+
+    :returns: generator of lists
+    """
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def run_concurrently(function, items, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Call function once for each item using a bounded pool of threads.
+
+    Meant for per resource API calls without a multi id form, like
+    modify_attribute. Every item is attempted, errors are raised together.
+
+    :param function: A callable which accepts one item.
+    :param items: A list of items.
+    :param max_workers: The maximum number of concurrent calls.
+
+    :raises Exception: listing every item which failed and why.
+
+    :returns: list of results in the order of items.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def call(item):
+        try:
+            return function(item), None
+        except Exception as e:
+            return None, e
+
+    if max_workers <= 1:
+        outcomes = [call(item) for item in items]
+    else:
+        pool = ThreadPool(min(max_workers, len(items)))
+        try:
+            outcomes = pool.map(call, items)
+        finally:
+            pool.close()
+            pool.join()
+
+    errors = [
+        '{} ({})'.format(item, error)
+        for item, (_, error) in zip(items, outcomes) if error is not None
+    ]
+    if errors:
+        raise Exception('{} of {} calls failed: {}'.format(
+            len(errors), len(items), ', '.join(errors)))
+    return [result for result, _ in outcomes]
+
+def iter_concurrently(function, items, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Call function once for each item using a bounded pool of threads and
+    yield results as they complete, in no particular order.
+
+    Errors are yielded rather than raised, so one failing item does not
+    hide the results of the others.
+
+    :param function: A callable which accepts one item.
+    :param items: A list of items.
+    :param max_workers: The maximum number of concurrent calls.
+
+    :returns: generator of (item, result, error) tuples, error may be None.
+    """
+    items = list(items)
+    if not items:
+        return
+
+    def call(item):
+        try:
+            return item, function(item), None
+        except Exception as e:
+            return item, None, e
+
+    pool = ThreadPool(max(1, min(max_workers, len(items))))
+    try:
+        for outcome in pool.imap_unordered(call, items):
+            yield outcome
+    finally:
+        pool.close()
+        pool.join()
+
+def run_dag(tasks, dependencies=None, max_workers=DEFAULT_MAX_WORKERS, fail_fast=False):
+    """
+    Run a dependency graph of tasks on a bounded pool of threads.
+
+    Each task starts as soon as every task it depends on has finished,
+    so the total run time is bounded by the longest dependency chain.
+    Tasks which depend on a failed task are skipped, the rest still run
+    unless fail_fast is set.
+
+    .. code-block:: python
+
+      >>> run_dag(
+      ...   {'a': lambda: 1, 'b': lambda: 2},
+      ...   {'b': ['a']},
+      ... )
+      {'a': 1, 'b': 2}
+
+    :param tasks: A dict of task name to callable which accepts no arguments.
+    :param dependencies:
+      Optional, a dict of task name to list of task names it depends on.
+    :param max_workers: The maximum number of concurrent tasks.
+    :param fail_fast:
+      Optional, after the first failure start no new tasks, skip every
+      pending task and wait for the running ones to finish.
+
+    :raises Exception:
+      listing every failed and skipped task, or if the graph is invalid.
+
+    :returns: dict of task name to result.
+    """
+    dependencies = dependencies or {}
+    for name, requires in dependencies.items():
+        unknown = [r for r in [name] + list(requires) if r not in tasks]
+        if unknown:
+            raise Exception('unknown tasks in dependencies: {}'.format(unknown))
+
+    pending = set(tasks)
+    results, errors, skipped = {}, {}, []
+    finished = Queue()
+    running = 0
+
+    def run(name):
+        try:
+            finished.put((name, tasks[name](), None))
+        except Exception as e:
+            finished.put((name, None, e))
+
+    workers = max(1, min(max_workers, len(tasks)))
+    pool = ThreadPool(workers)
+    try:
+        while pending or running:
+            changed = True
+            while changed:
+                changed = False
+                for name in sorted(pending):
+                    requires = dependencies.get(name, [])
+                    if fail_fast and errors:
+                        pending.discard(name)
+                        skipped.append(name)
+                    elif any(r in errors or r in skipped for r in requires):
+                        pending.discard(name)
+                        skipped.append(name)
+                        changed = True
+                    elif running < workers and all(r in results for r in requires):
+                        pending.discard(name)
+                        running += 1
+                        pool.apply_async(run, (name,))
+            if not running:
+                if pending:
+                    raise Exception(
+                        'dependency cycle between tasks: {}'.format(sorted(pending)))
+                break
+            name, result, error = finished.get()
+            running -= 1
+            if error is None:
+                results[name] = result
+            else:
+                errors[name] = error
+    finally:
+        pool.close()
+        pool.join()
+
+    if errors:
+        raise Exception('{} tasks failed: {}; skipped: {}'.format(
+            len(errors),
+            ', '.join('{} ({})'.format(k, v) for k, v in sorted(errors.items())),
+            ', '.join(sorted(skipped)) or 'none'))
+    return results
+
 def collection_to_list(collection):
     return list(collection.all())
 
@@ -263,6 +564,203 @@ def update_tags(ec2_object, **kwargs):
             tags_to_update.append({'Key' : key, 'Value' : value})
     if tags_to_update:
         ec2_object.create_tags(Tags = tags_to_update)
+        patch_tags(ec2_object, tags_to_update)
+
+def patch_tags(ec2_object, tags, delete_keys=None):
+    """
+    Patch tags into the loaded data of a Boto3 resource in place.
+
+    This keeps a resource held in memory (for example by a snapshot) in sync
+    with the tags we just wrote, without paying for a reload.
+
+    :param ec2_object: A tagable Boto3 object, possibly not loaded yet.
+    :param tags: A list of {'Key':key, 'Value':value} tag documents.
+    :param delete_keys: Optional, tag names we just deleted.
+
+    :returns: None
+    """
+    data = getattr(getattr(ec2_object, 'meta', None), 'data', None)
+    if not isinstance(data, dict):
+        # not loaded yet, the next load will fetch the fresh tags.
+        return None
+    tag_dict = {i["Key"]: i["Value"] for i in data.get('Tags') or []}
+    for tag in tags:
+        tag_dict[tag['Key']] = tag['Value']
+    for key in delete_keys or []:
+        tag_dict.pop(key, None)
+    data['Tags'] = [{'Key' : k, 'Value' : v} for k, v in tag_dict.items()]
+
+class TagWriter(object):
+    """
+    Coalesce tag writes into batched create_tags and delete_tags calls.
+
+    Tag mutations are collected and diffed against already known tags.
+    On flush, resources with identical tag deltas are grouped together and
+    tagged with one call per 1000 resources. For example::
+
+      with TagWriter(boto.ec2_client) as tag_writer:
+          for resource in resources:
+              tag_writer.update(resource, environment='prod')
+
+    Throttled calls are retried a few times. A batch rejected because of
+    bad ids is retried without the ids named in the error (or split in half
+    when none are named), so one stale id never blocks the other tags.
+    """
+
+    # EC2 accepts up to 1000 resource ids per create_tags / delete_tags call.
+    max_resources = 1000
+
+    # attempts per call while AWS throttles us.
+    max_attempts = 5
+
+    def __init__(self, ec2_client):
+        """
+        :param ec2_client: A Boto3 EC2 client object.
+        """
+        self.ec2_client = ec2_client
+        # resource id -> (ec2_object, {key: value}) to create or update.
+        self.creates = {}
+        # resource id -> (ec2_object, set of keys) to delete.
+        self.deletes = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.flush()
+
+    def update(self, ec2_object, **kwargs):
+        """
+        Queue tags which differ from the known tags of ec2_object.
+
+        :param ec2_object: A tagable Boto3 object with a tags attribute.
+        :param \*\*kwargs: key=value where key is tag name, value is tag value.
+
+        :returns: None
+        """
+        tag_dict = make_tag_dict(ec2_object)
+        _, pending = self.creates.get(ec2_object.id, (ec2_object, {}))
+        _, deleting = self.deletes.get(ec2_object.id, (ec2_object, set()))
+        for key, value in kwargs.items():
+            deleting.discard(key)
+            if tag_dict.get(key, None) != value:
+                pending[key] = value
+        if pending:
+            self.creates[ec2_object.id] = (ec2_object, pending)
+
+    def delete(self, ec2_object, *keys):
+        """
+        Queue removal of tag keys which exist on ec2_object.
+
+        :param ec2_object: A tagable Boto3 object with a tags attribute.
+        :param \*keys: tag names to remove.
+
+        :returns: None
+        """
+        tag_dict = make_tag_dict(ec2_object)
+        _, deleting = self.deletes.get(ec2_object.id, (ec2_object, set()))
+        _, pending = self.creates.get(ec2_object.id, (ec2_object, {}))
+        for key in keys:
+            pending.pop(key, None)
+            if key in tag_dict:
+                deleting.add(key)
+        if deleting:
+            self.deletes[ec2_object.id] = (ec2_object, deleting)
+
+    @staticmethod
+    def _group(queue):
+        """Return a dict of frozen tag delta -> list of ec2_objects."""
+        groups = {}
+        for ec2_object, delta in queue.values():
+            if delta:
+                key = frozenset(delta.items() if isinstance(delta, dict) else delta)
+                groups.setdefault(key, []).append(ec2_object)
+        return groups
+
+    @retry(
+        retry_on_exception=is_throttle_error,
+        stop_max_attempt_number=max_attempts,
+        wait_exponential_multiplier=1000,
+        wait_exponential_max=10000,
+    )
+    def _create_tags(self, resource_ids, tags):
+        self.ec2_client.create_tags(Resources=resource_ids, Tags=tags)
+
+    @retry(
+        retry_on_exception=is_throttle_error,
+        stop_max_attempt_number=max_attempts,
+        wait_exponential_multiplier=1000,
+        wait_exponential_max=10000,
+    )
+    def _delete_tags(self, resource_ids, tags):
+        self.ec2_client.delete_tags(Resources=resource_ids, Tags=tags)
+
+    def _send(self, send, resource_ids, tags, failures):
+        """
+        Call send (_create_tags or _delete_tags) for resource_ids.
+
+        Ids AWS rejects are added to the failures dict with the reason.
+
+        :returns: The number of API calls made.
+        """
+        try:
+            send(resource_ids, tags)
+        except Exception as e:
+            if not is_bad_id_error(e):
+                raise
+            if len(resource_ids) == 1:
+                failures[resource_ids[0]] = str(e)
+                return 1
+            named = set(RESOURCE_ID_PATTERN.findall(str(e))) & set(resource_ids)
+            if named and len(named) < len(resource_ids):
+                for resource_id in named:
+                    failures[resource_id] = str(e)
+                batches = [[i for i in resource_ids if i not in named]]
+            else:
+                middle = len(resource_ids) // 2
+                batches = [resource_ids[:middle], resource_ids[middle:]]
+            return 1 + sum(
+                self._send(send, batch, tags, failures) for batch in batches
+            )
+        return 1
+
+    def flush(self):
+        """
+        Send all queued tag mutations in batched calls.
+
+        :raises Exception: listing every resource id AWS rejected and why.
+
+        :returns: The number of API calls made.
+        """
+        calls = 0
+        failures = {}
+        for delta, ec2_objects in self._group(self.deletes).items():
+            tags = [{'Key' : key} for key in sorted(delta)]
+            for chunk in chunks(ec2_objects, self.max_resources):
+                calls += self._send(self._delete_tags, get_ids(chunk), tags, failures)
+                for ec2_object in chunk:
+                    if ec2_object.id not in failures:
+                        patch_tags(ec2_object, [], delete_keys=delta)
+        for delta, ec2_objects in self._group(self.creates).items():
+            tags = [{'Key' : key, 'Value' : value} for key, value in sorted(delta)]
+            for chunk in chunks(ec2_objects, self.max_resources):
+                calls += self._send(self._create_tags, get_ids(chunk), tags, failures)
+                for ec2_object in chunk:
+                    if ec2_object.id not in failures:
+                        patch_tags(ec2_object, tags)
+        self.creates = {}
+        self.deletes = {}
+        if failures:
+            raise Exception(
+                'tagging failed for {} resources: {}'.format(
+                    len(failures),
+                    ', '.join(
+                        '{} ({})'.format(k, v) for k, v in sorted(failures.items())
+                    ),
+                )
+            )
+        return calls
 
 def dict_to_key_value(data, sep='=', pair_sep=','):
     """
@@ -337,9 +835,12 @@ def get_port_range(raw_range, ip_protocol='tcp'):
       >>> get_port_range('tacobell', ip_protocol='icmp')
       (-1, -1)
 
+      >>> get_port_range(-1, ip_protocol='-1')
+      (-1, -1)
+
     :param raw_range: A string or integer.
 
-    :param ip_protocol: Optional, 'tcp', 'udp', 'icpm' (Default 'tcp')
+    :param ip_protocol: Optional, 'tcp', 'udp', 'icpm' or '-1' (Default 'tcp')
 
     :returns: (from_port, to_port)
     """
@@ -350,7 +851,8 @@ def get_port_range(raw_range, ip_protocol='tcp'):
         # exit early if raw_range is already a tuple.
         return raw_range
 
-    if ip_protocol == 'icmp':
+    if ip_protocol in ('icmp', '-1'):
+        # all traffic (-1) has no ports, AWS reports them as -1.
         return (-1, -1)
 
     raw_range = str(raw_range).replace(' ','')
@@ -371,6 +873,68 @@ def normalize_sg_port(sg_rule_tuple):
     """accept a security group rule tuple, return normalized port range."""
     return get_port_range(sg_rule_tuple[2], sg_rule_tuple[1])
 
+def format_sg_port(port_range):
+    """
+    Return a (from_port, to_port) tuple in config form, for humans.
+
+    .. code-block:: python
+
+      >>> format_sg_port((443, 443))
+      443
+      >>> format_sg_port((5000, 5009))
+      '5000-5009'
+
+    :param port_range: A (from_port, to_port) tuple.
+
+    :returns: An int if from_port equals to_port, else a from-to string.
+    """
+    from_port, to_port = port_range
+    if from_port == to_port:
+        return from_port
+    return '{}-{}'.format(from_port, to_port)
+
+def merge_port_ranges(port_ranges):
+    """
+    Merge overlapping and adjacent port ranges in one sorted sweep.
+
+    .. code-block:: python
+
+      >>> merge_port_ranges([(8006, 8006), (22, 22), (8000, 8005)])
+      [(22, 22), (8000, 8006)]
+
+    :param port_ranges: A list of (from_port, to_port) tuples.
+
+    :returns: A sorted list of non overlapping (from_port, to_port) tuples.
+    """
+    merged = []
+    for from_port, to_port in sorted(port_ranges):
+        if merged and from_port <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], to_port))
+        else:
+            merged.append((from_port, to_port))
+    return merged
+
+def coalesce_sg_rules(sg_rules):
+    """
+    Return a sorted list of normalized security group rule tuples.
+
+    Duplicates are dropped and the port ranges of each (source, protocol)
+    are merged, so (web, tcp, 8000-8005) and (web, tcp, 8006) become
+    (web, tcp, (8000, 8006)).
+
+    :param sg_rules: A list of security group rule tuples.
+
+    :returns: A list of (source, protocol, (from_port, to_port)) tuples.
+    """
+    port_ranges = {}
+    for source, protocol, port_range in normalize_sg_rules(sg_rules):
+        port_ranges.setdefault((source, protocol), []).append(port_range)
+    return sorted(
+        (source, protocol, port_range)
+        for (source, protocol), ranges in port_ranges.items()
+        for port_range in merge_port_ranges(ranges)
+    )
+
 def get_block_device_map_from_role_config(role_cfg):
     """accept role config data and return a Boto3 friendly BlockDeviceMappings."""
     block_device_map = []
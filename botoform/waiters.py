@@ -0,0 +1,127 @@
+import time
+
+# the state reported for a resource which no longer shows up in describe.
+GONE = "gone"
+
+# seconds to sleep between polls, the last delay repeats until timeout.
+DEFAULT_DELAYS = (2, 2, 3, 5, 8, 13, 15)
+
+# seconds to wait for the slowest resource before giving up.
+DEFAULT_TIMEOUT = 3600
+
+
+class Waiter(object):
+    """
+    Wait for many resources of one type to reach a desired state.
+
+    Every tick makes a single batched describe call for all pending
+    resources, so the total wait is bounded by the slowest resource
+    instead of the sum of one waiter per resource. For example::
+
+      waiter = Waiter(describe_states, "available", "rds", log=evpc.log)
+      waiter.wait(["db1", "db2"])
+    """
+
+    def __init__(
+        self,
+        describe,
+        desired,
+        name="resources",
+        log=None,
+        delays=DEFAULT_DELAYS,
+        timeout=DEFAULT_TIMEOUT,
+        failure=None,
+    ):
+        """
+        :param describe:
+          A callable which accepts a list of pending ids and returns a dict
+          of id to current state. Ids missing from the dict are GONE.
+        :param desired: A desired state or a list of desired states.
+        :param name: A human name for this kind of resource, used for logs.
+        :param log: Optional, a Log object to emit progress to.
+        :param delays: Optional, a list of seconds to sleep between polls.
+        :param timeout: Optional, seconds to wait before raising Exception.
+        :param failure:
+          Optional, a list of states which never become desired, a
+          resource in one of them raises Exception right away.
+        """
+        self.describe = describe
+        if not isinstance(desired, (list, tuple, set)):
+            desired = [desired]
+        self.desired = list(desired)
+        self.name = name
+        self.log = log
+        self.delays = delays
+        self.timeout = timeout
+        self.failure = set(failure or [])
+
+    def _emit(self, msg, log_level="info"):
+        if self.log is not None:
+            self.log.emit(msg, log_level)
+
+    def _delay(self, tick):
+        return self.delays[min(tick, len(self.delays) - 1)]
+
+    def wait(self, ids):
+        """
+        Block until every id reaches a desired state.
+
+        :param ids: A list of resource ids (or names) to wait on.
+
+        :raises Exception:
+          if some ids reach a failure state or are still pending after timeout.
+
+        :returns: dict of id to the state it reached.
+        """
+        pending = list(ids)
+        total = len(pending)
+        states, reached = {}, {}
+        deadline = time.time() + self.timeout
+        tick = 0
+        while pending:
+            # external API call to AWS, one per tick for all pending ids.
+            current = self.describe(pending)
+            still_pending, failed = [], []
+            for resource_id in pending:
+                state = current.get(resource_id, GONE)
+                if state != states.get(resource_id):
+                    msg = "{} {} is {}".format(self.name, resource_id, state)
+                    self._emit(msg, "debug")
+                    states[resource_id] = state
+                if state in self.desired:
+                    reached[resource_id] = state
+                elif state in self.failure:
+                    failed.append(resource_id)
+                else:
+                    still_pending.append(resource_id)
+            if failed:
+                raise Exception(
+                    "{} can never become {}: {}".format(
+                        self.name,
+                        "/".join(self.desired),
+                        ", ".join(
+                            "{} ({})".format(i, states[i]) for i in sorted(failed)
+                        ),
+                    )
+                )
+            pending = still_pending
+            if not pending:
+                break
+            if time.time() >= deadline:
+                raise Exception(
+                    "timed out waiting for {} to become {}: {}".format(
+                        self.name,
+                        "/".join(self.desired),
+                        ", ".join(
+                            "{} ({})".format(i, states[i]) for i in sorted(pending)
+                        ),
+                    )
+                )
+            self._emit(
+                "waiting for {} of {} {} to become {} ...".format(
+                    len(pending), total, self.name, "/".join(self.desired)
+                )
+            )
+            time.sleep(self._delay(tick))
+            tick += 1
+        return reached
@@ -1,7 +1,8 @@
-from botoform import build_parser, get_evpc_from_args
+from botoform import build_parser, get_evpc_from_args, validate_profile
 
 parser = build_parser("Example of how to hack your own botoform tools.")
 args = parser.parse_args()
+validate_profile(parser, args)
 evpc = get_evpc_from_args(args)
 
 print(evpc.cidr_block)
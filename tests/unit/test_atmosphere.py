@@ -0,0 +1,32 @@
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from botoform.plugins.atmosphere import get_vpc_names
+
+
+class TestGetVpcNames(TestCase):
+    """Test Suite for get_vpc_names function."""
+
+    @patch("botoform.plugins.atmosphere.BotoConnections")
+    def test_regions_share_the_profile_session(self, connections):
+        client = MagicMock()
+        session = MagicMock(profile="dev")
+        session.create_client = MagicMock(return_value=client)
+        client.can_paginate = MagicMock(return_value=False)
+        client.describe_vpcs = MagicMock(
+            return_value={
+                "Vpcs": [
+                    {"VpcId": "vpc-1", "Tags": [{"Key": "Name", "Value": "web"}]},
+                    {"VpcId": "vpc-2"},
+                ]
+            }
+        )
+        for region_name in ("us-east-1", "us-west-2"):
+            vpc_names = get_vpc_names(("dev", region_name), session)
+            self.assertEqual(vpc_names, {"web": "vpc-1", "vpc-2": "vpc-2"})
+        self.assertEqual(
+            [c[1]["region_name"] for c in session.create_client.call_args_list],
+            ["us-east-1", "us-west-2"],
+        )
+        self.assertEqual(connections.call_count, 0)
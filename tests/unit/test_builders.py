@@ -0,0 +1,348 @@
+from unittest import TestCase
+
+from mock import MagicMock
+
+from contextlib import contextmanager
+
+from botocore.exceptions import ClientError
+
+from botoform.builders import (
+    BUILD_STAGE_DEPENDENCIES,
+    EnvironmentBuilder,
+    plan_instance_role_launch,
+    plan_security_group_rules,
+)
+
+DEFAULT_EGRESS = ("0.0.0.0/0", "-1", (-1, -1))
+
+
+@contextmanager
+def snapshot():
+    yield
+
+
+class TestPlanSecurityGroupRules(TestCase):
+    """Test Suite for plan_security_group_rules function."""
+
+    def setUp(self):
+        self.current = {
+            "web": {
+                "inbound": [("10.0.0.0/8", "tcp", 22), ("admin", "tcp", "80-81")],
+                "outbound": [("0.0.0.0/0", "-1", -1)],
+            }
+        }
+
+    def test_unchanged_group_is_left_out(self):
+        cfg = {"web": {"inbound": self.current["web"]["inbound"]}}
+        self.assertEqual(plan_security_group_rules(cfg, self.current), {})
+
+    def test_adds_only_without_prune(self):
+        cfg = {"web": {"inbound": [("10.0.0.0/8", "tcp", "443")]}}
+        plan = plan_security_group_rules(cfg, self.current)
+        self.assertEqual(
+            plan["web"],
+            {"inbound": {"add": [("10.0.0.0/8", "tcp", (443, 443))], "remove": []}},
+        )
+
+    def test_prune_removes_rules_not_in_config(self):
+        cfg = {"web": {"inbound": [("10.0.0.0/8", "tcp", 22)]}}
+        plan = plan_security_group_rules(cfg, self.current, prune=True)
+        self.assertEqual(
+            plan["web"],
+            {"inbound": {"add": [], "remove": [("admin", "tcp", (80, 81))]}},
+        )
+
+    def test_custom_outbound_replaces_default_rule(self):
+        cfg = {"web": {"outbound": [("10.0.0.0/8", "tcp", "all")]}}
+        plan = plan_security_group_rules(cfg, self.current)
+        self.assertEqual(
+            plan["web"]["outbound"],
+            {"add": [("10.0.0.0/8", "tcp", (1, 65535))], "remove": [DEFAULT_EGRESS]},
+        )
+
+    def test_new_group_is_planned(self):
+        cfg = {"db": {"inbound": [("web", "tcp", 5432)]}}
+        plan = plan_security_group_rules(cfg, {})
+        self.assertEqual(
+            plan["db"],
+            {"inbound": {"add": [("web", "tcp", (5432, 5432))], "remove": []}},
+        )
+
+
+class TestReconcileSecurityGroups(TestCase):
+    """Test Suite for EnvironmentBuilder.reconcile_security_groups method."""
+
+    def test_one_authorize_and_revoke_per_direction(self):
+        builder = EnvironmentBuilder.__new__(EnvironmentBuilder)
+        builder.log = MagicMock()
+        builder.max_workers = 4
+        builder.evpc = MagicMock()
+        builder.evpc.snapshot = snapshot
+        builder.evpc.get_security_group_rules = MagicMock(
+            return_value={
+                "web": {
+                    "inbound": [("10.0.0.0/8", "tcp", 22)],
+                    "outbound": [("0.0.0.0/0", "-1", -1)],
+                }
+            }
+        )
+        sg = MagicMock(id="sg-web")
+        builder.evpc.get_security_group = MagicMock(
+            side_effect=lambda name: sg if name == "web" else None
+        )
+        cfg = {
+            "web": {
+                "inbound": [("10.1.0.0/16", "tcp", 22), ("10.2.0.0/16", "tcp", 443)],
+                "outbound": [("10.0.0.0/8", "tcp", 443)],
+            }
+        }
+
+        plan = builder.reconcile_security_groups(cfg, prune=True, dry_run=True)
+        self.assertEqual(sg.authorize_ingress.call_count, 0)
+
+        builder.security_groups = MagicMock()
+        self.assertEqual(builder.reconcile_security_groups(cfg, prune=True), plan)
+        self.assertEqual(sg.authorize_ingress.call_count, 1)
+        self.assertEqual(sg.revoke_ingress.call_count, 1)
+        self.assertEqual(sg.authorize_egress.call_count, 1)
+        self.assertEqual(sg.revoke_egress.call_count, 1)
+        permissions = sg.authorize_ingress.call_args[1]["IpPermissions"]
+        self.assertEqual(len(permissions), 2)
+        revoked = sg.revoke_egress.call_args[1]["IpPermissions"]
+        self.assertEqual(
+            revoked,
+            [
+                {
+                    "IpProtocol": "-1",
+                    "FromPort": -1,
+                    "ToPort": -1,
+                    "IpRanges": [{"CidrIp": "0.0.0.0/0"}],
+                }
+            ],
+        )
+
+    def test_prune_revokes_icmp_with_real_ports(self):
+        builder = EnvironmentBuilder.__new__(EnvironmentBuilder)
+        builder.log = MagicMock()
+        builder.max_workers = 1
+        builder.evpc = MagicMock()
+        builder.evpc.snapshot = snapshot
+        builder.evpc.get_security_group_rules = MagicMock(
+            return_value={
+                "web": {
+                    "inbound": [("10.0.0.0/8", "icmp", (8, -1))],
+                    "outbound": [("0.0.0.0/0", "-1", (-1, -1))],
+                }
+            }
+        )
+        sg = MagicMock(id="sg-web")
+        builder.evpc.get_security_group = MagicMock(
+            side_effect=lambda name: sg if name == "web" else None
+        )
+        builder.security_groups = MagicMock()
+        plan = builder.reconcile_security_groups({"web": {}}, prune=True)
+        self.assertEqual(
+            plan["web"],
+            {"inbound": {"add": [], "remove": [("10.0.0.0/8", "icmp", (8, -1))]}},
+        )
+        self.assertEqual(
+            sg.revoke_ingress.call_args[1]["IpPermissions"],
+            [
+                {
+                    "IpProtocol": "icmp",
+                    "FromPort": 8,
+                    "ToPort": -1,
+                    "IpRanges": [{"CidrIp": "10.0.0.0/8"}],
+                }
+            ],
+        )
+        self.assertEqual(sg.revoke_egress.call_count, 0)
+
+    def test_prune_revokes_peer_group_by_id(self):
+        builder = EnvironmentBuilder.__new__(EnvironmentBuilder)
+        builder.log = MagicMock()
+        builder.max_workers = 1
+        builder.evpc = MagicMock()
+        builder.evpc.snapshot = snapshot
+        builder.evpc.get_security_group_rules = MagicMock(
+            return_value={"web": {"inbound": [("sg-peer", "tcp", (22, 22))]}}
+        )
+        sg = MagicMock(id="sg-web")
+        builder.evpc.get_security_group = MagicMock(
+            side_effect=lambda name: sg if name == "web" else None
+        )
+        builder.security_groups = MagicMock()
+        builder.reconcile_security_groups({"web": {}}, prune=True)
+        self.assertEqual(
+            sg.revoke_ingress.call_args[1]["IpPermissions"],
+            [
+                {
+                    "IpProtocol": "tcp",
+                    "FromPort": 22,
+                    "ToPort": 22,
+                    "UserIdGroupPairs": [{"GroupId": "sg-peer"}],
+                }
+            ],
+        )
+
+    def test_sources_grouped_per_protocol_and_port_range(self):
+        builder = EnvironmentBuilder.__new__(EnvironmentBuilder)
+        builder.log = MagicMock()
+        builder.evpc = MagicMock()
+        builder.evpc.get_security_group = MagicMock(
+            side_effect=lambda name: MagicMock(id="sg-web") if name == "web" else None
+        )
+        rules = {
+            "inbound": [
+                ("web", "tcp", "8000-8005"),
+                ("web", "tcp", 8006),
+                ("10.0.0.0/8", "tcp", "8000-8006"),
+                ("10.0.0.0/8", "tcp", 8000),
+                ("10.1.0.0/16", "tcp", 22),
+            ]
+        }
+        permissions = builder.security_group_rules_to_permissions("db", rules)
+        self.assertEqual(
+            permissions,
+            [
+                {
+                    "IpProtocol": "tcp",
+                    "FromPort": 22,
+                    "ToPort": 22,
+                    "IpRanges": [{"CidrIp": "10.1.0.0/16"}],
+                },
+                {
+                    "IpProtocol": "tcp",
+                    "FromPort": 8000,
+                    "ToPort": 8006,
+                    "IpRanges": [{"CidrIp": "10.0.0.0/8"}],
+                    "UserIdGroupPairs": [{"GroupId": "sg-web"}],
+                },
+            ],
+        )
+
+
+class TestPlanInstanceRoleLaunch(TestCase):
+    """Test Suite for plan_instance_role_launch function."""
+
+    def setUp(self):
+        self.subnets = [
+            ("subnet-a", "az-1"),
+            ("subnet-b", "az-2"),
+            ("subnet-c", "az-1"),
+        ]
+
+    def test_spread_across_zones_then_subnets(self):
+        self.assertEqual(
+            plan_instance_role_launch(5, self.subnets, []),
+            [("subnet-a", 2), ("subnet-b", 2), ("subnet-c", 1)],
+        )
+
+    def test_existing_instances_fill_first(self):
+        existing = [("subnet-a", "az-1"), ("subnet-a", "az-1")]
+        self.assertEqual(
+            plan_instance_role_launch(4, self.subnets, existing),
+            [("subnet-b", 2)],
+        )
+
+    def test_existing_in_unlisted_subnet_counts(self):
+        existing = [("subnet-z", "az-3")] * 3
+        self.assertEqual(plan_instance_role_launch(3, self.subnets, existing), [])
+
+    def test_more_existing_than_desired_never_negative(self):
+        existing = [("subnet-a", "az-1")] * 4
+        self.assertEqual(plan_instance_role_launch(2, self.subnets, existing), [])
+        self.assertEqual(plan_instance_role_launch(2, [], []), [])
+
+
+class TestInstanceRole(TestCase):
+    """Test Suite for EnvironmentBuilder.instance_role method."""
+
+    def test_one_inventory_read(self):
+        builder = EnvironmentBuilder.__new__(EnvironmentBuilder)
+        builder.log = MagicMock()
+        builder.amis = {"ubuntu": {"us-east-1": "ami-1"}}
+        builder.evpc = MagicMock(region_name="us-east-1")
+        builder.evpc.snapshot = snapshot
+        subnets = {}
+        for name, zone in (("a", "az-1"), ("b", "az-2")):
+            subnets[name] = MagicMock(id="subnet-" + name, availability_zone=zone)
+            subnets[name].tags = [{"Key": "Name", "Value": name}]
+            subnets[name].create_instances = MagicMock(return_value=[])
+        builder.evpc.get_subnet = MagicMock(side_effect=lambda name: subnets[name])
+        web = MagicMock(subnet_id="subnet-a", placement={"AvailabilityZone": "az-1"})
+        builder.evpc.get_inventory = MagicMock(return_value=[web, web])
+        builder.evpc.get_role = MagicMock(return_value=[web])
+        role_data = {"ami": "ubuntu", "subnets": ["a", "b"], "instance_type": "t2"}
+
+        builder.instance_role("web", role_data, 3)
+
+        self.assertEqual(builder.evpc.get_inventory.call_count, 1)
+        self.assertEqual(builder.evpc.get_role.call_count, 1)
+        self.assertEqual(subnets["a"].create_instances.call_count, 0)
+        kwargs = subnets["b"].create_instances.call_args[1]
+        self.assertEqual((kwargs["MinCount"], kwargs["MaxCount"]), (2, 2))
+
+
+class TestInstanceProfiles(TestCase):
+    """Test Suite for EnvironmentBuilder instance_profile methods."""
+
+    def setUp(self):
+        self.builder = EnvironmentBuilder.__new__(EnvironmentBuilder)
+        self.builder.log = MagicMock()
+        self.builder.instance_profile_cache = {}
+        self.builder.boto = MagicMock()
+        self.existing = set(["web"])
+        self.loaded = []
+
+        def instance_profile(name):
+            def load():
+                self.loaded.append(name)
+                if name not in self.existing:
+                    error = {"Error": {"Code": "NoSuchEntity"}}
+                    raise ClientError(error, "GetInstanceProfile")
+
+            return MagicMock(load=load)
+
+        self.builder.boto.iam.InstanceProfile = instance_profile
+
+    def test_get_instance_profile_by_name_cached(self):
+        self.assertIsNotNone(self.builder.get_instance_profile("web"))
+        self.assertIsNotNone(self.builder.get_instance_profile("web"))
+        self.assertIsNone(self.builder.get_instance_profile("db"))
+        self.assertIsNone(self.builder.get_instance_profile("db"))
+        # missing instance_profiles are not cached, they may show up.
+        self.assertEqual(self.loaded, ["web", "db", "db"])
+
+    def test_one_call_per_distinct_name(self):
+        self.builder.create_instance_profile = MagicMock(
+            side_effect=lambda name: self.existing.add(name)
+        )
+        cfg = {
+            "web": {"instance_profile_name": "web"},
+            "api": {"instance_profile_name": "web"},
+            "db": {"instance_profile_name": "db"},
+            "cache": {},
+        }
+        self.builder.instance_profiles(cfg)
+        self.builder.create_instance_profile.assert_called_once_with("db")
+        # db: missing, created, visible on the first wait tick.
+        self.assertEqual(self.loaded, ["db", "db", "web"])
+        self.builder.wait_for_instance_profile("web")
+        self.assertEqual(len(self.loaded), 3)
+
+
+class TestBuildStageDependencies(TestCase):
+    """Test Suite for BUILD_STAGE_DEPENDENCIES."""
+
+    def test_load_balancers_wait_for_roles(self):
+        for stage in (
+            "instance_roles",
+            "autoscaling_instance_roles",
+            "wait_for_instance_roles",
+        ):
+            self.assertIn(stage, BUILD_STAGE_DEPENDENCIES["load_balancers"])
+
+    def test_route_table_rules_wait_for_gateways(self):
+        for stage in ("internet_gateway", "vpn_gateway"):
+            self.assertIn(stage, BUILD_STAGE_DEPENDENCIES["route_table_rules"])
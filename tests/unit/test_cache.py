@@ -0,0 +1,103 @@
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Thread
+
+import json
+import time
+
+from botoform.cache import DiskCache
+from botoform.plugins.atmosphere import get_cached_vpc_names
+
+
+class TestDiskCache(TestCase):
+    """Test Suite for DiskCache class."""
+
+    def setUp(self):
+        self.cache_dir = mkdtemp()
+        self.cache = DiskCache("vpc_names", ttl=60, cache_dir=self.cache_dir)
+        self.key = ("default", "us-east-1")
+
+    def tearDown(self):
+        rmtree(self.cache_dir)
+
+    def age(self, seconds):
+        # rewrite the cached document as if it were written seconds ago.
+        path = self.cache.path(self.key)
+        with open(path) as f:
+            document = json.load(f)
+        document["written"] -= seconds
+        with open(path, "w") as f:
+            json.dump(document, f)
+
+    def test_miss_computes_and_hit_reads(self):
+        compute = MagicMock(return_value={"web": "vpc-1"})
+        self.assertEqual(self.cache.get(self.key, compute), {"web": "vpc-1"})
+        self.assertEqual(self.cache.get(self.key, compute), {"web": "vpc-1"})
+        self.assertEqual(compute.call_count, 1)
+
+    def test_stale_and_refresh_recompute(self):
+        compute = MagicMock(side_effect=[["a"], ["b"], ["c"]])
+        self.cache.get(self.key, compute)
+        self.age(120)
+        self.assertEqual(self.cache.get(self.key, compute), ["b"])
+        self.assertEqual(self.cache.get(self.key, compute, refresh=True), ["c"])
+        self.assertEqual(self.cache.read(self.key)[0], ["c"])
+
+    def test_zero_ttl_disables_cache(self):
+        self.cache.ttl = 0
+        compute = MagicMock(return_value=["a"])
+        self.cache.get(self.key, compute)
+        self.cache.get(self.key, compute)
+        self.assertEqual(compute.call_count, 2)
+        self.assertEqual(self.cache.read(self.key), (None, None))
+
+    def test_revalidate_returns_stale_then_refreshes(self):
+        self.cache.get(self.key, lambda: ["old"])
+        self.age(120)
+        value = self.cache.get(self.key, lambda: ["new"], revalidate=True)
+        self.assertEqual(value, ["old"])
+        for _ in range(100):
+            if self.cache.read(self.key)[0] == ["new"]:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.cache.read(self.key)[0], ["new"])
+
+    def test_parallel_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return ["a"]
+
+        results = []
+        threads = [
+            Thread(target=lambda: results.append(self.cache.get(self.key, compute)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [["a"]] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_path_is_sanitized(self):
+        path = self.cache.path(("my/profile", "us-east-1"))
+        self.assertTrue(path.endswith("my_profile-us-east-1.json"))
+
+    @patch("botoform.plugins.atmosphere.get_vpc_names")
+    def test_cache_key_is_only_a_label(self, get_vpc_names):
+        get_vpc_names.return_value = {"web": "vpc-1"}
+        args = MagicMock(refresh=False, revalidate=False)
+        names = get_cached_vpc_names(
+            self.cache, args, (None, "us-east-1"), ("default", "us-east-1")
+        )
+        self.assertEqual(names, {"web": "vpc-1"})
+        # boto gets the real (missing) profile, the cache gets the label.
+        get_vpc_names.assert_called_once_with((None, "us-east-1"), None)
+        self.assertEqual(self.cache.read(self.key)[0], {"web": "vpc-1"})
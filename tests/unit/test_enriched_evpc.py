@@ -1,6 +1,8 @@
 from helpers import BotoformTestCase
 
-from mock import MagicMock
+from mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
 
 
 class TestEnrichedVPC(BotoformTestCase):
@@ -115,3 +117,496 @@ class TestEnrichedVPC(BotoformTestCase):
         # TODO: define custom exceptions for botoform.
         with self.assertRaises(Exception):
             web01 = self.evpc1.find_instance("web01")
+
+    def test_snapshot_reads_instances_once(self):
+        with self.evpc1.snapshot():
+            self.assertEqual(len(self.evpc1.instances), 4)
+            self.assertEqual(len(self.evpc1.roles), 3)
+            self.assertEqual(len(self.evpc1.get_role("web")), 2)
+        self.assertEqual(self.evpc1._ec2_instances.call_count, 1)
+
+    def test_snapshot_nested_reuses_outer(self):
+        with self.evpc1.snapshot() as outer:
+            with self.evpc1.snapshot() as inner:
+                self.assertIs(outer, inner)
+            self.assertIs(self.evpc1._snapshot, outer)
+        self.assertIsNone(self.evpc1._snapshot)
+
+    def test_snapshot_invalidate(self):
+        with self.evpc1.snapshot():
+            self.evpc1.instances
+            self.evpc1.invalidate_snapshot("instances")
+            self.evpc1.instances
+        self.assertEqual(self.evpc1._ec2_instances.call_count, 2)
+
+    def test_snapshot_add_patches_loaded_kind(self):
+        with self.evpc1.snapshot():
+            self.evpc1.instances
+            new_instance = MagicMock(id="i-mock5555", tags=[])
+            self.evpc1.add_to_snapshot("instances", [new_instance])
+            self.assertEqual(len(self.evpc1.instances), 5)
+        self.assertEqual(self.evpc1._ec2_instances.call_count, 1)
+
+    def test_snapshot_shared_by_threads_reads_once(self):
+        from botoform.util import run_concurrently
+
+        with self.evpc1.snapshot():
+            counts = run_concurrently(
+                lambda _: len(self.evpc1.instances), range(8), max_workers=8
+            )
+        self.assertEqual(counts, [4] * 8)
+        self.assertEqual(self.evpc1._ec2_instances.call_count, 1)
+
+    def test_no_snapshot_reads_every_time(self):
+        self.evpc1.instances
+        self.evpc1.instances
+        self.assertEqual(self.evpc1._ec2_instances.call_count, 2)
+
+    def test_find_instance_in_snapshot_builds_index_once(self):
+        with self.evpc1.snapshot() as snapshot:
+            web01 = self.evpc1.find_instance("web01")
+            index = snapshot.indexes[("instances", "identifiers")]
+            proxy01 = self.evpc1.find_instance("webapp01-proxy01")
+            self.assertIs(index, snapshot.indexes[("instances", "identifiers")])
+        self.assertEqual(web01.hostname, "webapp01-web01")
+        self.assertEqual(proxy01.hostname, "webapp01-proxy01")
+        self.assertEqual(self.evpc1._ec2_instances.call_count, 1)
+
+    def test_find_instances_keeps_inventory_order(self):
+        mix = self.evpc1.include_instances(
+            identifiers=["proxy01", "web01"], roles=["vpn"]
+        )
+        self.assertEqual(
+            [i.shortname for i in mix], ["web01", "proxy01", "test"]
+        )
+
+    def test_describe_hydrated_instances_one_call(self):
+        client = MagicMock()
+        client.can_paginate = MagicMock(return_value=False)
+        client.describe_instances = MagicMock(
+            return_value={
+                "Reservations": [
+                    {"Instances": [{"InstanceId": "i-1"}, {"InstanceId": "i-2"}]},
+                    {"Instances": [{"InstanceId": "i-3"}]},
+                ]
+            }
+        )
+        self.evpc1.vpc = MagicMock(id="vpc-mock1111")
+        self.evpc1.boto.ec2_client = client
+        self.evpc1.boto.ec2 = MagicMock()
+        self.evpc1.boto.ec2.Instance = lambda instance_id: MagicMock(id=instance_id)
+
+        instances = self.evpc1._describe_hydrated("instances")
+
+        self.assertEqual([i.id for i in instances], ["i-1", "i-2", "i-3"])
+        self.assertEqual(instances[2].meta.data, {"InstanceId": "i-3"})
+        client.describe_instances.assert_called_once_with(
+            Filters=[{"Name": "vpc-id", "Values": ["vpc-mock1111"]}]
+        )
+
+    def test_describe_volumes_batches_instance_ids(self):
+        client = MagicMock()
+        client.can_paginate = MagicMock(return_value=False)
+        client.describe_volumes = MagicMock(
+            side_effect=[
+                {"Volumes": [{"VolumeId": "vol-1"}, {"VolumeId": "vol-2"}]},
+                {"Volumes": [{"VolumeId": "vol-2"}, {"VolumeId": "vol-3"}]},
+            ]
+        )
+        self.evpc1.boto.ec2_client = client
+        self.evpc1.boto.ec2 = MagicMock()
+        self.evpc1.boto.ec2.Volume = lambda volume_id: MagicMock(id=volume_id)
+        instance_ids = ["i-{:03d}".format(i) for i in range(250)]
+
+        volumes = self.evpc1._describe_volumes(instance_ids)
+
+        self.assertEqual([v.id for v in volumes], ["vol-1", "vol-2", "vol-3"])
+        self.assertEqual(client.describe_volumes.call_count, 2)
+        filters = client.describe_volumes.call_args_list[0][1]["Filters"]
+        self.assertEqual(filters[0]["Name"], "attachment.instance-id")
+        self.assertEqual(len(filters[0]["Values"]), 200)
+
+    def _mock_volumes(self):
+        self.evpc1._describe_volumes = MagicMock(
+            return_value=[
+                MagicMock(id="vol-1", attachments=[{"InstanceId": "i-mock1111"}]),
+                MagicMock(id="vol-2", attachments=[{"InstanceId": "i-mock1111"}]),
+                MagicMock(id="vol-3", attachments=[{"InstanceId": "i-mock2222"}]),
+            ]
+        )
+
+    def test_get_instance_volumes_in_snapshot_one_describe(self):
+        self._mock_volumes()
+        with self.evpc1.snapshot():
+            volumes = [
+                [v.id for v in self.evpc1.get_instance_volumes(i)]
+                for i in self.evpc1.instances
+            ]
+        self.assertEqual(volumes, [["vol-1", "vol-2"], ["vol-3"], [], []])
+        self.assertEqual(self.evpc1._describe_volumes.call_count, 1)
+
+    def test_taggable_resources_is_generator(self):
+        self._mock_volumes()
+        self.evpc1.vpc = MagicMock(id="vpc-mock1111")
+        self.evpc1._describe_hydrated = MagicMock(return_value=[])
+        resources = self.evpc1.taggable_resources
+        self.assertFalse(isinstance(resources, list))
+        ids = [r.id for r in resources]
+        self.assertEqual(ids[-3:], ["vol-1", "vol-2", "vol-3"])
+        self.assertEqual(self.evpc1._describe_volumes.call_count, 1)
+
+    def test_taggable_resources_yields_after_snapshot_closes(self):
+        self._mock_volumes()
+        self.evpc1.vpc = MagicMock(id="vpc-mock1111")
+        self.evpc1._describe_hydrated = MagicMock(return_value=[])
+        snapshots = [self.evpc1._snapshot for r in self.evpc1.taggable_resources]
+        self.assertEqual(snapshots, [None] * 9)
+
+    def _stopping(self, *instance_ids):
+        return {"StoppingInstances": [{"InstanceId": i} for i in instance_ids]}
+
+    def test_stop_instances_one_call(self):
+        self.evpc1.boto.ec2_client = MagicMock()
+        self.evpc1.boto.ec2_client.stop_instances = MagicMock(
+            return_value=self._stopping(
+                "i-mock1111", "i-mock2222", "i-mock3333", "i-mock4444"
+            )
+        )
+        self.evpc1.stop_instances(wait=False)
+        self.evpc1.boto.ec2_client.stop_instances.assert_called_once_with(
+            InstanceIds=["i-mock1111", "i-mock2222", "i-mock3333", "i-mock4444"]
+        )
+
+    def test_batch_instance_operation_retries_failed_ids(self):
+        error = ClientError({"Error": {"Code": "IncorrectInstanceState"}}, "Stop")
+        self.evpc1.boto.ec2_client = MagicMock()
+        self.evpc1.boto.ec2_client.stop_instances = MagicMock(
+            side_effect=[
+                error,
+                self._stopping("i-mock1111"),
+                error,
+                self._stopping(),
+                self._stopping("i-mock4444"),
+            ]
+        )
+        with self.assertRaises(Exception) as context:
+            self.evpc1.batch_instance_operation(
+                "stop_instances", self.evpc1.instances
+            )
+        message = str(context.exception)
+        self.assertIn("failed for 2 instances", message)
+        self.assertIn("i-mock2222", message)
+        self.assertIn("i-mock3333", message)
+        self.assertEqual(self.evpc1.boto.ec2_client.stop_instances.call_count, 5)
+
+    def test_batch_instance_operation_retries_named_ids_alone(self):
+        error = ClientError(
+            {
+                "Error": {
+                    "Code": "InvalidInstanceID.NotFound",
+                    "Message": "The instance ID 'i-mock2222' does not exist",
+                }
+            },
+            "Stop",
+        )
+        stop_instances = MagicMock(
+            side_effect=[
+                error,
+                error,
+                self._stopping("i-mock1111", "i-mock3333", "i-mock4444"),
+            ]
+        )
+        self.evpc1.boto.ec2_client = MagicMock(stop_instances=stop_instances)
+        with self.assertRaises(Exception) as context:
+            self.evpc1.batch_instance_operation(
+                "stop_instances", self.evpc1.instances
+            )
+        self.assertIn("failed for 1 instances: i-mock2222", str(context.exception))
+        calls = [c[1]["InstanceIds"] for c in stop_instances.call_args_list]
+        self.assertEqual(
+            calls[1:],
+            [["i-mock2222"], ["i-mock1111", "i-mock3333", "i-mock4444"]],
+        )
+
+    def test_wait_until_instances_batched_describe(self):
+        def reservation(state):
+            return {
+                "Reservations": [
+                    {
+                        "Instances": [
+                            {"InstanceId": i.id, "State": {"Name": state}}
+                            for i in self.evpc1.instances
+                        ]
+                    }
+                ]
+            }
+
+        for instance in self.evpc1.instances:
+            instance.instance.meta = MagicMock()
+        client = MagicMock()
+        client.can_paginate = MagicMock(return_value=False)
+        client.describe_instances = MagicMock(
+            side_effect=[reservation("pending"), reservation("running")]
+        )
+        self.evpc1.boto.ec2_client = client
+        with patch("time.sleep", MagicMock()):
+            self.evpc1.wait_until_instances(state="running")
+        self.assertEqual(client.describe_instances.call_count, 2)
+        state = self.evpc1.instances[0].meta.data["State"]["Name"]
+        self.assertEqual(state, "running")
+
+    def test_ensure_vgw_state_detached_without_attachment(self):
+        self.evpc1.vpc = MagicMock(id="vpc-mock1111")
+        self.evpc1.boto.ec2_client = MagicMock()
+        self.evpc1.boto.ec2_client.describe_vpn_gateways = MagicMock(
+            return_value={
+                "VpnGateways": [
+                    {"VpnGatewayId": "vgw-1", "VpcAttachments": []},
+                    {
+                        "VpnGatewayId": "vgw-2",
+                        "VpcAttachments": [
+                            {"VpcId": "vpc-mock1111", "State": "detached"}
+                        ],
+                    },
+                ]
+            }
+        )
+        self.evpc1.ensure_vgw_state(["vgw-1", "vgw-2"], "detached")
+        self.assertEqual(
+            self.evpc1.boto.ec2_client.describe_vpn_gateways.call_count, 1
+        )
+
+    def test_lock_instances_concurrently(self):
+        instances = [
+            MagicMock(id="i-{}".format(i), spot_instance_request_id=None)
+            for i in range(5)
+        ]
+        self.evpc1.lock_instances(instances, max_workers=3)
+        for instance in instances:
+            instance.modify_attribute.assert_called_once_with(
+                DisableApiTermination={"Value": True}
+            )
+
+    def test_terminate_follows_dependency_graph(self):
+        order = []
+
+        def record(name):
+            return MagicMock(side_effect=lambda *args: order.append(name))
+
+        for name in (
+            "delete_instances",
+            "delete_autoscaling_groups",
+            "delete_network_interfaces",
+            "delete_security_groups",
+            "delete_subnets",
+            "delete_route_tables",
+            "delete_internet_gateways",
+            "detach_vpn_gateway",
+            "delete_vpc",
+            "delete_dhcp_options",
+        ):
+            setattr(self.evpc1, name, record(name))
+        for name in ("elb", "autoscaling", "rds", "key_pair", "vpc_endpoint"):
+            setattr(self.evpc1, name, MagicMock())
+        self.evpc1.route53 = MagicMock()
+        self.evpc1.route53.delete_private_zone = record("delete_private_zone")
+
+        self.evpc1.terminate()
+
+        self.assertEqual(len(order), 11)
+        self.assertEqual(order[-2:], ["delete_vpc", "delete_dhcp_options"])
+        for before, after in (
+            ("delete_instances", "delete_network_interfaces"),
+            ("delete_network_interfaces", "delete_subnets"),
+            ("delete_subnets", "delete_route_tables"),
+            ("delete_security_groups", "delete_internet_gateways"),
+        ):
+            self.assertLess(order.index(before), order.index(after))
+
+    def _mock_addresses(self):
+        self.evpc1._describe_addresses = MagicMock(
+            return_value=[
+                MagicMock(instance_id="i-mock3333", public_ip="54.1.1.3"),
+                MagicMock(instance_id="i-mock4444", public_ip="54.1.1.4"),
+                MagicMock(instance_id=None, public_ip="54.1.1.9"),
+            ]
+        )
+
+    def test_get_eip_map(self):
+        self._mock_addresses()
+        eip_map = self.evpc1.get_eip_map()
+        self.assertEqual(sorted(eip_map), ["i-mock3333", "i-mock4444"])
+        self.assertEqual(eip_map["i-mock3333"][0].public_ip, "54.1.1.3")
+
+    def test_eips_in_snapshot_one_describe(self):
+        self._mock_addresses()
+        with self.evpc1.snapshot():
+            eips = [len(i.eips) for i in self.evpc1.instances]
+        self.assertEqual(eips, [0, 0, 1, 1])
+        self.assertEqual(self.evpc1._describe_addresses.call_count, 1)
+
+    def test_instance_eips_outside_snapshot_filtered(self):
+        self._mock_addresses()
+        instance = self.evpc1.instances[2]
+        self.assertEqual(len(instance.eips), 1)
+        self.evpc1._describe_addresses.assert_called_once_with(["i-mock3333"])
+
+    def test_associated_eip_patched_into_snapshot(self):
+        self._mock_addresses()
+        eip = MagicMock(allocation_id="eipalloc-9", instance_id=None)
+        with self.evpc1.snapshot():
+            self.evpc1.get_eip_map()
+            self.evpc1.add_eip_to_snapshot("i-mock1111", eip)
+            eips = [i.eips for i in self.evpc1.instances]
+        self.assertEqual(eips[0], [eip])
+        self.assertEqual(self.evpc1._describe_addresses.call_count, 1)
+
+    def test_disassociate_eips_releases_after_disassociating(self):
+        self._mock_addresses()
+        self.evpc1.disassociate_eips()
+        for eip in self.evpc1._describe_addresses.return_value[:2]:
+            self.assertEqual(eip.association.delete.call_count, 1)
+            self.assertEqual(eip.release.call_count, 1)
+        self.assertEqual(self.evpc1._describe_addresses.call_count, 1)
+
+    def test_get_instances_keeps_enriched_instances(self):
+        instance = self.evpc1.instances[2]
+        self.assertIs(self.evpc1.get_instances([instance])[0], instance)
+
+    def test_delete_network_interfaces_skips_failures(self):
+        error = ClientError({"Error": {"Code": "OperationNotPermitted"}}, "Delete")
+        self.evpc1.vpc = MagicMock(id="vpc-mock1111")
+        client = MagicMock()
+        client.can_paginate = MagicMock(return_value=False)
+        client.describe_network_interfaces = MagicMock(
+            return_value={
+                "NetworkInterfaces": [
+                    {"NetworkInterfaceId": "eni-1"},
+                    {"NetworkInterfaceId": "eni-2"},
+                ]
+            }
+        )
+        client.delete_network_interface = MagicMock(side_effect=[error, None])
+        self.evpc1.boto.ec2_client = client
+        self.evpc1.log = MagicMock()
+        self.evpc1.delete_network_interfaces(max_workers=1)
+        self.assertEqual(client.delete_network_interface.call_count, 2)
+        filters = client.describe_network_interfaces.call_args[1]["Filters"]
+        self.assertIn({"Name": "requester-managed", "Values": ["false"]}, filters)
+        levels = [args[0][1:] for args in self.evpc1.log.emit.call_args_list]
+        self.assertIn(("warning",), levels)
+
+    def _mock_security_groups(self):
+        def pairs(*group_ids):
+            return [
+                {
+                    "IpProtocol": "tcp",
+                    "FromPort": 22,
+                    "ToPort": 22,
+                    "IpRanges": [],
+                    "UserIdGroupPairs": [{"GroupId": i} for i in group_ids],
+                }
+            ]
+
+        web = MagicMock(id="sg-web", group_name="webapp01-web")
+        web.ip_permissions = pairs("sg-admin", "sg-peer", "sg-hidden")
+        web.ip_permissions_egress = []
+        admin = MagicMock(id="sg-admin", group_name="webapp01-admin")
+        admin.ip_permissions = pairs("sg-web")
+        admin.ip_permissions_egress = []
+        self.evpc1.vpc_name = "webapp01"
+        self.evpc1._describe_hydrated = MagicMock(return_value=[web, admin])
+        client = MagicMock()
+        client.can_paginate = MagicMock(return_value=False)
+        client.describe_security_groups = MagicMock(
+            return_value={
+                "SecurityGroups": [{"GroupId": "sg-peer", "GroupName": "peer-db"}]
+            }
+        )
+        self.evpc1.boto.ec2_client = client
+        self.evpc1.boto.ec2 = MagicMock()
+        return client
+
+    def test_enriched_security_groups_one_batched_lookup(self):
+        client = self._mock_security_groups()
+        sgs = self.evpc1.enriched_security_groups
+        self.assertEqual(
+            sgs["web"]["inbound"],
+            [("admin", "tcp", 22), ("peer-db", "tcp", 22), ("sg-hidden", "tcp", 22)],
+        )
+        self.assertEqual(sgs["admin"]["inbound"], [("web", "tcp", 22)])
+        self.assertEqual(self.evpc1._describe_hydrated.call_count, 1)
+        # only ids outside this VPC are looked up, in one call.
+        client.describe_security_groups.assert_called_once_with(
+            Filters=[{"Name": "group-id", "Values": ["sg-hidden", "sg-peer"]}]
+        )
+        self.assertEqual(self.evpc1.boto.ec2.SecurityGroup.call_count, 0)
+
+    def test_security_group_rules_keep_peer_group_ids(self):
+        client = self._mock_security_groups()
+        sgs = self.evpc1.get_security_group_rules()
+        self.assertEqual(
+            sgs["web"]["inbound"],
+            [
+                ("admin", "tcp", (22, 22)),
+                ("sg-peer", "tcp", (22, 22)),
+                ("sg-hidden", "tcp", (22, 22)),
+            ],
+        )
+        # groups of this VPC come from the inventory, nothing is described.
+        self.assertEqual(client.describe_security_groups.call_count, 0)
+
+    def _named(self, resource_id, name):
+        return MagicMock(id=resource_id, tags=[{"Key": "Name", "Value": name}])
+
+    def test_get_security_group_in_snapshot_one_describe(self):
+        self.evpc1.vpc = MagicMock(id="vpc-mock1111")
+        self.evpc1.vpc.tags = [{"Key": "Name", "Value": "webapp01"}]
+        self.evpc1._describe_hydrated = MagicMock(
+            return_value=[
+                self._named("sg-web", "webapp01-web"),
+                self._named("sg-db", "db"),
+            ]
+        )
+        with self.evpc1.snapshot():
+            self.assertEqual(self.evpc1.get_security_group("web").id, "sg-web")
+            self.assertEqual(self.evpc1.get_security_group("webapp01-web").id, "sg-web")
+            self.assertEqual(self.evpc1.get_security_group("db").id, "sg-db")
+            # plain CIDR rules miss without a describe call.
+            self.assertIsNone(self.evpc1.get_security_group("10.0.0.0/8"))
+            index = self.evpc1._snapshot.index("security_groups", "name", None)
+            self.evpc1.add_to_snapshot(
+                "security_groups", [self._named("sg-new", "webapp01-new")]
+            )
+            self.assertEqual(self.evpc1.get_security_group("new").id, "sg-new")
+            # the index was updated in place, not rebuilt.
+            self.assertIs(
+                self.evpc1._snapshot.index("security_groups", "name", None), index
+            )
+        self.assertEqual(self.evpc1._describe_hydrated.call_count, 1)
+
+    def test_security_group_rules_keep_icmp_ports(self):
+        self._mock_security_groups()
+        web = self.evpc1._describe_hydrated.return_value[0]
+        web.ip_permissions = [
+            {
+                "IpProtocol": "icmp",
+                "FromPort": 8,
+                "ToPort": -1,
+                "IpRanges": [{"CidrIp": "10.0.0.0/8"}],
+                "UserIdGroupPairs": [],
+            }
+        ]
+        web.ip_permissions_egress = [
+            {
+                "IpProtocol": "-1",
+                "IpRanges": [{"CidrIp": "0.0.0.0/0"}],
+                "UserIdGroupPairs": [],
+            }
+        ]
+        rules = self.evpc1.get_security_group_rules()["web"]
+        self.assertEqual(rules["inbound"], [("10.0.0.0/8", "icmp", (8, -1))])
+        self.assertEqual(rules["outbound"], [("0.0.0.0/0", "-1", (-1, -1))])
+        sgs = self.evpc1.enriched_security_groups
+        self.assertEqual(sgs["web"]["inbound"], [("10.0.0.0/8", "icmp", "8--1")])
+        self.assertNotIn("outbound", sgs["web"])
@@ -2,6 +2,15 @@ from helpers import BotoformTestCase
 
 from mock import MagicMock
 
+from botoform.enriched import EnrichedInstance
+
+
+class UntouchableInstance(object):
+    """Raise on any attribute access, like an unloaded boto3 resource would load."""
+
+    def __getattribute__(self, name):
+        raise AssertionError("touched {}".format(name))
+
 
 class TestEnrichedInstance(BotoformTestCase):
 
@@ -44,3 +53,22 @@ class TestEnrichedInstance(BotoformTestCase):
     def test_is_spot_instance(self):
         self.assertEqual(self.instance3.is_spot, False)
         self.assertEqual(self.instance4.is_spot, True)
+
+    def test_construction_does_not_touch_instance(self):
+        EnrichedInstance(UntouchableInstance())
+
+    def test_lazy_attribute_delegation(self):
+        self.assertEqual(self.instance1.private_ip_address, "192.168.1.31")
+        self.assertEqual(self.instance1.spot_instance_request_id, None)
+
+    def test_missing_attribute_raises_attribute_error(self):
+        with self.assertRaises(AttributeError):
+            self.instance1.tacobell
+
+    def test_slots_no_instance_dict(self):
+        self.assertFalse(hasattr(self.instance1, "__dict__"))
+
+    def test_dir_includes_wrapper_and_instance_attrs(self):
+        attrs = dir(self.instance1)
+        self.assertIn("hostname", attrs)
+        self.assertIn("private_ip_address", attrs)
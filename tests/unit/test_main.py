@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+import subprocess
+import sys
+
+from botoform.__main__ import build_parser, validate_profile
+
+SLOW_MODULES = ("boto3", "botocore", "pkg_resources", "botoform.enriched")
+
+
+def run_python(code):
+    command = [sys.executable, "-c", code]
+    process = subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    stdout, stderr = process.communicate()
+    return stdout.decode("utf-8"), stderr.decode("utf-8")
+
+
+def make_entry_point(name, plugin):
+    entry_point = MagicMock()
+    entry_point.name = name
+    entry_point.load = MagicMock(return_value=plugin)
+    return entry_point
+
+
+class TestMain(TestCase):
+    """Test Suite for the bf entry point."""
+
+    def test_import_skips_slow_modules(self):
+        stdout, stderr = run_python(
+            "import sys, botoform.__main__; print(' '.join(sys.modules))"
+        )
+        loaded = stdout.split()
+        self.assertIn("botoform.__main__", loaded, stderr)
+        for module in SLOW_MODULES:
+            self.assertNotIn(module, loaded)
+        # plugins are imported only once their subcommand is chosen.
+        plugins = [m for m in loaded if m.startswith("botoform.plugins.")]
+        self.assertEqual(plugins, [])
+
+    @patch("botoform.__main__.iter_entry_points")
+    def test_only_chosen_plugin_is_loaded(self, iter_entry_points):
+        chosen = make_entry_point("list", MagicMock())
+        other = make_entry_point("create", MagicMock())
+        iter_entry_points.return_value = [chosen, other]
+        parser = build_parser("bf", True)
+        parser.parse_args(["list", "web"])
+        chosen.load.assert_called_once_with()
+        self.assertEqual(other.load.call_count, 0)
+
+    @patch("botoform.__main__.get_profile_names", MagicMock(return_value=["dev"]))
+    def test_validate_profile(self):
+        parser = build_parser("bf")
+        validate_profile(parser, parser.parse_args(["-p", "dev", "web"]))
+        with self.assertRaises(SystemExit):
+            validate_profile(parser, parser.parse_args(["-p", "prod", "web"]))
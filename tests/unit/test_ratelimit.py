@@ -0,0 +1,70 @@
+from unittest import TestCase
+
+from mock import MagicMock
+
+from botoform.ratelimit import RateLimiter, TokenBucket, operation_class
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(TestCase):
+    """Test Suite for TokenBucket class."""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(10, 2, clock=self.clock)
+
+    def test_burst_then_wait(self):
+        self.assertEqual(self.bucket.try_acquire(), 0)
+        self.assertEqual(self.bucket.try_acquire(), 0)
+        self.assertAlmostEqual(self.bucket.try_acquire(), 0.1)
+        self.clock.now += 0.1
+        self.assertEqual(self.bucket.try_acquire(), 0)
+
+    def test_throttled_halves_rate_and_drains(self):
+        self.bucket.throttled()
+        self.assertEqual(self.bucket.rate, 5)
+        self.assertAlmostEqual(self.bucket.try_acquire(), 0.2)
+
+    def test_rate_never_below_min_or_above_max(self):
+        for _ in range(20):
+            self.bucket.throttled()
+        self.assertEqual(self.bucket.rate, self.bucket.min_rate)
+        for _ in range(1000):
+            self.bucket.succeeded()
+        self.assertEqual(self.bucket.rate, 10)
+
+
+class TestRateLimiter(TestCase):
+    """Test Suite for RateLimiter class."""
+
+    def test_operation_class(self):
+        self.assertEqual(operation_class("DescribeInstances"), "read")
+        self.assertEqual(operation_class("ListHostedZones"), "read")
+        self.assertEqual(operation_class("TerminateInstances"), "write")
+
+    def test_buckets_shared_per_profile_region_service_and_class(self):
+        limiter = RateLimiter()
+        bucket = lambda *key: limiter.bucket("dev", *key)
+        describe = bucket("us-east-1", "ec2", "DescribeInstances")
+        self.assertIs(describe, bucket("us-east-1", "ec2", "DescribeSubnets"))
+        self.assertIsNot(describe, bucket("us-east-1", "ec2", "CreateTags"))
+        self.assertIsNot(describe, bucket("us-west-2", "ec2", "DescribeVpcs"))
+
+    def test_profiles_never_share_a_bucket(self):
+        limiter = RateLimiter()
+        dev = limiter.bucket("dev", "us-east-1", "ec2", "DescribeInstances")
+        prod = limiter.bucket("prod", "us-east-1", "ec2", "DescribeInstances")
+        self.assertIsNot(dev, prod)
+
+    def test_register_hooks_on_resource_client(self):
+        resource = MagicMock()
+        RateLimiter().register(resource)
+        events = resource.meta.client.meta.events
+        self.assertEqual(events.register_first.call_count, 3)
@@ -0,0 +1,59 @@
+from unittest import TestCase
+
+from mock import MagicMock, patch
+
+from argparse import Namespace
+
+import json
+import sys
+
+from botoform.plugins import refresh
+
+PLAN = {
+    "web": {
+        "inbound": {
+            "add": [("10.0.0.0/8", "tcp", (8000, 8006))],
+            "remove": [("admin", "tcp", (22, 22))],
+        }
+    }
+}
+
+
+class TestRefreshSecurityGroups(TestCase):
+    """Test Suite for the refresh security_groups subcommand."""
+
+    def run_security_groups(self, output_format):
+        builder = MagicMock()
+        builder.config = {"security_groups": {}}
+        builder.reconcile_security_groups = MagicMock(return_value=PLAN)
+        args = Namespace(prune=True, dry_run=True, output_format=output_format)
+        printed = []
+        stdout = MagicMock()
+        stdout.write = printed.append
+        get_builder = lambda evpc, args: builder
+        with patch.object(refresh, "get_builder_for_existing_vpc", get_builder):
+            with patch.object(sys, "stdout", stdout):
+                refresh.security_groups(args, MagicMock())
+        return "".join(printed)
+
+    def test_plan_to_document_uses_config_form(self):
+        self.assertEqual(
+            refresh.plan_to_document(PLAN),
+            {
+                "web": {
+                    "inbound": {
+                        "add": [["10.0.0.0/8", "tcp", "8000-8006"]],
+                        "remove": [["admin", "tcp", 22]],
+                    }
+                }
+            },
+        )
+
+    def test_prints_whole_plan(self):
+        self.assertEqual(
+            json.loads(self.run_security_groups("json")),
+            refresh.plan_to_document(PLAN),
+        )
+        output = self.run_security_groups("yaml")
+        for text in ("web", "inbound", "add", "remove", "10.0.0.0/8", "8000-8006"):
+            self.assertIn(text, output)
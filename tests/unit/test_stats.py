@@ -0,0 +1,62 @@
+from unittest import TestCase
+
+from mock import MagicMock
+
+from botoform.stats import ApiStats, percentile
+
+
+def make_model(service_name, operation_name):
+    model = MagicMock()
+    model.name = operation_name
+    model.service_model.service_name = service_name
+    return model
+
+
+class TestApiStats(TestCase):
+    """Test Suite for ApiStats class."""
+
+    def setUp(self):
+        self.stats = ApiStats()
+        self.model = make_model("ec2", "DescribeInstances")
+
+    def call(self, parsed):
+        context = {}
+        self.stats.before_call(model=self.model, context=context)
+        self.stats.after_call(model=self.model, parsed=parsed, context=context)
+
+    def test_counts_calls_retries_and_errors(self):
+        self.call({"ResponseMetadata": {"RetryAttempts": 2}})
+        self.call({"Error": {"Code": "InvalidInstanceID.NotFound"}})
+        row = self.stats.report()["operations"][0]
+        self.assertEqual(row["service"], "ec2")
+        self.assertEqual(row["operation"], "DescribeInstances")
+        self.assertEqual(row["calls"], 2)
+        self.assertEqual(row["retries"], 2)
+        self.assertEqual(row["errors"], 1)
+        self.assertIn("p99_ms", row)
+
+    def test_counts_throttles(self):
+        response = (None, {"Error": {"Code": "RequestLimitExceeded"}})
+        self.assertIsNone(
+            self.stats.needs_retry(operation=self.model, response=response)
+        )
+        self.stats.needs_retry(operation=self.model, response=None)
+        self.assertEqual(self.stats.report()["operations"][0]["throttles"], 1)
+
+    def test_register_on_resource_client(self):
+        resource = MagicMock()
+        self.stats.register(resource)
+        events = resource.meta.client.meta.events
+        self.assertEqual(events.register_first.call_count, 3)
+
+    def test_report_total_calls(self):
+        self.call({})
+        self.model = make_model("rds", "DescribeDBInstances")
+        self.call({})
+        self.assertEqual(self.stats.report()["total_calls"], 2)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 90), 7)
@@ -1,12 +1,26 @@
 from unittest import TestCase
 
+from mock import MagicMock, patch
+
+from botocore.exceptions import ClientError
+
 from botoform.util import (
+    BotoConnections,
     Log,
     dict_to_key_value,
     key_value_to_dict,
     snake_to_camel_case,
     make_tag_dict,
+    patch_tags,
+    TagWriter,
+    run_concurrently,
+    run_dag,
+    iter_concurrently,
+    describe_all,
+    hydrate,
     get_port_range,
+    merge_port_ranges,
+    coalesce_sg_rules,
 )
 
 
@@ -52,6 +66,39 @@ class TestSnakeToCamelCase(TestCase):
         self.assertEqual(snake_to_camel_case("vpc_id"), "VpcId")
 
 
+class TestCoalesceSgRules(TestCase):
+    """Test Suite for merge_port_ranges and coalesce_sg_rules functions."""
+
+    def test_merge_overlapping_and_adjacent(self):
+        self.assertEqual(
+            merge_port_ranges([(8006, 8006), (22, 22), (8000, 8005), (8003, 8004)]),
+            [(22, 22), (8000, 8006)],
+        )
+
+    def test_merge_keeps_gaps(self):
+        self.assertEqual(
+            merge_port_ranges([(80, 80), (82, 90), (443, 443)]),
+            [(80, 80), (82, 90), (443, 443)],
+        )
+
+    def test_coalesce_per_source_and_protocol(self):
+        rules = [
+            ("web", "tcp", "8000-8005"),
+            ("web", "tcp", 8006),
+            ("web", "udp", 8006),
+            ("10.0.0.0/8", "tcp", 22),
+            ("10.0.0.0/8", "tcp", "22"),
+        ]
+        self.assertEqual(
+            coalesce_sg_rules(rules),
+            [
+                ("10.0.0.0/8", "tcp", (22, 22)),
+                ("web", "tcp", (8000, 8006)),
+                ("web", "udp", (8006, 8006)),
+            ],
+        )
+
+
 class TestGetPortRange(TestCase):
 
     def test_all_port(self):
@@ -63,6 +110,9 @@ class TestGetPortRange(TestCase):
     def test_icmp_is_negative_one_tuple(self):
         self.assertTupleEqual(get_port_range("anything", "icmp"), (-1, -1))
 
+    def test_all_traffic_is_negative_one_tuple(self):
+        self.assertTupleEqual(get_port_range(-1, "-1"), (-1, -1))
+
     def test_all_mixed_port_raises_value_error(self):
         with self.assertRaises(ValueError):
             get_port_range("aLL")
@@ -123,3 +173,285 @@ def test_key_value_to_dict():
     key_value_list = ["a=1,b=2", "c=3, d=4", "e=5"]
     desired_result = {"a": "1", "b": "2", "c": "3", "d": "4", "e": "5"}
     assert key_value_to_dict(key_value_list) == desired_result
+
+
+def test_patch_tags():
+
+    class TestSubject(object):
+        class meta(object):
+            data = {"Tags": [{"Key": "Name", "Value": "myapp01-web01"}]}
+
+    patch_tags(TestSubject, [{"Key": "role", "Value": "web"}])
+    tags = {i["Key"]: i["Value"] for i in TestSubject.meta.data["Tags"]}
+    assert tags == {"Name": "myapp01-web01", "role": "web"}
+
+
+def test_patch_tags_not_loaded_is_noop():
+
+    class TestSubject(object):
+        class meta(object):
+            data = None
+
+    patch_tags(TestSubject, [{"Key": "role", "Value": "web"}])
+    assert TestSubject.meta.data is None
+
+
+def test_describe_all_paginates():
+    client = MagicMock()
+    client.can_paginate = MagicMock(return_value=True)
+    paginator = MagicMock()
+    paginator.paginate = MagicMock(
+        return_value=[{"Subnets": [1, 2]}, {"Subnets": [3]}]
+    )
+    client.get_paginator = MagicMock(return_value=paginator)
+    assert describe_all(client, "describe_subnets", "Subnets") == [1, 2, 3]
+
+
+def test_describe_all_single_call_when_not_paginated():
+    client = MagicMock()
+    client.can_paginate = MagicMock(return_value=False)
+    client.describe_subnets = MagicMock(return_value={"Subnets": [1, 2]})
+    assert describe_all(client, "describe_subnets", "Subnets") == [1, 2]
+
+
+def test_hydrate_injects_meta_data():
+    descriptions = [{"SubnetId": "subnet-1"}, {"SubnetId": "subnet-2"}]
+    resources = hydrate(lambda i: MagicMock(id=i), descriptions, "SubnetId")
+    assert [r.id for r in resources] == ["subnet-1", "subnet-2"]
+    assert resources[0].meta.data is descriptions[0]
+
+
+class TestTagWriter(TestCase):
+    """Test Suite for TagWriter class."""
+
+    def setUp(self):
+        self.client = MagicMock()
+        self.tag_writer = TagWriter(self.client)
+
+    def make_resource(self, resource_id, **tags):
+        resource = MagicMock(id=resource_id)
+        resource.tags = [{"Key": k, "Value": v} for k, v in tags.items()]
+        resource.meta.data = None
+        return resource
+
+    def test_identical_deltas_are_grouped(self):
+        for i in range(3):
+            self.tag_writer.update(self.make_resource("r-{}".format(i)), env="prod")
+        self.assertEqual(self.tag_writer.flush(), 1)
+        kwargs = self.client.create_tags.call_args[1]
+        self.assertEqual(sorted(kwargs["Resources"]), ["r-0", "r-1", "r-2"])
+        self.assertEqual(kwargs["Tags"], [{"Key": "env", "Value": "prod"}])
+
+    def test_known_tags_are_skipped(self):
+        self.tag_writer.update(self.make_resource("r-1", env="prod"), env="prod")
+        self.assertEqual(self.tag_writer.flush(), 0)
+        self.assertEqual(self.client.create_tags.call_count, 0)
+
+    def test_batches_of_max_resources(self):
+        self.tag_writer.max_resources = 2
+        for i in range(5):
+            self.tag_writer.update(self.make_resource("r-{}".format(i)), env="prod")
+        self.assertEqual(self.tag_writer.flush(), 3)
+
+    def test_delete_only_existing_keys(self):
+        self.tag_writer.delete(self.make_resource("r-1", env="prod"), "env", "nope")
+        self.tag_writer.flush()
+        kwargs = self.client.delete_tags.call_args[1]
+        self.assertEqual(kwargs, {"Resources": ["r-1"], "Tags": [{"Key": "env"}]})
+
+    def test_context_manager_flushes(self):
+        with TagWriter(self.client) as tag_writer:
+            tag_writer.update(self.make_resource("r-1"), env="prod")
+        self.assertEqual(self.client.create_tags.call_count, 1)
+
+    def test_bad_ids_are_dropped_from_the_batch(self):
+        def create_tags(Resources, Tags):
+            if "i-2" in Resources:
+                raise ClientError(
+                    {
+                        "Error": {
+                            "Code": "InvalidInstanceID.NotFound",
+                            "Message": "The instance ID 'i-2' does not exist",
+                        }
+                    },
+                    "CreateTags",
+                )
+
+        self.client.create_tags = MagicMock(side_effect=create_tags)
+        resources = [self.make_resource("i-{}".format(i)) for i in range(4)]
+        for resource in resources:
+            self.tag_writer.update(resource, env="prod")
+        with self.assertRaises(Exception) as context:
+            self.tag_writer.flush()
+        self.assertIn("failed for 1 resources: i-2", str(context.exception))
+        self.assertEqual(self.client.create_tags.call_count, 2)
+        retried = self.client.create_tags.call_args[1]["Resources"]
+        self.assertEqual(sorted(retried), ["i-0", "i-1", "i-3"])
+
+    def test_other_errors_are_not_retried(self):
+        error = ClientError({"Error": {"Code": "UnauthorizedOperation"}}, "CreateTags")
+        self.client.create_tags = MagicMock(side_effect=error)
+        self.tag_writer.update(self.make_resource("i-1"), env="prod")
+        with self.assertRaises(ClientError):
+            self.tag_writer.flush()
+        self.assertEqual(self.client.create_tags.call_count, 1)
+
+
+def test_run_concurrently_keeps_order():
+    results = run_concurrently(lambda x: x * 2, range(20), max_workers=4)
+    assert results == [x * 2 for x in range(20)]
+
+
+def test_run_concurrently_serial():
+    assert run_concurrently(lambda x: x + 1, [1, 2], max_workers=1) == [2, 3]
+
+
+def test_run_concurrently_aggregates_errors():
+    calls = []
+
+    def fail_on_odd(x):
+        calls.append(x)
+        if x % 2:
+            raise ValueError("odd {}".format(x))
+
+    try:
+        run_concurrently(fail_on_odd, range(6), max_workers=3)
+    except Exception as e:
+        message = str(e)
+    assert sorted(calls) == list(range(6))
+    assert message.startswith("3 of 6 calls failed")
+    assert "1 (odd 1)" in message
+
+
+def test_iter_concurrently_yields_results_and_errors():
+    def invert(x):
+        return 1.0 / x
+
+    outcomes = sorted(iter_concurrently(invert, [1, 0, 2], max_workers=3))
+    assert [(item, result) for item, result, _ in outcomes] == [
+        (0, None),
+        (1, 1.0),
+        (2, 0.5),
+    ]
+    assert isinstance(outcomes[0][2], ZeroDivisionError)
+    assert list(iter_concurrently(invert, [])) == []
+
+
+def test_run_dag_respects_dependencies():
+    order = []
+    tasks = dict((n, lambda n=n: order.append(n) or n) for n in "abcd")
+    results = run_dag(tasks, {"b": ["a"], "c": ["a"], "d": ["b", "c"]})
+    assert results == {"a": "a", "b": "b", "c": "c", "d": "d"}
+    assert order[0] == "a" and order[-1] == "d"
+
+
+def test_run_dag_overlaps_independent_tasks():
+    import threading
+
+    started = threading.Event()
+
+    def waits_for_other():
+        # only returns True if the other task runs at the same time.
+        return started.wait(5)
+
+    results = run_dag({"a": waits_for_other, "b": started.set}, max_workers=2)
+    assert results["a"] is True
+
+
+def test_run_dag_skips_dependents_of_failures():
+    calls = []
+
+    def fail():
+        raise ValueError("boom")
+
+    tasks = {
+        "a": fail,
+        "b": lambda: calls.append("b"),
+        "c": lambda: calls.append("c"),
+        "d": lambda: calls.append("d"),
+    }
+    try:
+        run_dag(tasks, {"b": ["a"], "c": ["b"]})
+    except Exception as e:
+        message = str(e)
+    assert calls == ["d"]
+    assert "a (boom)" in message
+    assert "skipped: b, c" in message
+
+
+def test_run_dag_fail_fast_starts_no_new_tasks():
+    calls = []
+
+    def fail():
+        raise ValueError("boom")
+
+    tasks = {
+        "a": fail,
+        "b": lambda: calls.append("b"),
+        "c": lambda: calls.append("c"),
+    }
+    try:
+        run_dag(tasks, {"b": ["a"], "c": ["a"]}, max_workers=1, fail_fast=True)
+    except Exception as e:
+        message = str(e)
+    assert calls == []
+    assert "skipped: b, c" in message
+
+    # independent tasks waiting for a worker are skipped too.
+    tasks = {"a": fail, "b": lambda: calls.append("b")}
+    try:
+        run_dag(tasks, max_workers=1, fail_fast=True)
+    except Exception as e:
+        message = str(e)
+    assert calls == []
+    assert "skipped: b" in message
+
+
+def test_run_dag_detects_cycles():
+    try:
+        run_dag({"a": lambda: 1, "b": lambda: 2}, {"a": ["b"], "b": ["a"]})
+    except Exception as e:
+        message = str(e)
+    assert "cycle" in message
+
+
+class TestBotoConnections(TestCase):
+    """Test Suite for BotoConnections class."""
+
+    @patch("boto3.session.Session")
+    def setUp(self, session):
+        self.bconn = BotoConnections(region_name="us-east-1")
+        self.session = self.bconn.session
+
+    def test_clients_created_lazily_and_cached(self):
+        self.assertEqual(self.session.client.call_count, 0)
+        self.assertIs(self.bconn.ec2_client, self.bconn.ec2_client)
+        self.session.client.assert_called_once_with("ec2")
+
+    def test_refresh_forgets_cached_clients(self):
+        self.bconn.rds
+        self.bconn.refresh_boto_connections()
+        self.bconn.rds
+        self.assertEqual(self.session.client.call_count, 2)
+
+    def test_unknown_attribute(self):
+        with self.assertRaises(AttributeError):
+            self.bconn.not_a_service
+
+    @patch("botocore.session.Session", MagicMock())
+    @patch("boto3.session.Session")
+    def test_own_session_setup_once(self, session):
+        bconn = BotoConnections(region_name="us-east-1", profile_name="dev")
+        session.assert_called_once_with(profile_name="dev", region_name="us-east-1")
+
+    def test_resources_cached_per_thread(self):
+        from threading import Thread
+
+        self.session.resource = MagicMock(side_effect=lambda name: MagicMock())
+        resources = [self.bconn.ec2, self.bconn.ec2]
+        thread = Thread(target=lambda: resources.append(self.bconn.ec2))
+        thread.start()
+        thread.join()
+        self.assertIs(resources[0], resources[1])
+        self.assertIsNot(resources[0], resources[2])
+        self.assertEqual(self.session.resource.call_count, 2)
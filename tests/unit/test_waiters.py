@@ -0,0 +1,66 @@
+from unittest import TestCase
+
+from mock import MagicMock
+
+from botoform.waiters import Waiter, GONE
+
+
+class TestWaiter(TestCase):
+    """Test Suite for Waiter class."""
+
+    def make_waiter(self, ticks, desired="available", **kwargs):
+        describe = MagicMock(side_effect=ticks)
+        kwargs.setdefault("delays", (0,))
+        return describe, Waiter(describe, desired, **kwargs)
+
+    def test_one_describe_per_tick(self):
+        describe, waiter = self.make_waiter(
+            [
+                {"db1": "creating", "db2": "creating"},
+                {"db1": "available", "db2": "creating"},
+                {"db2": "available"},
+            ]
+        )
+        reached = waiter.wait(["db1", "db2"])
+        self.assertEqual(reached, {"db1": "available", "db2": "available"})
+        self.assertEqual(describe.call_count, 3)
+        # only pending ids are described.
+        self.assertEqual(describe.call_args_list[2], ((["db2"],), {}))
+
+    def test_missing_ids_are_gone(self):
+        describe, waiter = self.make_waiter([{}], desired=["deleted", GONE])
+        self.assertEqual(waiter.wait(["db1"]), {"db1": GONE})
+
+    def test_timeout_lists_pending(self):
+        describe, waiter = self.make_waiter(
+            [{"db1": "available", "db2": "creating"}], timeout=0
+        )
+        with self.assertRaises(Exception) as context:
+            waiter.wait(["db1", "db2"])
+        self.assertIn("db2 (creating)", str(context.exception))
+        self.assertNotIn("db1", str(context.exception))
+
+    def test_failure_state_raises_right_away(self):
+        describe, waiter = self.make_waiter(
+            [{"i-1": "pending", "i-2": "terminated"}],
+            desired="running",
+            failure=["terminated"],
+        )
+        with self.assertRaises(Exception) as context:
+            waiter.wait(["i-1", "i-2"])
+        self.assertIn("i-2 (terminated)", str(context.exception))
+        self.assertEqual(describe.call_count, 1)
+
+    def test_adaptive_delays(self):
+        waiter = Waiter(None, "available", delays=(1, 5, 10))
+        self.assertEqual([waiter._delay(t) for t in range(5)], [1, 5, 10, 10, 10])
+
+    def test_progress_logged(self):
+        log = MagicMock()
+        describe, waiter = self.make_waiter(
+            [{"db1": "creating"}, {"db1": "available"}], log=log
+        )
+        waiter.wait(["db1"])
+        messages = [args[0][0] for args in log.emit.call_args_list]
+        self.assertIn("resources db1 is creating", messages)
+        self.assertIn("resources db1 is available", messages)